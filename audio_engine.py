@@ -0,0 +1,234 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import numpy
+from threading import Condition, Lock, Thread
+import time
+import wave
+
+# pyaudio is only needed to play sounds on a real sound card
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None
+
+SAMPLE_RATE = 44100 # Hz
+CHANNELS = 2
+# Frames mixed at a time. Smaller buffers mean less latency between a hit
+# and its sound, but the mixer has to keep up with them.
+BUFFER_FRAMES = 256
+# Sounds started while this many are already playing cut off the oldest one
+MAX_VOICES = 16
+
+# Converts the raw frames of a wave file to floats between -1 and 1
+def _decode_frames(frames, sample_width):
+    if sample_width == 1:
+        # 8 bit wave files are unsigned
+        samples = numpy.frombuffer(frames, dtype=numpy.uint8)
+        return (samples.astype(numpy.float32) - 128) / 128
+    elif sample_width == 2:
+        samples = numpy.frombuffer(frames, dtype="<i2")
+        return samples.astype(numpy.float32) / 32768
+    elif sample_width == 4:
+        samples = numpy.frombuffer(frames, dtype="<i4")
+        return samples.astype(numpy.float32) / 2147483648
+
+    raise ValueError("%d byte samples are not supported" % sample_width)
+
+# Reads a wave file and returns its samples as an N x CHANNELS float32
+# array at SAMPLE_RATE, ready to be mixed
+def decode_sound(sound_file):
+    f = wave.open(sound_file, "rb")
+    try:
+        sample_width = f.getsampwidth()
+        channels = f.getnchannels()
+        rate = f.getframerate()
+        frames = f.readframes(f.getnframes())
+    finally:
+        f.close()
+
+    samples = _decode_frames(frames, sample_width)
+    samples = samples[:len(samples) - len(samples) % channels]
+    samples = samples.reshape(-1, channels)
+
+    # Mono sounds play on every channel, extra channels are dropped
+    if channels < CHANNELS:
+        samples = numpy.repeat(samples[:, :1], CHANNELS, axis=1)
+    elif channels > CHANNELS:
+        samples = samples[:, :CHANNELS]
+
+    if rate != SAMPLE_RATE and len(samples) > 0:
+        length = int(round(len(samples) * float(SAMPLE_RATE) / rate))
+        old_times = numpy.arange(len(samples)) / float(rate)
+        new_times = numpy.arange(length) / float(SAMPLE_RATE)
+        samples = numpy.column_stack([numpy.interp(new_times, old_times,
+            samples[:, channel]) for channel in range(CHANNELS)])
+
+    return numpy.ascontiguousarray(samples, dtype=numpy.float32)
+
+# Plays mixed audio on the default sound card through one stream that stays
+# open as long as the engine runs
+class PyAudioSink():
+    def write(self, data):
+        self._stream.write(data)
+
+    def close(self):
+        self._stream.stop_stream()
+        self._stream.close()
+        self._pyaudio.terminate()
+
+    def __init__(self):
+        self._pyaudio = pyaudio.PyAudio()
+        self._stream = self._pyaudio.open(format=pyaudio.paInt16,
+            channels=CHANNELS, rate=SAMPLE_RATE, output=True,
+            frames_per_buffer=BUFFER_FRAMES)
+
+# Throws mixed audio away, for running without a sound card (e.g. headless
+# or in tests). With realtime set it takes as long to write audio as it
+# would take to play it, like a sound card.
+class NullSink():
+    def write(self, data):
+        frame_count = len(data) / (CHANNELS * 2)
+        self._frames_written += frame_count
+
+        if self._realtime:
+            time.sleep(float(frame_count) / SAMPLE_RATE)
+
+    def close(self):
+        pass
+
+    def get_frames_written(self):
+        return self._frames_written
+
+    def __init__(self, realtime=False):
+        self._realtime = realtime
+        self._frames_written = 0
+
+# This class plays sounds with as little delay as possible. Sound files are
+# decoded once and kept in memory, and one mixer thread adds up every sound
+# that is playing and writes the result to a sink that stays open, so
+# playing a sound only has to hand it to the mixer. Sounds that overlap are
+# mixed together instead of waiting for each other.
+class AudioEngine():
+    def start(self):
+        self._running = True
+        self._mixer_thread = Thread(target=self._mix_loop,
+            name="audio_mixer_thread")
+        self._mixer_thread.daemon = True
+        self._mixer_thread.start()
+
+    def stop(self):
+        with self._voices_condition:
+            self._running = False
+            self._voices_condition.notify()
+
+        if self._mixer_thread is not None:
+            self._mixer_thread.join()
+            self._mixer_thread = None
+
+        self._sink.close()
+
+    # Decodes sound_file and keeps it so that playing it later doesn't have
+    # to wait for the disk. Returns the decoded samples. Sounds that can't be
+    # read are logged once and kept as silence, so playing them again
+    # (e.g. on every hit of a region) does nothing.
+    def preload(self, sound_file):
+        with self._cache_lock:
+            if sound_file not in self._sample_cache:
+                try:
+                    samples = decode_sound(sound_file)
+                except (EnvironmentError, EOFError, ValueError,
+                    wave.Error) as e:
+                    self._logger.warning("Couldn't load sound %s, it will " +
+                        "not be played: %s", sound_file, e)
+                    samples = numpy.zeros((0, CHANNELS), numpy.float32)
+
+                self._sample_cache[sound_file] = samples
+
+            return self._sample_cache[sound_file]
+
+    # Starts playing sound_file and returns right away
+    def play(self, sound_file):
+        samples = self.preload(sound_file)
+
+        if len(samples) == 0:
+            return
+
+        with self._voices_condition:
+            if len(self._voices) >= MAX_VOICES:
+                self._voices.pop(0)
+
+            # A voice is a sound and how many of its frames have been mixed
+            self._voices.append([samples, 0])
+            self._voices_condition.notify()
+
+    def is_playing(self):
+        with self._voices_condition:
+            return len(self._voices) > 0
+
+    def get_sink(self):
+        return self._sink
+
+    def _mix_loop(self):
+        mix_buffer = numpy.zeros((BUFFER_FRAMES, CHANNELS), numpy.float32)
+
+        while True:
+            with self._voices_condition:
+                # Don't write anything while nothing is playing, the sink
+                # is still open so the next sound starts immediately
+                while self._running and len(self._voices) == 0:
+                    self._voices_condition.wait()
+
+                if not self._running:
+                    return
+
+                mix_buffer.fill(0)
+                finished_voices = []
+
+                for voice in self._voices:
+                    (samples, position) = voice
+                    frame_count = min(len(samples) - position, BUFFER_FRAMES)
+                    mix_buffer[:frame_count] += samples[
+                        position:position + frame_count]
+                    voice[1] = position + frame_count
+
+                    if voice[1] >= len(samples):
+                        finished_voices.append(voice)
+
+                for voice in finished_voices:
+                    self._voices.remove(voice)
+
+            # Write outside of the lock, writing blocks until the sink has
+            # room and sounds should still be able to start meanwhile
+            numpy.clip(mix_buffer, -1, 1, out=mix_buffer)
+            self._sink.write((mix_buffer * 32767).astype("<i2").tostring())
+
+    def _open_default_sink(self):
+        if pyaudio is None:
+            self._logger.warning("pyaudio isn't installed, sounds will not " +
+                "be played.")
+            return NullSink()
+
+        try:
+            return PyAudioSink()
+        except Exception as e:
+            self._logger.warning("Couldn't open the sound card, sounds will " +
+                "not be played: %s", e)
+            return NullSink()
+
+    # sink is where mixed audio is written to. By default it's the sound
+    # card, or a NullSink if there isn't one.
+    def __init__(self, logger, sink=None):
+        self._logger = logger
+        self._sample_cache = {}
+        self._cache_lock = Lock()
+        self._voices = []
+        self._voices_condition = Condition()
+        self._running = False
+        self._mixer_thread = None
+
+        if sink is None:
+            sink = self._open_default_sink()
+
+        self._sink = sink
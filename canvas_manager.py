@@ -35,6 +35,7 @@ class CanvasManager():
                 not isinstance(old_selection, tuple)):
   
                 self.convert_ovals(old_selection, self.convert_from_windows_ovals)  
+                self._notify_change(old_selection)
     
         # darken the new one and make its outline gold
         if (new_selection and
@@ -46,6 +47,7 @@ class CanvasManager():
             if (platform.system() == "Windows" and 
                 not isinstance(new_selection, tuple)):  
                 self.convert_ovals(new_selection, self.convert_to_windows_ovals)  
+                self._notify_change(new_selection)
 
     def draw_windows_oval(self, x, y, radius, fill, tags):
         # What we are doing here is drawing a regular polygon with
@@ -72,15 +74,15 @@ class CanvasManager():
         for region in regions:
             tags = self._canvas.gettags(region)
             if "_shape:oval" in tags:
-                # get whatever is above it so that we can keep 
-                # the z order the same
-                higher = self._canvas.find_above(region)
-
                 # preserve the fill color
                 fill = self._canvas.itemcget(region, "fill")
 
+                # The new item is created on top of everything, put it
+                # where the old one was so that the z order stays the same
+                # (e.g. shot markers stay on top and hidden targets stay
+                # behind the feed)
                 oval = converter(region, fill, tags)
-                self._canvas.tag_raise(higher, oval)
+                self._canvas.tag_lower(oval, region)
                 self._canvas.delete(region)
 
     def convert_to_windows_ovals(self, region, fill,  tags):
@@ -117,6 +119,8 @@ class CanvasManager():
             elif event.keysym == "Left":
                 event.widget.move(self._selection, -1, 0)
 
+            self._notify_change(self._selection)
+
     def scale_region(self, event):
         if (not self._selection or 
             self.is_background(self._selection)):
@@ -157,13 +161,21 @@ class CanvasManager():
         elif event.keysym == "Left" and width > 1:
             event.widget.scale(self._selection, c[0], c[1], (width-1)/width, 1)
 
+        self._notify_change(self._selection)
+
+    def _notify_change(self, selection):
+        if self._change_listener is not None:
+            self._change_listener(selection)
+
     def is_background(self, selection):
         if "background" in self._canvas.gettags(selection):
             return True
 
         return False
 
-    def __init__(self, canvas):
+    # change_listener is an optional callback that is called with the
+    # selection every time the selection is moved, scaled or redrawn
+    def __init__(self, canvas, change_listener=None):
         canvas.bind('<Up>', self.move_region)
         canvas.bind('<Down>', self.move_region)
         canvas.bind('<Left>', self.move_region)
@@ -177,3 +189,4 @@ class CanvasManager():
 
         self._canvas = canvas
         self._selection = None
+        self._change_listener = change_listener
@@ -1,13 +1,14 @@
 import argparse
 import logging
-from preferences_editor import PreferencesEditor
+import settings
 import sys
 
-DEBUG = "debug"
-DETECTION_RATE = "detectionrate" #ms
-LASER_INTENSITY = "laserintensity"
-MARKER_RADIUS = "markerradius"
-IGNORE_LASER_COLOR = "ignorelasercolor"
+# The preference names are kept in settings, they are used as
+# configurator.NAME throughout ShootOFF
+from settings import (DEBUG, VIDEO_SOURCE, DETECTION_RATE, DETECTION_MODE,
+    LASER_INTENSITY, MARKER_RADIUS, IGNORE_LASER_COLOR, ROI_DETECTION,
+    ROI_MARGIN, LASER_COLOR_CLASSIFIER, SUBPIXEL_CENTROIDS,
+    BACKGROUND_SUBTRACTION, PREVIEW_SCALE, PREVIEW_FPS, SHOT_LOG)
 
 class Configurator():
     def _check_rate(self, rate):
@@ -17,6 +18,13 @@ class Configurator():
                 "greater than 0")
         return value  
 
+    def _check_mode(self, mode):
+        mode = mode.lower()
+        if mode != "frame" and mode != "rate":
+            raise argparse.ArgumentTypeError("DETECTION_MODE must be a string " +
+                "equal to either \"frame\" or \"rate\" without quotes")
+        return mode
+
     def _check_intensity(self, intensity):
         value = int(intensity)
         if value < 0 or value > 255:
@@ -31,6 +39,34 @@ class Configurator():
                 "between 1 and 20")
         return value  
 
+    def _check_color_classifier(self, classifier):
+        classifier = classifier.lower()
+        if classifier != "rgb" and classifier != "hsv":
+            raise argparse.ArgumentTypeError("LASER_COLOR_CLASSIFIER must be " +
+                "a string equal to either \"rgb\" or \"hsv\" without quotes")
+        return classifier
+
+    def _check_margin(self, margin):
+        value = int(margin)
+        if value < 0:
+            raise argparse.ArgumentTypeError("ROI_MARGIN must be a number " +
+                "greater than or equal to 0")
+        return value
+
+    def _check_preview_scale(self, scale):
+        value = int(scale)
+        if value < 1 or value > 100:
+            raise argparse.ArgumentTypeError("PREVIEW_SCALE must be a number " +
+                "between 1 and 100")
+        return value
+
+    def _check_preview_fps(self, fps):
+        value = int(fps)
+        if value < 1 or value > 120:
+            raise argparse.ArgumentTypeError("PREVIEW_FPS must be a number " +
+                "between 1 and 120")
+        return value
+
     def _check_ignore_laser_color(self, ignore_laser_color):
         ignore_laser_color = ignore_laser_color.lower()
         if ignore_laser_color != "red" and ignore_laser_color != "green":
@@ -43,33 +79,77 @@ class Configurator():
 
         # Load configuration information from the config file, which will
         # be over-ridden if settings are set on the command line
-        config, preferences = PreferencesEditor.map_configuration()
+        config, preferences = settings.map_configuration()
 
         # Parse command line arguments
         parser = argparse.ArgumentParser(prog="shootoff.py")
         parser.add_argument("-d", "--debug", action="store_true", 
             help="turn on debug log messages")
         parser.add_argument("-r", "--detection-rate", type=self._check_rate,
-            help="sets the rate at which shots are detected in milliseconds. " +
-                "this should be set to about the length of time your laser trainer " +
-                "stays on for each shot, typically about 100 ms")
+            help="sets the rate at which shots are detected in milliseconds " +
+                "when the detection mode is rate. this should be set to about " +
+                "the length of time your laser trainer stays on for each shot, " +
+                "typically about 100 ms")
+        parser.add_argument("-e", "--detection-mode", type=self._check_mode,
+            help="sets how frames are picked for shot detection (frame or " +
+                "rate). frame checks every frame the webcam captures, rate " +
+                "checks the newest frame every DETECTION_RATE ms. frame is " +
+                "the default")
         parser.add_argument("-i", "--laser-intensity", type=self._check_intensity, 
             help="sets the intensity threshold for detecting the laser [0,255]. " +
                 "this should be as high as you can set it while still detecting " +
-                "shots")
+                "shots. File > Calibrate Laser Intensity can work it out for you")
         parser.add_argument("-m", "--marker-radius", type=self._check_radius,
             help="sets the radius of shot markers in pixels [1,20]")
         parser.add_argument("-c", "--ignore-laser-color",
             type=self._check_ignore_laser_color,
             help="sets the color of laser that should be ignored by ShootOFF (green " +
                 "or red). No color is ignored by default")
+        parser.add_argument("-t", "--roi-detection", action="store_true",
+            help="only look for shots around loaded targets. this is much " +
+                "faster with high resolution webcams, but misses that land " +
+                "away from every target won't be detected")
+        parser.add_argument("-g", "--roi-margin", type=self._check_margin,
+            help="sets how many pixels around each target are still checked " +
+                "for shots when detection is limited to targets")
+        parser.add_argument("-l", "--laser-color-classifier",
+            type=self._check_color_classifier,
+            help="sets how the color of a laser is decided (rgb or hsv). rgb " +
+                "picks the strongest color channel, hsv picks by hue and can " +
+                "work better with webcams that tint the feed. rgb is the default")
+        parser.add_argument("-p", "--pixel-centroids", action="store_true",
+            help="snap shot locations to whole pixels instead of finding the " +
+                "center of the laser to a fraction of a pixel")
+        parser.add_argument("-b", "--background-subtraction", action="store_true",
+            help="learn which parts of the feed are always bright (e.g. glare " +
+                "and reflections) and ignore them. LASER_INTENSITY is then " +
+                "compared to how much brighter than usual a pixel is, so it " +
+                "should usually be set lower")
+        parser.add_argument("-s", "--preview-scale",
+            type=self._check_preview_scale,
+            help="sets how big the webcam feed is shown as a percentage of " +
+                "the webcam's resolution [1,100]. shots are still detected " +
+                "at full resolution, showing a smaller feed just costs less")
+        parser.add_argument("-f", "--preview-fps", type=self._check_preview_fps,
+            help="sets the most frames per second the webcam feed is shown " +
+                "at [1,120]. this doesn't change how often shots are detected")
+        parser.add_argument("-o", "--shot-log", action="store_true",
+            help="write the shots of this session to a shot log file in " +
+                "ShootOFF's shot_logs directory")
+        parser.add_argument("-v", "--video",
+            help="detect shots on a recorded video file or a directory of " +
+                "frame images instead of the webcam")
         args = parser.parse_args()
 
         preferences[DEBUG] = args.debug
+        preferences[VIDEO_SOURCE] = args.video
 
         if args.detection_rate:
             preferences[DETECTION_RATE] = args.detection_rate
 
+        if args.detection_mode:
+            preferences[DETECTION_MODE] = args.detection_mode
+
         if args.laser_intensity:
             preferences[LASER_INTENSITY] = args.laser_intensity
 
@@ -79,6 +159,30 @@ class Configurator():
         if args.ignore_laser_color:
             preferences[IGNORE_LASER_COLOR] = args.ignore_laser_color
 
+        if args.roi_detection:
+            preferences[ROI_DETECTION] = args.roi_detection
+
+        if args.roi_margin is not None:
+            preferences[ROI_MARGIN] = args.roi_margin
+
+        if args.laser_color_classifier:
+            preferences[LASER_COLOR_CLASSIFIER] = args.laser_color_classifier
+
+        if args.pixel_centroids:
+            preferences[SUBPIXEL_CENTROIDS] = False
+
+        if args.background_subtraction:
+            preferences[BACKGROUND_SUBTRACTION] = args.background_subtraction
+
+        if args.preview_scale:
+            preferences[PREVIEW_SCALE] = args.preview_scale
+
+        if args.preview_fps:
+            preferences[PREVIEW_FPS] = args.preview_fps
+
+        if args.shot_log:
+            preferences[SHOT_LOG] = args.shot_log
+
         self._preferences = preferences
         self._config_parser = config
 
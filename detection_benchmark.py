@@ -0,0 +1,250 @@
+#!/usr/bin/env python2
+
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import argparse
+import logging
+import math
+import settings
+import shot_detector
+from shot_detector import ShotDetector
+import sys
+from video_replay import VideoReplay
+from webcam_capture import clock
+
+DEFAULT_POSITION_TOLERANCE = 10 # px
+DEFAULT_FRAME_TOLERANCE = 2 # frames
+
+# Adds up how long each stage of shot detection takes. The shot detector
+# calls mark when a stage finishes, and the time since the previous mark is
+# added to that stage's total.
+class StageTimer():
+    def start(self):
+        self._last_mark = clock()
+
+    def mark(self, stage):
+        now = clock()
+
+        if stage not in self._totals:
+            self._totals[stage] = 0.0
+            self._stages.append(stage)
+
+        self._totals[stage] += now - self._last_mark
+        self._last_mark = now
+
+    def get_stages(self):
+        return self._stages
+
+    def get_total(self, stage):
+        return self._totals[stage]
+
+    def __init__(self):
+        self._totals = {}
+        self._stages = []
+        self._last_mark = clock()
+
+# Replays a recording through the shot detector one frame at a time, so the
+# same recording always produces the same shots, and reports how fast each
+# stage ran and how the detected shots compare to the ground truth.
+class DetectionBenchmark():
+    def shot_listener(self, event):
+        if event[0] == shot_detector.SHOT_EVENT:
+            self._shots.append(event)
+
+    def run(self):
+        timer = StageTimer()
+        self._shot_detector.set_stage_timer(timer)
+
+        frame_count = 0
+        read_time = 0.0
+        detection_time = 0.0
+        frame = None
+
+        while True:
+            start = clock()
+            rval, frame = self._replay.read(image=frame)
+            read_time += clock() - start
+
+            if not rval:
+                break
+
+            timestamp = clock()
+            timer.start()
+            self._shot_detector.detect_shots(frame, timestamp, frame_count)
+            detection_time += clock() - timestamp
+
+            frame_count += 1
+
+        return (frame_count, read_time, detection_time, timer)
+
+    def report(self, results, ground_truth=None,
+        position_tolerance=DEFAULT_POSITION_TOLERANCE,
+        frame_tolerance=DEFAULT_FRAME_TOLERANCE):
+
+        (frame_count, read_time, detection_time, timer) = results
+        lines = []
+
+        lines.append("Frames: %d" % frame_count)
+
+        if frame_count == 0:
+            return lines
+
+        lines.append("Detection: %.1f frames/s (%.3f ms/frame)" %
+            (self._rate(frame_count, detection_time),
+            1000 * detection_time / frame_count))
+        lines.append("Including decoding: %.1f frames/s (%.3f ms/frame)" %
+            (self._rate(frame_count, read_time + detection_time),
+            1000 * (read_time + detection_time) / frame_count))
+
+        lines.append("Stage latency (ms/frame):")
+        lines.append("  %-10s %.3f" % ("decode", 1000 * read_time / frame_count))
+        for stage in timer.get_stages():
+            lines.append("  %-10s %.3f" % (stage,
+                1000 * timer.get_total(stage) / frame_count))
+
+        lines.append("Shots detected: %d" % len(self._shots))
+
+        if ground_truth is not None:
+            (matches, false_shots, missed_shots) = self.match_shots(
+                ground_truth, position_tolerance, frame_tolerance)
+
+            lines.append("Ground truth shots: %d" % len(ground_truth))
+            lines.append("Matched: %d, false shots: %d, missed shots: %d" %
+                (len(matches), len(false_shots), len(missed_shots)))
+
+            if len(ground_truth) > 0:
+                lines.append("Recall: %.3f" %
+                    (float(len(matches)) / len(ground_truth)))
+
+            if len(self._shots) > 0:
+                lines.append("Precision: %.3f" %
+                    (float(len(matches)) / len(self._shots)))
+
+            if len(matches) > 0:
+                mean_error = sum(error for (shot, truth, error) in matches)
+                lines.append("Mean position error: %.2f px" %
+                    (mean_error / len(matches)))
+
+        return lines
+
+    def _rate(self, frame_count, elapsed):
+        if elapsed <= 0:
+            return float("inf")
+
+        return frame_count / elapsed
+
+    # ground_truth is a list of (frame, x, y) tuples. Each ground truth shot
+    # is matched with the closest unmatched detected shot that is at most
+    # frame_tolerance frames and position_tolerance pixels away. Returns
+    # (matches, false_shots, missed_shots) where matches is a list of
+    # (shot, ground_truth_shot, position_error) tuples.
+    def match_shots(self, ground_truth, position_tolerance, frame_tolerance):
+        unmatched_shots = list(self._shots)
+        matches = []
+        missed_shots = []
+
+        for truth in ground_truth:
+            (frame, x, y) = truth
+            best_shot = None
+            best_error = None
+
+            for shot in unmatched_shots:
+                (event_type, laser_color, sx, sy, timestamp, sequence) = shot
+
+                if abs(sequence - frame) > frame_tolerance:
+                    continue
+
+                error = math.hypot(sx - x, sy - y)
+
+                if (error <= position_tolerance and
+                    (best_error is None or error < best_error)):
+                    best_shot = shot
+                    best_error = error
+
+            if best_shot is None:
+                missed_shots.append(truth)
+            else:
+                unmatched_shots.remove(best_shot)
+                matches.append((best_shot, truth, best_error))
+
+        return (matches, unmatched_shots, missed_shots)
+
+    def get_shots(self):
+        return self._shots
+
+    def __init__(self, replay, preferences, logger):
+        self._replay = replay
+        self._shots = []
+        self._shot_detector = ShotDetector(None, preferences, logger)
+        self._shot_detector.add_event_listener(self.shot_listener)
+
+# Ground truth files have one shot per line in the form frame,x,y where
+# frame is the 0-based index of the first frame the shot shows up in. Blank
+# lines and lines starting with # are ignored.
+def load_ground_truth(ground_truth_file):
+    ground_truth = []
+
+    with open(ground_truth_file, "r") as truth:
+        for line in truth:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            (frame, x, y) = line.split(",")[0:3]
+            ground_truth.append((int(frame), float(x), float(y)))
+
+    return ground_truth
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="detection_benchmark.py",
+        description="Replays a recording through ShootOFF's shot detection " +
+            "and reports how fast and how accurate it was. Detection " +
+            "settings are read from settings.conf.")
+    parser.add_argument("source",
+        help="video file or directory of frame images to replay")
+    parser.add_argument("-g", "--ground-truth",
+        help="file with the real shots, one frame,x,y line per shot")
+    parser.add_argument("-t", "--tolerance", type=float,
+        default=DEFAULT_POSITION_TOLERANCE,
+        help="how many pixels a detected shot can be from a real shot and " +
+            "still match it")
+    parser.add_argument("-f", "--frame-tolerance", type=int,
+        default=DEFAULT_FRAME_TOLERANCE,
+        help="how many frames a detected shot can be from a real shot and " +
+            "still match it")
+    parser.add_argument("-i", "--laser-intensity", type=int,
+        help="overrides the laser intensity from settings.conf")
+    parser.add_argument("-l", "--list-shots", action="store_true",
+        help="print every detected shot")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("shootoff")
+    logger.addHandler(logging.StreamHandler(sys.stderr))
+
+    config, preferences = settings.map_configuration()
+
+    if args.laser_intensity is not None:
+        preferences[settings.LASER_INTENSITY] = args.laser_intensity
+
+    replay = VideoReplay(args.source, realtime=False)
+    if not replay.isOpened():
+        logger.critical("Could not open %s for replay.", args.source)
+        sys.exit(1)
+
+    ground_truth = None
+    if args.ground_truth:
+        ground_truth = load_ground_truth(args.ground_truth)
+
+    benchmark = DetectionBenchmark(replay, preferences, logger)
+    results = benchmark.run()
+    replay.release()
+
+    if args.list_shots:
+        for (event_type, laser_color, x, y, timestamp, sequence) in benchmark.get_shots():
+            print "frame %d: %s shot at (%.2f, %.2f)" % (sequence, laser_color, x, y)
+
+    for line in benchmark.report(results, ground_truth, args.tolerance,
+        args.frame_tolerance):
+        print line
@@ -0,0 +1,53 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import math
+
+# This class converts coordinates between the webcam frames that shots are
+# detected in (frame space) and the canvas the feed is shown on (display
+# space). The feed can be shown smaller than the webcam captures it so that
+# drawing it costs less, but everything on the canvas (targets, shot
+# markers, clicks) is in display space, so shots have to be scaled down
+# before they are drawn and target areas scaled up before they are handed
+# to the shot detector.
+class DisplayTransform():
+    def to_display(self, x, y):
+        return (x * self._scale_x, y * self._scale_y)
+
+    def to_frame(self, x, y):
+        return (x / self._scale_x, y / self._scale_y)
+
+    # bbox is (x1, y1, x2, y2) in display space. The frame space box is
+    # rounded outwards so that it still covers the whole display box.
+    def bbox_to_frame(self, bbox):
+        (x1, y1) = self.to_frame(bbox[0], bbox[1])
+        (x2, y2) = self.to_frame(bbox[2], bbox[3])
+
+        return (int(math.floor(x1)), int(math.floor(y1)),
+            int(math.ceil(x2)), int(math.ceil(y2)))
+
+    def is_scaled(self):
+        return self._display_size != self._frame_size
+
+    def get_scale(self):
+        return (self._scale_x, self._scale_y)
+
+    def get_frame_size(self):
+        return self._frame_size
+
+    def get_display_size(self):
+        return self._display_size
+
+    # frame_size is the (width, height) of the webcam frames and scale is
+    # how big the feed should be shown compared to them (e.g. .5 for half
+    # size)
+    def __init__(self, frame_size, scale=1.0):
+        self._frame_size = (int(frame_size[0]), int(frame_size[1]))
+        self._display_size = (max(int(round(self._frame_size[0] * scale)), 1),
+            max(int(round(self._frame_size[1] * scale)), 1))
+
+        # The display size is rounded to whole pixels, so work out the
+        # scale that was really used along each axis
+        self._scale_x = float(self._display_size[0]) / self._frame_size[0]
+        self._scale_y = float(self._display_size[1]) / self._frame_size[1]
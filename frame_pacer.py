@@ -0,0 +1,136 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+from webcam_capture import clock
+
+# How quickly the measured frame interval and render time follow changes
+FRAME_INTERVAL_SMOOTHING = .1
+RENDER_TIME_SMOOTHING = .2
+# Drawing the feed shouldn't take up more than this fraction of the Tk
+# thread, otherwise the rest of the GUI stops responding
+MAX_RENDER_LOAD = .5
+# Wait a little after a frame should have been captured before asking for
+# it so that the capture thread has a chance to store it
+FRAME_ARRIVAL_SLACK = .002 # s
+MIN_DELAY = 1 # ms
+
+# This class decides when the webcam feed should be redrawn next. It
+# measures how often the webcam really delivers frames (drivers often
+# report a frame rate they don't deliver) and how long drawing a frame
+# takes, then aims each refresh at the moment the next frame is captured.
+# The feed is never drawn faster than the preview frame rate or so often
+# that drawing uses more than MAX_RENDER_LOAD of the time. Whenever it falls
+# behind, the frames it missed are skipped instead of being drawn late.
+# Frames left out on purpose to stay under the preview frame rate are
+# counted as throttled, not skipped, so the skipped count only goes up
+# when the feed can't keep up.
+class FramePacer():
+    # Call when a new frame is about to be drawn. sequence and timestamp
+    # are the frame's capture sequence number and time.
+    def frame_started(self, sequence, timestamp):
+        if self._last_sequence is not None and sequence > self._last_sequence:
+            missed = sequence - self._last_sequence - 1
+
+            # How many frames get_delay leaves out between two redraws to
+            # stay under the preview frame rate
+            throttled = max(int(1.0 / self._max_rate / self._frame_interval +
+                .5) - 1, 0)
+            throttled = min(throttled, missed)
+            self._throttled_frames += throttled
+            self._skipped_frames += missed - throttled
+
+            interval = (timestamp - self._last_timestamp) / (missed + 1)
+            if interval > 0:
+                self._frame_interval += FRAME_INTERVAL_SMOOTHING * (
+                    interval - self._frame_interval)
+
+        self._last_sequence = sequence
+        self._last_timestamp = timestamp
+        self._render_start = clock()
+
+    # Call when the frame passed to frame_started has been drawn
+    def frame_finished(self):
+        render_time = clock() - self._render_start
+
+        if self._render_time is None:
+            self._render_time = render_time
+        else:
+            self._render_time += RENDER_TIME_SMOOTHING * (
+                render_time - self._render_time)
+
+        self._last_render_start = self._render_start
+        self._rendered_frames += 1
+
+    # Returns how many ms to wait before refreshing the feed again after a
+    # frame was drawn
+    def get_delay(self):
+        now = clock()
+
+        if self._last_timestamp is None:
+            return self.get_poll_delay()
+
+        earliest = self._last_render_start + self.get_render_interval()
+
+        # Aim for the first frame captured after the earliest time we are
+        # allowed to draw again. If that moment has already passed we are
+        # behind, so draw whatever is newest right away. Drawing always
+        # starts a little after a frame is captured, so a frame that comes
+        # less than half an interval early is still taken.
+        next_frame = self._last_timestamp + self._frame_interval
+        frames_ahead = (earliest - next_frame) / self._frame_interval
+        if frames_ahead > .5:
+            next_frame += int(frames_ahead + .5) * self._frame_interval
+
+        delay = (next_frame + FRAME_ARRIVAL_SLACK - now) * 1000
+
+        return max(int(delay), MIN_DELAY)
+
+    # Returns how many ms to wait before checking again when the next frame
+    # hasn't been captured yet
+    def get_poll_delay(self):
+        return max(int(self._frame_interval * 1000 / 4), MIN_DELAY)
+
+    # Returns the shortest time in seconds allowed between two redraws
+    def get_render_interval(self):
+        interval = max(self._frame_interval, 1.0 / self._max_rate)
+
+        if self._render_time is not None:
+            interval = max(interval, self._render_time / MAX_RENDER_LOAD)
+
+        return interval
+
+    def set_max_rate(self, max_rate):
+        self._max_rate = float(max_rate)
+
+    def get_frame_rate(self):
+        return 1.0 / self._frame_interval
+
+    def get_render_time(self):
+        return self._render_time
+
+    def get_rendered_frame_count(self):
+        return self._rendered_frames
+
+    # Frames that were missed because drawing fell behind
+    def get_skipped_frame_count(self):
+        return self._skipped_frames
+
+    # Frames that were left out to stay under the preview frame rate
+    def get_throttled_frame_count(self):
+        return self._throttled_frames
+
+    # frame_rate is the rate the webcam says it captures at, it is only
+    # used until the real rate has been measured. max_rate is the highest
+    # rate the feed should be drawn at.
+    def __init__(self, frame_rate, max_rate):
+        self._frame_interval = 1.0 / frame_rate
+        self._max_rate = float(max_rate)
+        self._render_time = None
+        self._render_start = None
+        self._last_render_start = 0
+        self._last_sequence = None
+        self._last_timestamp = None
+        self._rendered_frames = 0
+        self._skipped_frames = 0
+        self._throttled_frames = 0
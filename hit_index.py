@@ -0,0 +1,133 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+from shape_library import OVAL, POLYGON, RECTANGLE
+
+# Returns True if (x, y) is inside the shape. shape_type is the kind of
+# canvas item the shape is drawn as and coords are its canvas coordinates.
+def shape_contains(shape_type, coords, x, y):
+    if shape_type == RECTANGLE:
+        return (min(coords[0], coords[2]) <= x <= max(coords[0], coords[2]) and
+            min(coords[1], coords[3]) <= y <= max(coords[1], coords[3]))
+
+    if shape_type == OVAL:
+        radius_x = abs(coords[2] - coords[0]) / 2.0
+        radius_y = abs(coords[3] - coords[1]) / 2.0
+
+        if radius_x == 0 or radius_y == 0:
+            return False
+
+        dx = (x - (coords[0] + coords[2]) / 2.0) / radius_x
+        dy = (y - (coords[1] + coords[3]) / 2.0) / radius_y
+        return dx * dx + dy * dy <= 1
+
+    if shape_type == POLYGON:
+        return polygon_contains(coords, x, y)
+
+    return False
+
+# Even-odd ray casting, which is also how the canvas fills polygons
+def polygon_contains(coords, x, y):
+    xs = coords[::2]
+    ys = coords[1::2]
+    inside = False
+
+    j = len(xs) - 1
+    for i in range(len(xs)):
+        if ((ys[i] > y) != (ys[j] > y) and
+            x < (xs[j] - xs[i]) * (y - ys[i]) / float(ys[j] - ys[i]) + xs[i]):
+            inside = not inside
+        j = i
+
+    return inside
+
+def _bounding_box(coords):
+    xs = coords[::2]
+    ys = coords[1::2]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+def _bbox_contains(bbox, x, y):
+    return bbox[0] <= x <= bbox[2] and bbox[1] <= y <= bbox[3]
+
+# This class keeps a copy of the geometry of every target region so that
+# shots can be tested against the real shape of each region without asking
+# the canvas. Targets are kept in stacking order (last added on top) and so
+# are the regions in each target. Each target's bounding box is checked
+# before any of its regions are, so a shot only does exact shape tests for
+# the targets it landed near.
+class HitIndex():
+    # regions is a list of (region, shape_type, coords, tags) tuples for
+    # the target in stacking order, lowest first. region is whatever the
+    # caller uses to identify the region (e.g. its canvas id) and tags is
+    # the region's parsed tags. If the target is already indexed it is
+    # replaced but keeps its place in the stacking order.
+    def set_target(self, target_name, regions):
+        entries = []
+
+        for (region, shape_type, coords, tags) in regions:
+            coords = tuple(coords)
+            if len(coords) < 4:
+                continue
+
+            entries.append((region, shape_type, coords,
+                _bounding_box(coords), tags))
+
+        if len(entries) == 0:
+            self.remove_target(target_name)
+            return
+
+        target_bbox = (min(entry[3][0] for entry in entries),
+            min(entry[3][1] for entry in entries),
+            max(entry[3][2] for entry in entries),
+            max(entry[3][3] for entry in entries))
+
+        if target_name not in self._targets:
+            self._target_order.append(target_name)
+
+        self._targets[target_name] = (target_bbox, entries)
+
+    def remove_target(self, target_name):
+        if target_name in self._targets:
+            del self._targets[target_name]
+            self._target_order.remove(target_name)
+
+    def clear(self):
+        self._targets = {}
+        self._target_order = []
+
+    # Returns a list of (region, tags) for every region that contains
+    # (x, y), top most region first
+    def find_regions(self, x, y):
+        return list(self._hits(x, y))
+
+    # Returns (region, tags) for the top most region that contains (x, y)
+    # or None if no region does
+    def find_top_region(self, x, y):
+        return next(self._hits(x, y), None)
+
+    def _hits(self, x, y):
+        for target_name in reversed(self._target_order):
+            (target_bbox, entries) = self._targets[target_name]
+
+            if not _bbox_contains(target_bbox, x, y):
+                continue
+
+            for (region, shape_type, coords, bbox, tags) in reversed(entries):
+                if (_bbox_contains(bbox, x, y) and
+                    shape_contains(shape_type, coords, x, y)):
+                    yield (region, tags)
+
+    # Returns the regions of a target in stacking order, lowest first
+    def get_regions(self, target_name):
+        if target_name not in self._targets:
+            return []
+
+        return [entry[0] for entry in self._targets[target_name][1]]
+
+    def get_target_names(self):
+        return list(self._target_order)
+
+    def __init__(self):
+        self._targets = {}
+        self._target_order = []
@@ -0,0 +1,96 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import cv2
+import numpy
+
+IDLE_TIME = 3 # s
+PULSE_TIME = 5 # s
+
+# Fraction of idle pixels that are allowed to be brighter than the chosen
+# threshold. A handful of hot pixels shouldn't drag the threshold up.
+IDLE_OUTLIER_FRACTION = .00001
+# A brightness level only counts as laser light if at least this many more
+# pulse pixels reached it than idle pixels did
+MIN_LASER_PIXELS = 3
+
+# This class works out the laser intensity threshold for a webcam. Frames of
+# the feed with no laser on it (idle frames) and frames taken while the
+# shooter fires at the feed (pulse frames) are added to grayscale
+# brightness histograms, the same brightness the shot detector compares the
+# laser intensity to. The threshold is put halfway between the
+# brightest idle light and the brightest laser light, which keeps it as far
+# as possible from both false shots and missed shots.
+class LaserCalibrator():
+    def add_idle_frame(self, frame):
+        self._idle_histogram += self._histogram(frame)
+        self._idle_frame_count += 1
+
+    def add_pulse_frame(self, frame):
+        self._pulse_histogram += self._histogram(frame)
+        self._pulse_frame_count += 1
+
+    def _histogram(self, frame):
+        frame_bw = cv2.cvtColor(frame, cv2.cv.CV_BGR2GRAY)
+        return cv2.calcHist([frame_bw], [0], None, [256], [0, 256]).ravel()
+
+    def get_idle_frame_count(self):
+        return self._idle_frame_count
+
+    def get_pulse_frame_count(self):
+        return self._pulse_frame_count
+
+    # Returns the brightest level in the idle histogram once the brightest
+    # IDLE_OUTLIER_FRACTION of pixels are ignored
+    def get_idle_peak(self):
+        histogram = self._idle_histogram
+        total = histogram.sum()
+
+        if total == 0:
+            return None
+
+        # Count pixels from the brightest level down
+        brighter = numpy.cumsum(histogram[::-1])[::-1]
+        levels = numpy.nonzero(brighter > total * IDLE_OUTLIER_FRACTION)[0]
+
+        return int(levels[-1])
+
+    # Returns the brightest level that at least MIN_LASER_PIXELS more pixels
+    # reached in the pulse frames than in as many idle frames. Light that is
+    # on the feed whether or not the laser is (e.g. a small hot spot) is
+    # subtracted out, so it can't pass for the laser.
+    def get_pulse_peak(self):
+        if self._pulse_frame_count == 0:
+            return None
+
+        histogram = self._pulse_histogram
+        if self._idle_frame_count > 0:
+            histogram = histogram - self._idle_histogram * (
+                float(self._pulse_frame_count) / self._idle_frame_count)
+
+        levels = numpy.nonzero(histogram >= MIN_LASER_PIXELS)[0]
+
+        if len(levels) == 0:
+            return None
+
+        return int(levels[-1])
+
+    # Returns the laser intensity that separates the idle feed from the
+    # laser or None if the laser never got brighter than the idle feed
+    def compute_threshold(self):
+        idle_peak = self.get_idle_peak()
+        pulse_peak = self.get_pulse_peak()
+
+        if idle_peak is None or pulse_peak is None or pulse_peak <= idle_peak:
+            return None
+
+        # Thresholding keeps pixels that are strictly brighter than the
+        # threshold, so it has to stay below the laser's peak
+        return min(int(round((idle_peak + pulse_peak) / 2.0)), pulse_peak - 1)
+
+    def __init__(self):
+        self._idle_histogram = numpy.zeros(256, numpy.float64)
+        self._pulse_histogram = numpy.zeros(256, numpy.float64)
+        self._idle_frame_count = 0
+        self._pulse_frame_count = 0
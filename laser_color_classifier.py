@@ -0,0 +1,118 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import cv2
+import numpy
+
+RGB_CLASSIFIER = "rgb"
+HSV_CLASSIFIER = "hsv"
+
+SAMPLE_RADIUS = 10 # px
+
+# OpenCV hues go from 0 to 180
+RED_HUE_RANGES = ((0, 15), (165, 180))
+GREEN_HUE_RANGES = ((35, 90),)
+MIN_SATURATION = 40
+
+# Offsets of every pixel within SAMPLE_RADIUS of a point. These are computed
+# once so that classifying a laser only reads the pixels around it.
+_offset_range = numpy.arange(-SAMPLE_RADIUS, SAMPLE_RADIUS + 1)
+_offset_y, _offset_x = numpy.meshgrid(_offset_range, _offset_range,
+    indexing="ij")
+_in_circle = (_offset_x ** 2 + _offset_y ** 2) <= SAMPLE_RADIUS ** 2
+SAMPLE_OFFSETS_X = _offset_x[_in_circle]
+SAMPLE_OFFSETS_Y = _offset_y[_in_circle]
+
+# This class decides which color laser made a spot on the webcam feed by
+# averaging the color in a circle around the spot. If the dominant color is
+# red it's a red laser, if it's green it's a green laser, otherwise it's
+# probably not a laser trainer and the spot should be ignored. Any number of
+# spots can be classified at once.
+class LaserColorClassifier():
+    # points is a sequence of (x, y) coordinates on frame (which is in BGR).
+    # Returns a list with "red", "green2" or None for each point.
+    @staticmethod
+    def classify(frame, points, classifier=RGB_CLASSIFIER):
+        if len(points) == 0:
+            return []
+
+        mean_colors = LaserColorClassifier.mean_colors(frame, points)
+
+        if classifier == HSV_CLASSIFIER:
+            return LaserColorClassifier.classify_hsv(mean_colors)
+
+        return LaserColorClassifier.classify_rgb(mean_colors)
+
+    # Returns an N x 3 array with the mean BGR color inside the sample circle
+    # around each point. Pixels of the circle that are off the frame are
+    # left out of the mean.
+    @staticmethod
+    def mean_colors(frame, points):
+        height = frame.shape[0]
+        width = frame.shape[1]
+
+        points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 2)
+        centers_x = numpy.round(points[:, 0]).astype(numpy.intp)
+        centers_y = numpy.round(points[:, 1]).astype(numpy.intp)
+
+        sample_x = centers_x[:, numpy.newaxis] + SAMPLE_OFFSETS_X
+        sample_y = centers_y[:, numpy.newaxis] + SAMPLE_OFFSETS_Y
+
+        on_frame = ((sample_x >= 0) & (sample_x < width) &
+            (sample_y >= 0) & (sample_y < height))
+
+        samples = frame[numpy.clip(sample_y, 0, height - 1),
+            numpy.clip(sample_x, 0, width - 1)].astype(numpy.float32)
+        samples *= on_frame[:, :, numpy.newaxis]
+
+        counts = numpy.maximum(on_frame.sum(axis=1), 1)
+        return samples.sum(axis=1) / counts[:, numpy.newaxis]
+
+    @staticmethod
+    def classify_rgb(mean_colors):
+        # Remember that the colors are in BGR
+        b = mean_colors[:, 0]
+        g = mean_colors[:, 1]
+        r = mean_colors[:, 2]
+
+        is_red = (r > g) & (r > b)
+        is_green = (g > r) & (g > b)
+
+        return LaserColorClassifier._to_color_names(is_red, is_green)
+
+    # Classify by hue instead of by the largest channel. This copes better
+    # with webcams whose white balance tints everything towards one channel.
+    @staticmethod
+    def classify_hsv(mean_colors):
+        bgr = numpy.clip(numpy.round(mean_colors), 0, 255).astype(numpy.uint8)
+        hsv = cv2.cvtColor(bgr.reshape(-1, 1, 3),
+            cv2.cv.CV_BGR2HSV).reshape(-1, 3)
+
+        hue = hsv[:, 0]
+        is_saturated = hsv[:, 1] >= MIN_SATURATION
+
+        is_red = numpy.zeros(len(hue), dtype=bool)
+        for (low, high) in RED_HUE_RANGES:
+            is_red |= (hue >= low) & (hue <= high)
+
+        is_green = numpy.zeros(len(hue), dtype=bool)
+        for (low, high) in GREEN_HUE_RANGES:
+            is_green |= (hue >= low) & (hue <= high)
+
+        return LaserColorClassifier._to_color_names(is_red & is_saturated,
+            is_green & is_saturated)
+
+    @staticmethod
+    def _to_color_names(is_red, is_green):
+        colors = []
+
+        for red, green in zip(is_red, is_green):
+            if red:
+                colors.append("red")
+            elif green:
+                colors.append("green2")
+            else:
+                colors.append(None)
+
+        return colors
@@ -2,100 +2,100 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
-import ConfigParser
-import configurator
-import os
+import settings
 import Tkinter, ttk
 
-DEFAULT_DETECTION_RATE = 100 #ms
-DEFAULT_LASER_INTENSITY = 230
-DEFAULT_MARKER_RADIUS = 2 #px
-DEFAULT_IGNORE_LASER_COLOR = "none"
-
 class PreferencesEditor():
-    @staticmethod
-    def map_configuration():
-        config = ConfigParser.SafeConfigParser()
-        config.read("settings.conf")
-        preferences = {}    
-
-        if os.path.exists("settings.conf"):
-            try:
-                preferences[configurator.DETECTION_RATE] = config.getint("ShootOFF",
-                    configurator.DETECTION_RATE)
-            except ConfigParser.NoOptionError:
-                preferences[configurator.DETECTION_RATE] = DEFAULT_DETECTION_RATE
-
-            try:
-                preferences[configurator.LASER_INTENSITY] = config.getint("ShootOFF",
-                    configurator.LASER_INTENSITY)
-            except ConfigParser.NoOptionError:
-                preferences[configurator.LASER_INTENSITY] = DEFAULT_LASER_INTENSITY
-
-            try:
-                preferences[configurator.MARKER_RADIUS] = config.getint("ShootOFF",
-			configurator.MARKER_RADIUS)
-            except ConfigParser.NoOptionError:
-                preferences[configurator.MARKER_RADIUS] = DEFAULT_MARKER_RADIUS
-
-            try:
-                preferences[configurator.IGNORE_LASER_COLOR] = config.get("ShootOFF",
-                    configurator.IGNORE_LASER_COLOR)
-            except ConfigParser.NoOptionError:
-                preferences[configurator.IGNORE_LASER_COLOR] = DEFAULT_IGNORE_LASER_COLOR
-        else:
-            preferences[configurator.DETECTION_RATE] = DEFAULT_DETECTION_RATE
-            preferences[configurator.LASER_INTENSITY] = DEFAULT_LASER_INTENSITY
-            preferences[configurator.MARKER_RADIUS] = DEFAULT_MARKER_RADIUS
-            preferences[configurator.IGNORE_LASER_COLOR] = DEFAULT_IGNORE_LASER_COLOR
-
-            config.add_section("ShootOFF")
-            config.set("ShootOFF", configurator.DETECTION_RATE, 
-                str(preferences[configurator.DETECTION_RATE]))   
-            config.set("ShootOFF", configurator.LASER_INTENSITY, 
-                str(preferences[configurator.LASER_INTENSITY]))
-            config.set("ShootOFF", configurator.MARKER_RADIUS, 
-                str(preferences[configurator.MARKER_RADIUS]))
-            config.set("ShootOFF", configurator.IGNORE_LASER_COLOR, 
-                preferences[configurator.IGNORE_LASER_COLOR])    
-
-            with open("settings.conf", "w") as config_file:
-                config.write(config_file)
-
-        return config, preferences
-
     def save_preferences(self):
         if self._detection_rate_spinbox.get():
-            self._preferences[configurator.DETECTION_RATE] = int(
+            self._preferences[settings.DETECTION_RATE] = int(
                 self._detection_rate_spinbox.get())
         else:
-            self._preferences[configurator.DETECTION_RATE] = DEFAULT_DETECTION_RATE
+            self._preferences[settings.DETECTION_RATE] = settings.DEFAULT_DETECTION_RATE
+
+        if self._detection_mode_combo.get():
+            self._preferences[settings.DETECTION_MODE] = self._detection_mode_combo.get()
+        else:
+            self._preferences[settings.DETECTION_MODE] = settings.DEFAULT_DETECTION_MODE
 
         if self._laser_intensity_spinbox.get():
-            self._preferences[configurator.LASER_INTENSITY] = int(
+            self._preferences[settings.LASER_INTENSITY] = int(
                 self._laser_intensity_spinbox.get())
         else:
-            self._preferences[configurator.LASER_INTENSITY] = DEFAULT_LASER_INTENSITY
+            self._preferences[settings.LASER_INTENSITY] = settings.DEFAULT_LASER_INTENSITY
 
         if self._marker_radius_spinbox.get():
-            self._preferences[configurator.MARKER_RADIUS] = int(
+            self._preferences[settings.MARKER_RADIUS] = int(
                 self._marker_radius_spinbox.get())
         else:
-            self._preferences[configurator.MARKER_RADIUS] = DEFAULT_MARKER_RADIUS
+            self._preferences[settings.MARKER_RADIUS] = settings.DEFAULT_MARKER_RADIUS
 
         if self._ignore_laser_color_combo.get():
-            self._preferences[configurator.IGNORE_LASER_COLOR] = self._ignore_laser_color_combo.get()
+            self._preferences[settings.IGNORE_LASER_COLOR] = self._ignore_laser_color_combo.get()
+        else:
+            self._preferences[settings.IGNORE_LASER_COLOR] = settings.DEFAULT_IGNORE_LASER_COLOR
+
+        self._preferences[settings.ROI_DETECTION] = bool(
+            self._roi_detection_state.get())
+
+        if self._roi_margin_spinbox.get():
+            self._preferences[settings.ROI_MARGIN] = int(
+                self._roi_margin_spinbox.get())
+        else:
+            self._preferences[settings.ROI_MARGIN] = settings.DEFAULT_ROI_MARGIN
+
+        if self._laser_color_classifier_combo.get():
+            self._preferences[settings.LASER_COLOR_CLASSIFIER] = self._laser_color_classifier_combo.get()
         else:
-            self._preferences[configurator.IGNORE_LASER_COLOR] = DEFAULT_IGNORE_LASER_COLOR
+            self._preferences[settings.LASER_COLOR_CLASSIFIER] = settings.DEFAULT_LASER_COLOR_CLASSIFIER
+
+        self._preferences[settings.SUBPIXEL_CENTROIDS] = bool(
+            self._subpixel_centroids_state.get())
 
-        self._config_parser.set("ShootOFF", configurator.DETECTION_RATE, 
-            str(self._preferences[configurator.DETECTION_RATE]))
-        self._config_parser.set("ShootOFF", configurator.LASER_INTENSITY,
-            str(self._preferences[configurator.LASER_INTENSITY]))
-        self._config_parser.set("ShootOFF", configurator.MARKER_RADIUS,
-            str(self._preferences[configurator.MARKER_RADIUS]))
-        self._config_parser.set("ShootOFF", configurator.IGNORE_LASER_COLOR,
-            self._preferences[configurator.IGNORE_LASER_COLOR])
+        self._preferences[settings.BACKGROUND_SUBTRACTION] = bool(
+            self._background_subtraction_state.get())
+
+        if self._preview_scale_spinbox.get():
+            self._preferences[settings.PREVIEW_SCALE] = int(
+                self._preview_scale_spinbox.get())
+        else:
+            self._preferences[settings.PREVIEW_SCALE] = settings.DEFAULT_PREVIEW_SCALE
+
+        if self._preview_fps_spinbox.get():
+            self._preferences[settings.PREVIEW_FPS] = int(
+                self._preview_fps_spinbox.get())
+        else:
+            self._preferences[settings.PREVIEW_FPS] = settings.DEFAULT_PREVIEW_FPS
+
+        self._preferences[settings.SHOT_LOG] = bool(
+            self._shot_log_state.get())
+
+        self._config_parser.set("ShootOFF", settings.DETECTION_RATE, 
+            str(self._preferences[settings.DETECTION_RATE]))
+        self._config_parser.set("ShootOFF", settings.DETECTION_MODE,
+            self._preferences[settings.DETECTION_MODE])
+        self._config_parser.set("ShootOFF", settings.LASER_INTENSITY,
+            str(self._preferences[settings.LASER_INTENSITY]))
+        self._config_parser.set("ShootOFF", settings.MARKER_RADIUS,
+            str(self._preferences[settings.MARKER_RADIUS]))
+        self._config_parser.set("ShootOFF", settings.IGNORE_LASER_COLOR,
+            self._preferences[settings.IGNORE_LASER_COLOR])
+        self._config_parser.set("ShootOFF", settings.ROI_DETECTION,
+            str(self._preferences[settings.ROI_DETECTION]))
+        self._config_parser.set("ShootOFF", settings.ROI_MARGIN,
+            str(self._preferences[settings.ROI_MARGIN]))
+        self._config_parser.set("ShootOFF", settings.LASER_COLOR_CLASSIFIER,
+            self._preferences[settings.LASER_COLOR_CLASSIFIER])
+        self._config_parser.set("ShootOFF", settings.SUBPIXEL_CENTROIDS,
+            str(self._preferences[settings.SUBPIXEL_CENTROIDS]))
+        self._config_parser.set("ShootOFF", settings.BACKGROUND_SUBTRACTION,
+            str(self._preferences[settings.BACKGROUND_SUBTRACTION]))
+        self._config_parser.set("ShootOFF", settings.PREVIEW_SCALE,
+            str(self._preferences[settings.PREVIEW_SCALE]))
+        self._config_parser.set("ShootOFF", settings.PREVIEW_FPS,
+            str(self._preferences[settings.PREVIEW_FPS]))
+        self._config_parser.set("ShootOFF", settings.SHOT_LOG,
+            str(self._preferences[settings.SHOT_LOG]))
 
         with open("settings.conf", "w") as config_file:
             self._config_parser.write(config_file)
@@ -111,59 +111,150 @@ class PreferencesEditor():
         self._frame.pack(padx=15, pady=15)
 
         ttk.Label(self._frame, 
-            text="Detection Rate (ms): ").grid(column=0, row=0)
+            text="Detection Mode: ").grid(column=0, row=0)
+
+        self._detection_mode_combo = ttk.Combobox(self._frame, values=["frame", "rate"],
+            state="readonly")
+        self._detection_mode_combo.set(self._preferences[settings.DETECTION_MODE])
+        self._detection_mode_combo.grid(column=1, row=0)
+
+        ttk.Label(self._frame, 
+            text="Detection Rate (ms): ").grid(column=0, row=1)
 
         self._detection_rate_spinbox = Tkinter.Spinbox(self._frame, from_=1,
             to=60000)
         self._detection_rate_spinbox.delete(0, Tkinter.END)
         self._detection_rate_spinbox.insert(0, 
-            self._preferences[configurator.DETECTION_RATE])
+            self._preferences[settings.DETECTION_RATE])
         rate_validator = (self._window.register(self.check_detection_rate),'%P')
         self._detection_rate_spinbox.config(validate="key",
             validatecommand=rate_validator)
-        self._detection_rate_spinbox.grid(column=1, row=0)
+        self._detection_rate_spinbox.grid(column=1, row=1)
 
         ttk.Label(self._frame, 
-            text="Laser Intensity: ").grid(column=0, row=1)
+            text="Laser Intensity: ").grid(column=0, row=2)
 
         self._laser_intensity_spinbox = Tkinter.Spinbox(self._frame, from_=0,
             to=255)
         self._laser_intensity_spinbox.delete(0, Tkinter.END)
         self._laser_intensity_spinbox.insert(0, 
-            self._preferences[configurator.LASER_INTENSITY])
+            self._preferences[settings.LASER_INTENSITY])
         intensity_validator = (self._window.register(self.check_laser_intensity),
             '%P')
         self._laser_intensity_spinbox.config(validate="key",
             validatecommand=intensity_validator)
-        self._laser_intensity_spinbox.grid(column=1, row=1)
+        self._laser_intensity_spinbox.grid(column=1, row=2)
 
         ttk.Label(self._frame, 
-            text="Marker Radius: ").grid(column=0, row=2)
+            text="Marker Radius: ").grid(column=0, row=3)
 
         self._marker_radius_spinbox = Tkinter.Spinbox(self._frame, from_=1,
             to=20)  
         self._marker_radius_spinbox.delete(0, Tkinter.END)
         self._marker_radius_spinbox.insert(0, 
-            self._preferences[configurator.MARKER_RADIUS])
+            self._preferences[settings.MARKER_RADIUS])
         radius_validator = (self._window.register(self.check_marker_radius),'%P')
         self._marker_radius_spinbox.config(validate="key",
             validatecommand=radius_validator)
-        self._marker_radius_spinbox.grid(column=1, row=2)  
+        self._marker_radius_spinbox.grid(column=1, row=3)  
 
         ttk.Label(self._frame, 
-            text="Ignore Laser Color: ").grid(column=0, row=3)
+            text="Ignore Laser Color: ").grid(column=0, row=4)
 
         self._ignore_laser_color_combo = ttk.Combobox(self._frame, values=["none", "red", "green"],
             state="readonly")
-        self._ignore_laser_color_combo.set(self._preferences[configurator.IGNORE_LASER_COLOR])
-        self._ignore_laser_color_combo.grid(column=1, row=3)
+        self._ignore_laser_color_combo.set(self._preferences[settings.IGNORE_LASER_COLOR])
+        self._ignore_laser_color_combo.grid(column=1, row=4)
+
+        ttk.Label(self._frame, 
+            text="Only Detect Around Targets: ").grid(column=0, row=5)
+
+        self._roi_detection_state = Tkinter.IntVar()
+        self._roi_detection_state.set(self._preferences[settings.ROI_DETECTION])
+        self._roi_detection_checkbutton = ttk.Checkbutton(self._frame,
+            variable=self._roi_detection_state)
+        self._roi_detection_checkbutton.grid(column=1, row=5)
+
+        ttk.Label(self._frame, 
+            text="Target Detection Margin (px): ").grid(column=0, row=6)
+
+        self._roi_margin_spinbox = Tkinter.Spinbox(self._frame, from_=0,
+            to=1000)
+        self._roi_margin_spinbox.delete(0, Tkinter.END)
+        self._roi_margin_spinbox.insert(0, 
+            self._preferences[settings.ROI_MARGIN])
+        margin_validator = (self._window.register(self.check_roi_margin),'%P')
+        self._roi_margin_spinbox.config(validate="key",
+            validatecommand=margin_validator)
+        self._roi_margin_spinbox.grid(column=1, row=6)
+
+        ttk.Label(self._frame, 
+            text="Laser Color Classifier: ").grid(column=0, row=7)
+
+        self._laser_color_classifier_combo = ttk.Combobox(self._frame, values=["rgb", "hsv"],
+            state="readonly")
+        self._laser_color_classifier_combo.set(self._preferences[settings.LASER_COLOR_CLASSIFIER])
+        self._laser_color_classifier_combo.grid(column=1, row=7)
+
+        ttk.Label(self._frame, 
+            text="Sub-pixel Shot Locations: ").grid(column=0, row=8)
+
+        self._subpixel_centroids_state = Tkinter.IntVar()
+        self._subpixel_centroids_state.set(self._preferences[settings.SUBPIXEL_CENTROIDS])
+        self._subpixel_centroids_checkbutton = ttk.Checkbutton(self._frame,
+            variable=self._subpixel_centroids_state)
+        self._subpixel_centroids_checkbutton.grid(column=1, row=8)
+
+        ttk.Label(self._frame, 
+            text="Ignore Steady Glare: ").grid(column=0, row=9)
+
+        self._background_subtraction_state = Tkinter.IntVar()
+        self._background_subtraction_state.set(self._preferences[settings.BACKGROUND_SUBTRACTION])
+        self._background_subtraction_checkbutton = ttk.Checkbutton(self._frame,
+            variable=self._background_subtraction_state)
+        self._background_subtraction_checkbutton.grid(column=1, row=9)
+
+        ttk.Label(self._frame, 
+            text="Feed Preview Scale (%): ").grid(column=0, row=10)
+
+        self._preview_scale_spinbox = Tkinter.Spinbox(self._frame, from_=1,
+            to=100)
+        self._preview_scale_spinbox.delete(0, Tkinter.END)
+        self._preview_scale_spinbox.insert(0, 
+            self._preferences[settings.PREVIEW_SCALE])
+        scale_validator = (self._window.register(self.check_preview_scale),'%P')
+        self._preview_scale_spinbox.config(validate="key",
+            validatecommand=scale_validator)
+        self._preview_scale_spinbox.grid(column=1, row=10)
+
+        ttk.Label(self._frame, 
+            text="Feed Preview FPS: ").grid(column=0, row=11)
+
+        self._preview_fps_spinbox = Tkinter.Spinbox(self._frame, from_=1,
+            to=120)
+        self._preview_fps_spinbox.delete(0, Tkinter.END)
+        self._preview_fps_spinbox.insert(0, 
+            self._preferences[settings.PREVIEW_FPS])
+        fps_validator = (self._window.register(self.check_preview_fps),'%P')
+        self._preview_fps_spinbox.config(validate="key",
+            validatecommand=fps_validator)
+        self._preview_fps_spinbox.grid(column=1, row=11)
+
+        ttk.Label(self._frame, 
+            text="Log Shots To File: ").grid(column=0, row=12)
+
+        self._shot_log_state = Tkinter.IntVar()
+        self._shot_log_state.set(self._preferences[settings.SHOT_LOG])
+        self._shot_log_checkbutton = ttk.Checkbutton(self._frame,
+            variable=self._shot_log_state)
+        self._shot_log_checkbutton.grid(column=1, row=12)
 
         self._ok_button = ttk.Button(self._frame, text="OK",
             command=self.save_preferences, width=10)
-        self._ok_button.grid(column=0, row=4)
+        self._ok_button.grid(column=0, row=13)
         self._cancel_button = ttk.Button(self._frame, text="Cancel",
             command=self._window.destroy, width=10)
-        self._cancel_button.grid(column=1, row=4)
+        self._cancel_button.grid(column=1, row=13)
 
         # Center this window on its parent
         parent_width = parent.winfo_width()
@@ -197,6 +288,24 @@ class PreferencesEditor():
         else:
             return False
 
+    def check_roi_margin(self, P):
+        if P.isdigit() or not P:
+            return True
+        else:
+            return False
+
+    def check_preview_scale(self, P):
+        if (P.isdigit() and int(P) >= 1 and int(P) <= 100) or not P:
+            return True
+        else:
+            return False
+
+    def check_preview_fps(self, P):
+        if (P.isdigit() and int(P) >= 1 and int(P) <= 120) or not P:
+            return True
+        else:
+            return False
+
     def __init__(self, parent, config_parser, preferences):
         self._config_parser = config_parser
         self._preferences = preferences
@@ -0,0 +1,137 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import re
+
+# Commands look like command_name(arg0,arg1,...,argN), commands without
+# arguments can leave off the parens
+COMMAND_PATTERN = re.compile(r'(\w[\w\d_]*)\((.*)\)$')
+
+# A region command that has already been parsed. Calling it runs the
+# command's handler with the command's arguments. The arguments as they
+# were written in the tag are kept so that the command can be prepared
+# again when a different handler is registered for it.
+class RegionCommand():
+    def __call__(self):
+        handler = self._registry.get_handler(self._name)
+
+        if handler is not None:
+            handler(*self._args)
+
+    def get_name(self):
+        return self._name
+
+    def get_args(self):
+        return self._args
+
+    def set_args(self, args):
+        self._args = tuple(args)
+
+    def get_raw_args(self):
+        return self._raw_args
+
+    def __init__(self, registry, name, args):
+        self._registry = registry
+        self._name = name
+        self._raw_args = tuple(args)
+        self._args = self._raw_args
+
+# This class knows every command that can be attached to a target region
+# and turns command tags into RegionCommands. Each distinct list of command
+# tags is only parsed once, the first time a target with it is loaded, so
+# hits on command regions don't parse anything. Training protocols can
+# register their own commands through ProtocolOperations. Registering a
+# name that is already registered (e.g. a protocol replacing play_sound)
+# hides the old handler until the new one is unregistered.
+class CommandRegistry():
+    # handler is called with the command's arguments (as strings) when a
+    # region with the command is hit. preparer is optional, it is called
+    # with the arguments when a command is parsed and returns the arguments
+    # the handler will get. It is the place to check arguments and load
+    # whatever the command needs (e.g. sound files) ahead of time.
+    def register(self, name, handler, preparer=None):
+        self._handlers.setdefault(name, []).append((handler, preparer))
+
+        # Commands for this name may have been parsed before it was
+        # registered or prepared for the handler this one hides
+        self._prepare_all(name)
+
+    # Removes the handler registered last for name, the one it hid (if
+    # any) takes over again
+    def unregister(self, name):
+        if name not in self._handlers:
+            return
+
+        self._handlers[name].pop()
+        if len(self._handlers[name]) == 0:
+            del self._handlers[name]
+
+        self._prepare_all(name)
+
+    def get_handler(self, name):
+        if name not in self._handlers:
+            return None
+
+        return self._handlers[name][-1][0]
+
+    # Returns a tuple with a RegionCommand for each tag in command_tags,
+    # parsing them if they haven't been seen before
+    def get_commands(self, command_tags):
+        command_tags = tuple(command_tags)
+
+        if command_tags not in self._commands:
+            self._commands[command_tags] = tuple(
+                self._parse_command(tag) for tag in command_tags)
+
+        return self._commands[command_tags]
+
+    def _parse_command(self, command_tag):
+        name = command_tag
+        args = ()
+
+        match = COMMAND_PATTERN.match(command_tag)
+        if match:
+            name = match.groups()[0]
+            if match.groups()[1]:
+                args = match.groups()[1].split(",")
+
+        if name not in self._handlers:
+            self._logger.debug("Region command %s isn't registered yet", name)
+
+        command = RegionCommand(self, name, args)
+        self._prepare(command)
+
+        return command
+
+    def _prepare_all(self, name):
+        for commands in self._commands.values():
+            for command in commands:
+                if command.get_name() == name:
+                    self._prepare(command)
+
+    # Commands are always prepared from the arguments in their tag, never
+    # from what an earlier preparer turned them into
+    def _prepare(self, command):
+        args = command.get_raw_args()
+        command.set_args(args)
+
+        if command.get_name() not in self._handlers:
+            return
+
+        preparer = self._handlers[command.get_name()][-1][1]
+        if preparer is None:
+            return
+
+        try:
+            command.set_args(preparer(*args))
+        except Exception as e:
+            self._logger.warning("Couldn't prepare region command %s%s: %s",
+                command.get_name(), args, e)
+
+    def __init__(self, logger):
+        self._logger = logger
+        # Each name maps to a stack of (handler, preparer), the last one
+        # registered is used
+        self._handlers = {}
+        self._commands = {}
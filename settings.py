@@ -0,0 +1,178 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import ConfigParser
+import os
+
+# Preference names, these are the option names in settings.conf. This module
+# doesn't need Tkinter so that ShootOFF can detect shots without a GUI.
+DEBUG = "debug"
+VIDEO_SOURCE = "videosource"
+DETECTION_RATE = "detectionrate" #ms
+DETECTION_MODE = "detectionmode"
+LASER_INTENSITY = "laserintensity"
+MARKER_RADIUS = "markerradius"
+IGNORE_LASER_COLOR = "ignorelasercolor"
+ROI_DETECTION = "roidetection"
+ROI_MARGIN = "roimargin" #px
+LASER_COLOR_CLASSIFIER = "lasercolorclassifier"
+SUBPIXEL_CENTROIDS = "subpixelcentroids"
+BACKGROUND_SUBTRACTION = "backgroundsubtraction"
+PREVIEW_SCALE = "previewscale" #percent
+PREVIEW_FPS = "previewfps"
+SHOT_LOG = "shotlog"
+
+DEFAULT_DETECTION_RATE = 100 #ms
+DEFAULT_DETECTION_MODE = "frame"
+DEFAULT_LASER_INTENSITY = 230
+DEFAULT_MARKER_RADIUS = 2 #px
+DEFAULT_IGNORE_LASER_COLOR = "none"
+DEFAULT_ROI_DETECTION = False
+DEFAULT_ROI_MARGIN = 20 #px
+DEFAULT_LASER_COLOR_CLASSIFIER = "rgb"
+DEFAULT_SUBPIXEL_CENTROIDS = True
+DEFAULT_BACKGROUND_SUBTRACTION = False
+DEFAULT_PREVIEW_SCALE = 100 #percent
+DEFAULT_PREVIEW_FPS = 30
+DEFAULT_SHOT_LOG = False
+
+def map_configuration():
+    config = ConfigParser.SafeConfigParser()
+    config.read("settings.conf")
+    preferences = {}    
+
+    if os.path.exists("settings.conf"):
+        try:
+            preferences[DETECTION_RATE] = config.getint("ShootOFF",
+                DETECTION_RATE)
+        except ConfigParser.NoOptionError:
+            preferences[DETECTION_RATE] = DEFAULT_DETECTION_RATE
+
+        try:
+            preferences[DETECTION_MODE] = config.get("ShootOFF",
+                DETECTION_MODE)
+        except ConfigParser.NoOptionError:
+            preferences[DETECTION_MODE] = DEFAULT_DETECTION_MODE
+
+        try:
+            preferences[LASER_INTENSITY] = config.getint("ShootOFF",
+                LASER_INTENSITY)
+        except ConfigParser.NoOptionError:
+            preferences[LASER_INTENSITY] = DEFAULT_LASER_INTENSITY
+
+        try:
+            preferences[MARKER_RADIUS] = config.getint("ShootOFF",
+			MARKER_RADIUS)
+        except ConfigParser.NoOptionError:
+            preferences[MARKER_RADIUS] = DEFAULT_MARKER_RADIUS
+
+        try:
+            preferences[IGNORE_LASER_COLOR] = config.get("ShootOFF",
+                IGNORE_LASER_COLOR)
+        except ConfigParser.NoOptionError:
+            preferences[IGNORE_LASER_COLOR] = DEFAULT_IGNORE_LASER_COLOR
+
+        try:
+            preferences[ROI_DETECTION] = config.getboolean("ShootOFF",
+                ROI_DETECTION)
+        except ConfigParser.NoOptionError:
+            preferences[ROI_DETECTION] = DEFAULT_ROI_DETECTION
+
+        try:
+            preferences[ROI_MARGIN] = config.getint("ShootOFF",
+                ROI_MARGIN)
+        except ConfigParser.NoOptionError:
+            preferences[ROI_MARGIN] = DEFAULT_ROI_MARGIN
+
+        try:
+            preferences[LASER_COLOR_CLASSIFIER] = config.get("ShootOFF",
+                LASER_COLOR_CLASSIFIER)
+        except ConfigParser.NoOptionError:
+            preferences[LASER_COLOR_CLASSIFIER] = DEFAULT_LASER_COLOR_CLASSIFIER
+
+        try:
+            preferences[SUBPIXEL_CENTROIDS] = config.getboolean("ShootOFF",
+                SUBPIXEL_CENTROIDS)
+        except ConfigParser.NoOptionError:
+            preferences[SUBPIXEL_CENTROIDS] = DEFAULT_SUBPIXEL_CENTROIDS
+
+        try:
+            preferences[BACKGROUND_SUBTRACTION] = config.getboolean("ShootOFF",
+                BACKGROUND_SUBTRACTION)
+        except ConfigParser.NoOptionError:
+            preferences[BACKGROUND_SUBTRACTION] = DEFAULT_BACKGROUND_SUBTRACTION
+
+        try:
+            preferences[PREVIEW_SCALE] = config.getint("ShootOFF",
+                PREVIEW_SCALE)
+        except ConfigParser.NoOptionError:
+            preferences[PREVIEW_SCALE] = DEFAULT_PREVIEW_SCALE
+
+        try:
+            preferences[PREVIEW_FPS] = config.getint("ShootOFF",
+                PREVIEW_FPS)
+        except ConfigParser.NoOptionError:
+            preferences[PREVIEW_FPS] = DEFAULT_PREVIEW_FPS
+
+        try:
+            preferences[SHOT_LOG] = config.getboolean("ShootOFF",
+                SHOT_LOG)
+        except ConfigParser.NoOptionError:
+            preferences[SHOT_LOG] = DEFAULT_SHOT_LOG
+    else:
+        preferences[DETECTION_RATE] = DEFAULT_DETECTION_RATE
+        preferences[DETECTION_MODE] = DEFAULT_DETECTION_MODE
+        preferences[LASER_INTENSITY] = DEFAULT_LASER_INTENSITY
+        preferences[MARKER_RADIUS] = DEFAULT_MARKER_RADIUS
+        preferences[IGNORE_LASER_COLOR] = DEFAULT_IGNORE_LASER_COLOR
+        preferences[ROI_DETECTION] = DEFAULT_ROI_DETECTION
+        preferences[ROI_MARGIN] = DEFAULT_ROI_MARGIN
+        preferences[LASER_COLOR_CLASSIFIER] = DEFAULT_LASER_COLOR_CLASSIFIER
+        preferences[SUBPIXEL_CENTROIDS] = DEFAULT_SUBPIXEL_CENTROIDS
+        preferences[BACKGROUND_SUBTRACTION] = DEFAULT_BACKGROUND_SUBTRACTION
+        preferences[PREVIEW_SCALE] = DEFAULT_PREVIEW_SCALE
+        preferences[PREVIEW_FPS] = DEFAULT_PREVIEW_FPS
+        preferences[SHOT_LOG] = DEFAULT_SHOT_LOG
+
+        config.add_section("ShootOFF")
+        config.set("ShootOFF", DETECTION_RATE, 
+            str(preferences[DETECTION_RATE]))   
+        config.set("ShootOFF", DETECTION_MODE, 
+            preferences[DETECTION_MODE])
+        config.set("ShootOFF", LASER_INTENSITY, 
+            str(preferences[LASER_INTENSITY]))
+        config.set("ShootOFF", MARKER_RADIUS, 
+            str(preferences[MARKER_RADIUS]))
+        config.set("ShootOFF", IGNORE_LASER_COLOR, 
+            preferences[IGNORE_LASER_COLOR])    
+        config.set("ShootOFF", ROI_DETECTION,
+            str(preferences[ROI_DETECTION]))
+        config.set("ShootOFF", ROI_MARGIN,
+            str(preferences[ROI_MARGIN]))
+        config.set("ShootOFF", LASER_COLOR_CLASSIFIER,
+            preferences[LASER_COLOR_CLASSIFIER])
+        config.set("ShootOFF", SUBPIXEL_CENTROIDS,
+            str(preferences[SUBPIXEL_CENTROIDS]))
+        config.set("ShootOFF", BACKGROUND_SUBTRACTION,
+            str(preferences[BACKGROUND_SUBTRACTION]))
+        config.set("ShootOFF", PREVIEW_SCALE,
+            str(preferences[PREVIEW_SCALE]))
+        config.set("ShootOFF", PREVIEW_FPS,
+            str(preferences[PREVIEW_FPS]))
+        config.set("ShootOFF", SHOT_LOG,
+            str(preferences[SHOT_LOG]))
+
+        with open("settings.conf", "w") as config_file:
+            config.write(config_file)
+
+    return config, preferences
+
+# Changes a single preference and saves it to the config file without
+# opening the preferences window
+def save_preference(config_parser, preferences, name, value):
+    preferences[name] = value
+    config_parser.set("ShootOFF", name, str(value))
+
+    with open("settings.conf", "w") as config_file:
+        config_parser.write(config_file)
@@ -0,0 +1,169 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import json
+import numpy
+import os
+
+# The kinds of canvas items shapes are drawn as
+RECTANGLE = "rectangle"
+OVAL = "oval"
+POLYGON = "polygon"
+ITEM_TYPES = (RECTANGLE, OVAL, POLYGON)
+
+# The canvas method that draws each item type and how target regions of
+# that type look
+CREATE_FUNCTIONS = {RECTANGLE: "create_rectangle", OVAL: "create_oval",
+    POLYGON: "create_polygon"}
+ITEM_OPTIONS = {RECTANGLE: {"stipple": "gray25"},
+    OVAL: {"stipple": "gray25"},
+    POLYGON: {"outline": "black", "stipple": "gray25"}}
+
+# Extra shapes can be added by putting shape files in this directory
+SHAPE_DIR = "shapes"
+SHAPE_EXTENSION = ".shape"
+
+# A shape that can be drawn as a target region. Its vertices are kept
+# around (0, 0) in shape units and are placed on the canvas with one
+# vectorized scale and move. Rectangles and ovals have two vertices, the
+# corners of their bounding box. Shapes without vertices (freeform
+# polygons) are drawn point by point instead and can't be placed.
+class Shape():
+    # Returns the canvas coordinates of the shape centered at (x, y) as a
+    # flat list. scale is how many pixels a shape unit is, the shape's
+    # default scale is used if it isn't given.
+    def place(self, x, y, scale=None):
+        if scale is None:
+            scale = self._default_scale
+
+        return (self._vertices * scale + (x, y)).ravel().tolist()
+
+    def get_name(self):
+        return self._name
+
+    def get_item_type(self):
+        return self._item_type
+
+    def get_vertices(self):
+        return self._vertices
+
+    def get_default_scale(self):
+        return self._default_scale
+
+    def __init__(self, name, item_type, vertices=None, default_scale=1):
+        if item_type not in ITEM_TYPES:
+            raise ValueError("%s isn't a shape item type" % item_type)
+
+        if vertices is not None:
+            vertices = numpy.array(vertices,
+                dtype=numpy.float64).reshape(-1, 2)
+
+            if item_type in (RECTANGLE, OVAL) and len(vertices) != 2:
+                raise ValueError("%s shapes need exactly 2 vertices" %
+                    item_type)
+            if item_type == POLYGON and len(vertices) < 3:
+                raise ValueError("polygon shapes need at least 3 vertices")
+
+            # Shapes are shared, nobody gets to change them
+            vertices.flags.writeable = False
+
+        self._name = name
+        self._item_type = item_type
+        self._vertices = vertices
+        self._default_scale = default_scale
+
+_shapes = {}
+_builtin_shape_names = set()
+
+# Shapes from shape files can't replace the built in ones, otherwise
+# every target drawn with a built in shape would change
+def register_shape(shape):
+    if shape.get_name() in _builtin_shape_names:
+        raise ValueError("%s is a built in shape" % shape.get_name())
+
+    _shapes[shape.get_name()] = shape
+
+def _register_builtin_shape(shape):
+    register_shape(shape)
+    _builtin_shape_names.add(shape.get_name())
+
+def get_shape(name):
+    return _shapes.get(name)
+
+def get_shape_names():
+    return sorted(_shapes.keys())
+
+# Reads a shape file and registers its shape. Shape files are JSON objects
+# like {"name": "ipsc", "vertices": [[x0, y0], [x1, y1], ...], "scale": 2}
+# with an optional "item_type" (polygon if it's left out). Returns the
+# shape.
+def load_shape_file(shape_file):
+    with open(shape_file, "rb") as f:
+        definition = json.load(f)
+
+    shape = Shape(str(definition["name"]),
+        str(definition.get("item_type", POLYGON)),
+        definition["vertices"], definition.get("scale", 1))
+    register_shape(shape)
+
+    return shape
+
+# Registers every shape file in directory, shapes that can't be read are
+# logged and skipped
+def load_shape_dir(logger, directory=SHAPE_DIR):
+    if not os.path.isdir(directory):
+        return
+
+    for file_name in sorted(os.listdir(directory)):
+        if not file_name.endswith(SHAPE_EXTENSION):
+            continue
+
+        shape_file = os.path.join(directory, file_name)
+        try:
+            shape = load_shape_file(shape_file)
+            logger.debug("Loaded shape %s from %s", shape.get_name(),
+                shape_file)
+        except Exception as e:
+            logger.warning("Couldn't load shape file %s: %s", shape_file, e)
+
+# Built in shapes, basic shapes are 60 pixels across by default and the
+# aqt shapes are silhouettes in three sizes
+BASIC_SHAPE_SCALE = 30
+AQT_SCALE = 2.5
+
+_register_builtin_shape(Shape("rectangle", RECTANGLE, [(-1, -1), (1, 1)],
+    BASIC_SHAPE_SCALE))
+
+_register_builtin_shape(Shape("oval", OVAL, [(-1, -1), (1, 1)],
+    BASIC_SHAPE_SCALE))
+
+_register_builtin_shape(Shape("triangle", POLYGON,
+    [(0, -1), (1, 1), (-1, 1), (0, -1)], BASIC_SHAPE_SCALE))
+
+_register_builtin_shape(Shape("aqt3", POLYGON, [
+    (15.083, 13.12), (15.083, -0.147), (14.277, -2.508), (13.149, -4.115),
+    (11.841, -5.257), (10.557, -6.064), (8.689, -6.811), (7.539, -8.439),
+    (7.076, -9.978), (6.104, -11.577), (4.82, -12.829), (3.43, -13.788),
+    (1.757, -14.386), (0.083, -14.55), (-1.59, -14.386), (-3.263, -13.788),
+    (-4.653, -12.829), (-5.938, -11.577), (-6.909, -9.978), (-7.372, -8.439),
+    (-8.522, -6.811), (-10.39, -6.064), (-11.674, -5.257), (-12.982, -4.115),
+    (-14.11, -2.508), (-14.917, -0.147), (-14.917, 13.12)], AQT_SCALE))
+
+_register_builtin_shape(Shape("aqt4", POLYGON, [
+    (11.66, 5.51), (11.595, 0.689), (11.1, -1.084), (9.832, -2.441),
+    (7.677, -3.322), (5.821, -4.709), (4.715, -6.497), (4.267, -8.135),
+    (3.669, -9.41), (2.534, -10.553), (1.436, -11.091), (0.083, -11.323),
+    (-1.269, -11.091), (-2.367, -10.553), (-3.502, -9.41), (-4.1, -8.135),
+    (-4.548, -6.497), (-5.654, -4.709), (-7.51, -3.322), (-9.665, -2.441),
+    (-10.933, -1.084), (-11.428, 0.689), (-11.493, 5.51)], AQT_SCALE))
+
+_register_builtin_shape(Shape("aqt5", POLYGON, [
+    (7.893, 3.418), (7.893, 1.147), (7.255, 0.331), (5.622, -0.247),
+    (4.187, -1.124), (2.833, -2.339), (1.917, -3.594), (1.219, -5.048),
+    (0.9, -6.223), (0.801, -7.1), (0.521, -7.558), (0.083, -7.617),
+    (-0.354, -7.558), (-0.634, -7.1), (-0.733, -6.223), (-1.052, -5.048),
+    (-1.75, -3.594), (-2.666, -2.339), (-4.02, -1.124), (-5.455, -0.247),
+    (-7.088, 0.331), (-7.726, 1.147), (-7.726, 3.418)], AQT_SCALE))
+
+_register_builtin_shape(Shape("freeform_polygon", POLYGON))
@@ -4,27 +4,43 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
+from audio_engine import AudioEngine
 from canvas_manager import CanvasManager
 import configurator
 from configurator import Configurator
 import cv2
-import glob
+from display_transform import DisplayTransform
+from frame_pacer import FramePacer
+import laser_calibrator
+from laser_calibrator import LaserCalibrator
+from hit_index import HitIndex
 import imp
-import numpy
 import os
 from PIL import Image, ImageTk
 from preferences_editor import PreferencesEditor
-import re
+import Queue
+from region_commands import CommandRegistry
+import settings
+import shape_library
 from shot import Shot
-from tag_parser import TagParser
+import shot_log
+from shot_log import ShotLogWriter
+import shot_detector
+from shot_detector import ShotDetector
+from speech_queue import SpeechQueue
+from tag_parser import TagCache
 from target_editor import TargetEditor
-from target_pickler import TargetPickler
-import time
+import target_library
+from target_library import TargetLibrary
+from target_template import TemplateCache
 from training_protocols.protocol_operations import ProtocolOperations
-from threading import Thread
 import Tkinter, tkFileDialog, tkMessageBox, ttk
+from video_replay import VideoReplay
+from webcam_capture import WebcamCapture, clock, open_webcam
 
-FEED_FPS = 30  # ms
+DEFAULT_FEED_FPS = 30
+INTERFERENCE_PREVIEW_TIME = 5 # s
+DETECTION_EVENT_POLL_RATE = 10 # ms
 SHOT_MARKER = "shot_marker"
 TARGET_VISIBILTY_MENU_INDEX = 3
 
@@ -33,124 +49,137 @@ DEFAULT_SHOT_LIST_COLUMNS = ("Time", "Laser")
 
 class MainWindow:
     def refresh_frame(self, *args):
-        rval, self._webcam_frame = self._cv.read()
-
-        if (rval == False):
-            self._refresh_miss_count += 1
-            self._logger.debug ("Missed %d webcam frames. If we miss too many ShootOFF " +
-                "will stop processing shots.", self._refresh_miss_count)
-
-            if self._refresh_miss_count >= 25:
-                tkMessageBox.showerror("Webcam Disconnected", "Missed too many " +
-                    "webcam frames. The camera is probably disconnected so " +
-                    "ShootOFF will stop processing shots.")
-                self._logger.critical("Missed %d webcam frames. The camera is probably " +
-                    "disconnected so ShootOFF will stop processing shots.",
-                    self._refresh_miss_count)
-                self._shutdown = True
-            else:
-                if self._shutdown == False:
-                    self._window.after(FEED_FPS, self.refresh_frame)
+        if self._capture.is_disconnected():
+            tkMessageBox.showerror("Webcam Disconnected", "Missed too many " +
+                "webcam frames. The camera is probably disconnected so " +
+                "ShootOFF will stop processing shots.")
+            self._shutdown = True
+            return
+
+        # Only the newest frame is ever drawn, frames captured while we were
+        # busy are skipped instead of being drawn late
+        latest_frame = self._capture.get_latest_frame()
 
+        # Nothing new has been captured since the last refresh, so there is
+        # nothing to draw
+        if latest_frame is None or latest_frame[0] == self._displayed_sequence:
+            if self._shutdown == False:
+                self._window.after(self._frame_pacer.get_poll_delay(),
+                    self.refresh_frame)
             return
 
-        self._refresh_miss_count = 0
+        (self._displayed_sequence, timestamp, self._webcam_frame) = latest_frame
+        self._frame_pacer.set_max_rate(self._preferences[configurator.PREVIEW_FPS])
+        self._frame_pacer.frame_started(self._displayed_sequence, timestamp)
+
+        # The feed is usually shown smaller than the webcam captures it,
+        # shrink it first so that everything after this works on fewer pixels
+        preview_frame = self._webcam_frame
+        if self._display_transform.is_scaled():
+            self._preview_frame = cv2.resize(self._webcam_frame,
+                self._display_transform.get_display_size(),
+                dst=self._preview_frame, interpolation=cv2.INTER_AREA)
+            preview_frame = self._preview_frame
 
         #OpenCV reads the frame in BGR, but PIL uses RGB, so we if we don't
         #convert it, the colors will be off.
-        webcam_image = cv2.cvtColor(self._webcam_frame, cv2.cv.CV_BGR2RGB)
+        self._feed_image = cv2.cvtColor(preview_frame, cv2.cv.CV_BGR2RGB,
+            dst=self._feed_image)
+        webcam_image = self._feed_image
 
         # If the shot detector saw interference, we need to show it now
-        if self._show_interference:
-            if self._interference_iterations > 0:
-                self._interference_iterations -= 1
-
-                frame_bw = cv2.cvtColor(self._webcam_frame, cv2.cv.CV_BGR2GRAY)
-                (thresh, webcam_image) = cv2.threshold(frame_bw,
-                    self._preferences[configurator.LASER_INTENSITY], 255,
-                    cv2.THRESH_BINARY)
+        # for INTERFERENCE_PREVIEW_TIME seconds
+        if self._show_interference and clock() < self._interference_end:
+            frame_bw = cv2.cvtColor(preview_frame, cv2.cv.CV_BGR2GRAY)
+            (thresh, webcam_image) = cv2.threshold(frame_bw,
+                self._preferences[configurator.LASER_INTENSITY], 255,
+                cv2.THRESH_BINARY)
 
-        # Show webcam image a Tk image container (note:
-        # if the image isn't stored in an instance variable
-        # it will be garbage collected and not show)
-        self._image = ImageTk.PhotoImage(image=Image.fromarray(webcam_image))
+        self.show_feed_image(Image.fromarray(webcam_image))
+        self._frame_pacer.frame_finished()
 
-        # If the target editor doesn't have its own copy of the image
-        # the webcam feed will never update again after the editor opens
-        self._editor_image = ImageTk.PhotoImage(
-            image=Image.fromarray(webcam_image))
-
-        webcam_image = self._webcam_canvas.create_image(0, 0, image=self._image,
-            anchor=Tkinter.NW, tags=("background"))
-
-        # Drawing the new frame covers up our targets, so
-        # move it to the back if they are supposed to show
-        if self._show_targets:
-            # Not raising existing targets while lowering the webcam feed
-            # will cause hits to stop registering on targets
-            for target in self._targets:
-                self._webcam_canvas.tag_raise(target)
-            self._webcam_canvas.tag_raise(SHOT_MARKER)
-            self._webcam_canvas.tag_lower(webcam_image)
+        if self._shutdown == False:
+            self._window.after(self._frame_pacer.get_delay(),
+                self.refresh_frame)
+
+    # Show webcam image in the Tk image container that sits behind everything
+    # else on the canvas. The container and its canvas item are only created
+    # once (or again if the feed changes size), after that new frames are
+    # pasted into it. Creating a new image every frame leaves old canvas
+    # items behind and makes the canvas slower the longer ShootOFF runs.
+    # Because the item never moves, targets and shot markers keep their
+    # stacking order without being raised again every frame.
+    def show_feed_image(self, image):
+        if self._image is None or (self._image.width(),
+            self._image.height()) != image.size:
+
+            # Note: if the image isn't stored in an instance variable
+            # it will be garbage collected and not show
+            self._image = ImageTk.PhotoImage(image=image)
+
+            if self._background is None:
+                self._background = self._webcam_canvas.create_image(0, 0,
+                    image=self._image, anchor=Tkinter.NW, tags=("background"))
+                self._webcam_canvas.tag_lower(self._background)
+
+                if not self._show_targets:
+                    for target in reversed(self._targets):
+                        self._webcam_canvas.tag_lower(target)
+            else:
+                self._webcam_canvas.itemconfig(self._background,
+                    image=self._image)
         else:
-            # We have to lower canvas then the targets so
-            # that anything drawn by plugins will still show
-            # but the targets won't
-            self._webcam_canvas.tag_raise(SHOT_MARKER)
-            self._webcam_canvas.tag_lower(webcam_image)
-            for target in self._targets:
-                self._webcam_canvas.tag_lower(target)
+            self._image.paste(image)
+
+    # The target editor gets its own full resolution copy of the latest
+    # frame, otherwise the webcam feed will never update again after the
+    # editor opens. Targets are edited in frame space and scaled to the
+    # feed when they are added.
+    def get_editor_image(self):
+        latest_frame = self._capture.get_latest_frame()
+
+        if latest_frame is None:
+            return ImageTk.PhotoImage(image=Image.new("RGB",
+                self._display_transform.get_frame_size()))
+
+        editor_image = cv2.cvtColor(latest_frame[2], cv2.cv.CV_BGR2RGB)
+        return ImageTk.PhotoImage(image=Image.fromarray(editor_image))
+
+    def process_detection_events(self):
+        # Shots are detected on the shot detection thread, but everything
+        # they touch lives in Tk, so handle them here on the Tk thread
+        try:
+            while True:
+                event = self._detection_events.get_nowait()
+
+                if event[0] == shot_detector.SHOT_EVENT:
+                    (event_type, laser_color, x, y, timestamp, sequence) = event
+                    (x, y) = self._display_transform.to_display(x, y)
+                    self.handle_shot(laser_color, x, y, timestamp)
+                elif event[0] == shot_detector.INTERFERENCE_EVENT:
+                    self.show_interference_warning()
+        except Queue.Empty:
+            pass
 
         if self._shutdown == False:
-            self._window.after(FEED_FPS, self.refresh_frame)
-
-    def detect_shots(self):
-        if (self._webcam_frame is None):
-            self._window.after(self._preferences[configurator.DETECTION_RATE], self.detect_shots)
-            return
-
-        # Makes feed black and white
-        frame_bw = cv2.cvtColor(self._webcam_frame, cv2.cv.CV_BGR2GRAY)
-
-        # Threshold the image
-        (thresh, frame_thresh) = cv2.threshold(frame_bw, 
-            self._preferences[configurator.LASER_INTENSITY], 255, cv2.THRESH_BINARY)
-
-        # Determine if we have a light source or glare on the feed
-        if not self._seen_interference:
-            self.detect_interfence(frame_thresh)
-
-        # Find min and max values on the black and white frame
-        min_max = cv2.minMaxLoc(frame_thresh)
-
-        # The minimum and maximum are the same if there was
-        # nothing detected
-        if (min_max[0] != min_max[1]):
-            x = min_max[3][0]
-            y = min_max[3][1]
-
-            laser_color = self.detect_laser_color(x, y)
+            self._window.after(DETECTION_EVENT_POLL_RATE,
+                self.process_detection_events)
 
-            # If we couldn't detect a laser color, it's probably not a
-            # shot
-            if (laser_color is not None and
-                self._preferences[configurator.IGNORE_LASER_COLOR] not in laser_color):
+    # detection_time is the capture time of the frame the shot was
+    # detected in, shots that didn't come from the webcam (e.g. debug
+    # clicks) happened now
+    def handle_shot(self, laser_color, x, y, detection_time=None):
+        if detection_time is None:
+            detection_time = clock()
 
-                self.handle_shot(laser_color, x, y)
-
-        if self._shutdown == False:
-            self._window.after(self._preferences[configurator.DETECTION_RATE],
-                self.detect_shots)
-
-    def handle_shot(self, laser_color, x, y):
         timestamp = 0
 
         # Start the shot timer if it has not been started yet,
         # otherwise get the time offset
         if self._shot_timer_start is None:
-            self._shot_timer_start = time.time()
+            self._shot_timer_start = detection_time
         else:
-            timestamp = time.time() - self._shot_timer_start
+            timestamp = detection_time - self._shot_timer_start
 
         tree_item = None
 
@@ -171,52 +200,23 @@ class MainWindow:
         # Process the shot to see if we hit a region and perform
         # a training protocol specific action and any if we did
         # command tag actions if we did
-        self.process_hit(new_shot, tree_item)
-
-    def detect_interfence(self, image_thresh):
-        brightness_hist = cv2.calcHist([image_thresh], [0], None, [256], [0, 255])
-        percent_dark = brightness_hist[0] / image_thresh.size
-
-        # If 99% of thresholded image isn't dark, we probably have
-        # a light source or glare in the image
-        if (percent_dark < .99):
-            # We will only warn about interference once each run
-            self._seen_interference = True
-
-            self._logger.warning(
-                "Glare or light source detected. %f of the image is dark." %
-                percent_dark)
-
-            self._show_interference = tkMessageBox.askyesno("Interference Detected", "Bright glare or a light source has been detected on the webcam feed, which will interfere with shot detection. Do you want to see a feed where the interference will be white and everything else will be black for a short period of time?")
-
-            if self._show_interference:
-                # calculate the number of times we should show the
-                # interference image (this should be roughly 5 seconds)
-                self._interference_iterations = 2500 / FEED_FPS
-
-    def detect_laser_color(self, x, y):
-        # Get the average color around the coordinates. If
-        # the dominant color is red, it's a red laser, if
-        # it's green it's a green laser, otherwise it's probably
-        # not a laser trainer, so ignore it
-        l = self._webcam_frame.shape[1]
-        h = self._webcam_frame.shape[0]
-        mask = numpy.zeros((h, l, 1), numpy.uint8)
-        cv2.circle(mask, (x, y), 10, (255, 255, 555), -1)
-        mean_color = cv2.mean(self._webcam_frame, mask)
-
-        # Remember that self._webcam_frame is in BGR
-        r = mean_color[2]
-        g = mean_color[1]
-        b = mean_color[0]
-
-        if (r > g) and (r > b):
-            return "red"
-
-        if (g > r) and (g > b):
-            return "green2"
+        hit = self.process_hit(new_shot, tree_item)
 
-        return None
+        if self._shot_log is not None:
+            self.log_shot(new_shot, tree_item, hit, detection_time)
+
+    def show_interference_warning(self):
+        # The shot detector warns every time interference shows up, but we
+        # only interrupt the user about it once each run
+        if self._seen_interference:
+            return
+
+        self._seen_interference = True
+
+        self._show_interference = tkMessageBox.askyesno("Interference Detected", "Bright glare or a light source has been detected on the webcam feed, which will interfere with shot detection. Do you want to see a feed where the interference will be white and everything else will be black for a short period of time?")
+
+        if self._show_interference:
+            self._interference_end = clock() + INTERFERENCE_PREVIEW_TIME
 
     def process_hit(self, shot, shot_list_item):
         is_hit = False
@@ -224,87 +224,224 @@ class MainWindow:
         x = shot.get_coords()[0]
         y = shot.get_coords()[1]
 
-        regions = self._webcam_canvas.find_overlapping(x, y, x, y)
+        # Only the top most region that was hit runs its commands and
+        # notifies the loaded plugin
+        hit = self._hit_index.find_top_region(x, y)
 
         # If we hit a targert region, run its commands and notify the
         # loaded plugin of the hit
-        for region in reversed(regions):
-            tags = TagParser.parse_tags(
-                self._webcam_canvas.gettags(region))
+        if hit is not None:
+            (region, tags) = hit
+            is_hit = True
 
-            if "_internal_name" in tags and "command" in tags:
+            if "command" in tags:
                 self.execute_region_commands(tags["command"])
 
-            if "_internal_name" in tags and self._loaded_training != None:
+            if self._loaded_training != None:
                 self._loaded_training.hit_listener(region, tags, shot, shot_list_item)
 
-            if "_internal_name" in tags:
-                is_hit = True
-                # only run the commands and notify a hit for the top most
-                # region
-                break
-
         if self._loaded_training != None:
             self._loaded_training.shot_listener(shot, shot_list_item, is_hit)
 
+        return hit
+
+    # Write the shot to the session's shot log along with the region it hit
+    # and whatever the training protocol added to its row in the shot list.
+    # detection_time is the capture time of the frame the shot was found in.
+    def log_shot(self, shot, shot_list_item, hit, detection_time):
+        (x, y) = self._display_transform.to_frame(*shot.get_coords())
+
+        target = None
+        target_file = None
+        region_index = -1
+        if hit is not None:
+            (region, tags) = hit
+            target = tags["_internal_name"]
+            target_name = "_internal_name:" + target
+            target_file = self._target_files.get(target_name)
+
+            # The shot is still logged as a hit if its region can't be
+            # found, just without the region
+            try:
+                region_index = self._hit_index.get_regions(
+                    target_name).index(region)
+            except ValueError:
+                pass
+
+        # The row is gone if the shot cleared the shot list (e.g. by hitting
+        # a clear_shots region)
+        columns = ()
+        if self._shot_timer_tree.exists(shot_list_item):
+            values = self._shot_timer_tree.item(shot_list_item, "values")
+            columns = values[len(DEFAULT_SHOT_LIST_COLUMNS):]
+
+        self._shot_log.log_shot(detection_time, shot.get_timestamp(), x, y,
+            shot.get_color(), target, region_index, columns, target_file)
+
     def open_target_editor(self):
-        TargetEditor(self._frame, self._editor_image,
+        TargetEditor(self._frame, self.get_editor_image(),
                      notifynewfunc=self.new_target_listener)
 
     def add_target(self, name):
-        # The target count is just supposed to prevent target naming collisions,
-        # not keep track of how many active targets there are
-        target_name = "_internal_name:target" + str(self._target_count)
-        self._target_count += 1
+        return self.add_targets(name, [(0, 0, 1)])[0]
+
+    # Adds a copy of the target in the file name for each (x, y, scale) in
+    # placements. A copy is the saved target scaled by scale and moved by
+    # (x, y) webcam frame pixels. The file is only read the first time the
+    # target is added, and the detection regions and stacking are only
+    # updated once for the whole batch. Returns the internal names of the
+    # new targets.
+    def add_targets(self, name, placements):
+        if len(placements) == 0:
+            return []
+
+        template = self._target_templates.get(name)
+
+        # Targets are saved in frame space, so they have to be shrunk
+        # along with the feed to cover the same part of it
+        (display_scale_x,
+            display_scale_y) = self._display_transform.get_scale()
+
+        target_names = []
+        for (x, y, scale) in placements:
+            # The target count is just supposed to prevent target naming
+            # collisions, not keep track of how many active targets there are
+            target_name = "_internal_name:target" + str(self._target_count)
+            self._target_count += 1
+
+            regions = template.instantiate(self._webcam_canvas, target_name,
+                (x * display_scale_x, y * display_scale_y),
+                (scale * display_scale_x, scale * display_scale_y),
+                self._tag_cache)
+
+            self._targets.append(target_name)
+            self._target_files[target_name] = os.path.basename(name)
+            self.index_target(target_name)
+            target_names.append(target_name)
+
+        # Parse the region commands now instead of on the first hit, every
+        # copy shares the parsed commands
+        for region in regions:
+            tags = self._tag_cache.get_tags(region)
+            if "command" in tags:
+                self._command_registry.get_commands(tags["command"])
+
+        # New targets are drawn on top of everything, so put them back
+        # under the shot markers or behind the webcam feed if targets
+        # are hidden
+        if self._show_targets:
+            self._webcam_canvas.tag_raise(SHOT_MARKER)
+        else:
+            for target_name in reversed(target_names):
+                self._webcam_canvas.tag_lower(target_name)
+
+        self.update_detection_regions()
+
+        return target_names
+
+    # Copy the shapes of a target's regions into the hit index. This has to
+    # be done again every time the target's regions change on the canvas.
+    def index_target(self, target_name):
+        regions = []
+        canvas_regions = self._webcam_canvas.find_withtag(target_name)
 
-        target_pickler = TargetPickler()
-        (region_object, regions) = target_pickler.load(
-            name, self._webcam_canvas, target_name)
+        # Regions that were redrawn (e.g. Windows ovals) are gone from the
+        # canvas, so their cached tags are no good anymore
+        for region in self._hit_index.get_regions(target_name):
+            if region not in canvas_regions:
+                self._tag_cache.invalidate(region)
 
-        self._targets.append(target_name)
+        for region in canvas_regions:
+            regions.append((region, self._webcam_canvas.type(region),
+                self._webcam_canvas.coords(region),
+                self._tag_cache.get_tags(region)))
+
+        self._hit_index.set_target(target_name, regions)
+
+    # Called by the canvas manager when a target was moved, resized or
+    # redrawn
+    def target_changed(self, target_name):
+        if target_name in self._targets:
+            self.index_target(target_name)
+
+        self.update_detection_regions()
+
+    # Tell the shot detector where the targets are so that it can limit
+    # its search to them
+    def update_detection_regions(self, *args):
+        target_regions = []
+
+        for target in self._targets:
+            bbox = self._webcam_canvas.bbox(target)
+            if bbox is not None:
+                target_regions.append(
+                    self._display_transform.bbox_to_frame(bbox))
+
+        self._shot_detector.set_target_regions(target_regions)
 
     def edit_target(self, name):
-        TargetEditor(self._frame, self._editor_image, name,
+        TargetEditor(self._frame, self.get_editor_image(), name,
                      self.new_target_listener)
 
+    # The target menus pick the new target up the next time they are
+    # opened
     def new_target_listener(self, target_file):
-        (root, ext) = os.path.splitext(os.path.basename(target_file))
-        self._add_target_menu.add_command(label=root,
-                command=self.callback_factory(self.add_target,
-                target_file))
-        self._edit_target_menu.add_command(label=root,
-                command=self.callback_factory(self.edit_target,
-                target_file))
+        self._target_library.add_target_file(target_file)
 
+    # Region commands are parsed when their target is added, so running
+    # them is just calling them
     def execute_region_commands(self, command_list):
-        args = []
-
-        for command in command_list:
-            # Parse the command name and arguments arguments are expected to
-            # be comma separated and in between paren:
-            # command_name(arg0,arg1,...,argN)
-            pattern = r'(\w[\w\d_]*)\((.*)\)$'
-            match = re.match(pattern, command)
-            if match:
-                command = match.groups()[0]
-                if len(match.groups()) > 0:
-                    args = match.groups()[1].split(",")
-
-            # Run the commands
-            if command == "clear_shots":
-                self.clear_shots()
-
-            if command == "play_sound":
-                self._protocol_operations.play_sound(args[0])
-
+        for command in self._command_registry.get_commands(command_list):
+            command()
+
+    def register_region_commands(self):
+        self._command_registry.register("clear_shots",
+            lambda *args: self.clear_shots())
+        self._command_registry.register("play_sound",
+            lambda sound_file: self._protocol_operations.play_sound(sound_file),
+            self.prepare_play_sound)
+
+    # Find the sound file and load it now so that the first hit that plays
+    # it doesn't have to wait for the disk
+    def prepare_play_sound(self, sound_file):
+        sound_file = os.path.abspath(sound_file)
+        self._audio_engine.preload(sound_file)
+        return (sound_file,)
+
+    def get_audio_engine(self):
+        return self._audio_engine
+
+    def get_speech_queue(self):
+        return self._speech_queue
+
+    # Lets training protocols add commands that can be attached to regions,
+    # see CommandRegistry.register
+    def register_region_command(self, name, handler, preparer=None):
+        self._command_registry.register(name, handler, preparer)
+
+    def unregister_region_command(self, name):
+        self._command_registry.unregister(name)
+
+    # Hidden targets are moved behind the webcam feed instead of being
+    # deleted so that anything drawn by plugins will still show and hits
+    # still register on the targets
     def toggle_target_visibility(self):
         if self._show_targets:
             self._targets_menu.entryconfig(TARGET_VISIBILTY_MENU_INDEX,
                 label="Show Targets")
+
+            for target in reversed(self._targets):
+                self._webcam_canvas.tag_lower(target)
         else:
             self._targets_menu.entryconfig(TARGET_VISIBILTY_MENU_INDEX,
                 label="Hide Targets")
 
+            # Keep the targets' order among themselves and put them right
+            # above the feed, which leaves the shot markers on top
+            if self._background is not None:
+                for target in reversed(self._targets):
+                    self._webcam_canvas.tag_raise(target, self._background)
+
         self._show_targets = not self._show_targets
 
     def clear_shots(self):
@@ -323,7 +460,18 @@ class MainWindow:
 
     def quit(self):
         self._shutdown = True
-        self._cv.release()
+        self._logger.debug("Feed drew %d frames, skipped %d and left out " +
+            "%d to stay under PREVIEW_FPS",
+            self._frame_pacer.get_rendered_frame_count(),
+            self._frame_pacer.get_skipped_frame_count(),
+            self._frame_pacer.get_throttled_frame_count())
+        self._shot_detector.stop()
+        self._capture.release()
+        self._audio_engine.stop()
+        self._speech_queue.stop()
+
+        if self._shot_log is not None:
+            self._shot_log.close()
         self._window.quit()
 
     def canvas_click_red(self, event):
@@ -359,8 +507,13 @@ class MainWindow:
             for target in self._targets:
                 if target == self._selected_target:
                     self._targets.remove(target)
+            self._target_files.pop(self._selected_target, None)
+            for region in self._hit_index.get_regions(self._selected_target):
+                self._tag_cache.invalidate(region)
             event.widget.delete(self._selected_target)
+            self._hit_index.remove_target(self._selected_target)
             self._selected_target = ""
+            self.update_detection_regions()
 
     def cancel_training(self):
         if self._loaded_training:
@@ -380,9 +533,8 @@ class MainWindow:
             targets.append(target_data)
 
             for region in target_regions:
-                tags = TagParser.parse_tags(
-                    self._webcam_canvas.gettags(region))
-                target_data["regions"].append(tags)
+                target_data["regions"].append(
+                    self._tag_cache.get_tags(region))
 
         return targets
 
@@ -399,6 +551,95 @@ class MainWindow:
         self._loaded_training = imp.load_module("__init__", *plugin).load(
             self._protocol_operations, targets)
 
+    def calibrate_laser_intensity(self):
+        # Only one calibration can collect frames at a time
+        if self._laser_calibrator is not None:
+            return
+
+        # With background subtraction the laser intensity is compared to
+        # how much brighter than the learned background a pixel is, not to
+        # the raw brightness the calibrator measures
+        if self._preferences[configurator.BACKGROUND_SUBTRACTION]:
+            tkMessageBox.showerror("Calibrate Laser Intensity", "The laser " +
+                "intensity can't be calibrated while background subtraction " +
+                "is on. Turn it off in the preferences, calibrate, then turn " +
+                "it back on and lower the laser intensity.",
+                parent=self._window)
+            return
+
+        tkMessageBox.showinfo("Calibrate Laser Intensity", "Make sure your " +
+            "laser is off and nothing is moving in front of the webcam, then " +
+            "click OK and wait %d seconds." % laser_calibrator.IDLE_TIME,
+            parent=self._window)
+
+        # Shots fired while calibrating are just calibration pulses
+        self._shot_detector.pause()
+
+        self._laser_calibrator = LaserCalibrator()
+        self.collect_calibration_frames(self._laser_calibrator.add_idle_frame,
+            clock() + laser_calibrator.IDLE_TIME, self.calibrate_laser_pulses)
+
+    def calibrate_laser_pulses(self):
+        tkMessageBox.showinfo("Calibrate Laser Intensity", ("Click OK, then " +
+            "fire your laser at the targets several times over the next %d " +
+            "seconds.") % laser_calibrator.PULSE_TIME, parent=self._window)
+
+        self.collect_calibration_frames(self._laser_calibrator.add_pulse_frame,
+            clock() + laser_calibrator.PULSE_TIME, self.finish_laser_calibration)
+
+    # Passes every frame captured until end_time to frame_listener and then
+    # calls done_listener
+    def collect_calibration_frames(self, frame_listener, end_time,
+        done_listener, next_sequence=None):
+
+        if self._shutdown:
+            return
+
+        latest_sequence = self._capture.get_latest_sequence()
+
+        if next_sequence is None:
+            next_sequence = latest_sequence + 1
+
+        while next_sequence <= latest_sequence:
+            captured_frame = self._capture.get_frame(next_sequence)
+            if captured_frame is not None:
+                frame_listener(captured_frame[1])
+            next_sequence += 1
+
+        if clock() < end_time:
+            self._window.after(DETECTION_EVENT_POLL_RATE,
+                self.collect_calibration_frames, frame_listener, end_time,
+                done_listener, next_sequence)
+        else:
+            done_listener()
+
+    def finish_laser_calibration(self):
+        calibrator = self._laser_calibrator
+        self._laser_calibrator = None
+        self._shot_detector.resume()
+
+        self._logger.debug("Calibration peaks: idle %s, laser %s",
+            calibrator.get_idle_peak(), calibrator.get_pulse_peak())
+
+        threshold = calibrator.compute_threshold()
+
+        if threshold is None:
+            tkMessageBox.showerror("Calibrate Laser Intensity", "The laser " +
+                "was never brighter than the rest of the webcam feed, so the " +
+                "laser intensity could not be calibrated. Try again with " +
+                "less light on the targets.", parent=self._window)
+            return
+
+        use_threshold = tkMessageBox.askyesno("Calibrate Laser Intensity",
+            "The laser intensity should be set to %d (it is currently %d). " %
+            (threshold, self._preferences[configurator.LASER_INTENSITY]) +
+            "Do you want to use the new laser intensity?", parent=self._window)
+
+        if use_threshold:
+            settings.save_preference(self._config_parser,
+                self._preferences, configurator.LASER_INTENSITY, threshold)
+            self._logger.info("Laser intensity calibrated to %d.", threshold)
+
     def edit_preferences(self):
         preferences_editor = PreferencesEditor(self._window, self._config_parser,
                                                self._preferences)
@@ -528,7 +769,9 @@ class MainWindow:
             self._webcam_canvas.bind('<Shift-ButtonPress-1>', self.canvas_click_red)
             self._webcam_canvas.bind('<Control-ButtonPress-1>', self.canvas_click_green)
 
-        self._canvas_manager = CanvasManager(self._webcam_canvas)
+        self._canvas_manager = CanvasManager(self._webcam_canvas,
+            self.target_changed)
+        self._tag_cache = TagCache(self._webcam_canvas)
 
         # Create a button to clear shots
         self._clear_shots_button = ttk.Button(
@@ -562,6 +805,8 @@ class MainWindow:
 
         file_menu = Tkinter.Menu(menu_bar, tearoff=False)
         file_menu.add_command(label="Preferences", command=self.edit_preferences)
+        file_menu.add_command(label="Calibrate Laser Intensity...",
+            command=self.calibrate_laser_intensity)
         file_menu.add_command(label="Save Feed Image...", command=self.save_feed_image)
         file_menu.add_separator()
         file_menu.add_command(label="Exit", command=self.quit)
@@ -595,20 +840,51 @@ class MainWindow:
     def callback_factory(self, func, name):
         return lambda: func(name)
 
+    # Target list menus are empty until they are opened, then they are
+    # filled in from the target library
     def create_target_list_menu(self, menu, name, func):
-        targets = glob.glob("targets/*.target")
-
         target_list_menu = Tkinter.Menu(menu, tearoff=False)
-
-        for target in targets:
-            (root, ext) = os.path.splitext(os.path.basename(target))
-            target_list_menu.add_command(label=root,
-                command=self.callback_factory(func, target))
+        target_list_menu.configure(postcommand=lambda:
+            self.populate_target_list_menu(target_list_menu, func))
 
         menu.add_cascade(label=name, menu=target_list_menu)
 
         return target_list_menu
 
+    # Only rebuilds target_list_menu if targets were added, changed or
+    # removed since it was last opened
+    def populate_target_list_menu(self, target_list_menu, func):
+        self._target_library.refresh()
+        version = self._target_library.get_version()
+
+        if self._target_menu_versions.get(str(target_list_menu)) == version:
+            return
+
+        target_list_menu.delete(0, Tkinter.END)
+
+        for target in self._target_library.get_targets():
+            target_list_menu.add_command(label=target["name"],
+                image=self.get_target_thumbnail(target), compound=Tkinter.LEFT,
+                command=self.callback_factory(func, target["path"]))
+
+        self._target_menu_versions[str(target_list_menu)] = version
+
+    # Thumbnails are shared by every target menu and have to be kept
+    # around for as long as a menu shows them
+    def get_target_thumbnail(self, target):
+        if target["thumbnail"] is None:
+            return None
+
+        key = (target["path"], target["mtime"])
+        if key not in self._target_thumbnails:
+            self._target_thumbnails[key] = ImageTk.PhotoImage(
+                image=target_library.decode_thumbnail(target["thumbnail"]))
+
+        return self._target_thumbnails[key]
+
+    def get_target_library(self):
+        return self._target_library
+
     def create_training_list(self, menu, func):
         protocols_dir = "training_protocols"
 
@@ -627,61 +903,101 @@ class MainWindow:
     def __init__(self, config):
         self._shots = []
         self._targets = []
+        # The file each target was loaded from by internal name
+        self._target_files = {}
+        self._hit_index = HitIndex()
         self._target_count = 0
-        self._refresh_miss_count = 0
+        self._displayed_sequence = None
         self._show_targets = True
         self._selected_target = ""
         self._loaded_training = None
         self._seen_interference = False
         self._show_interference = False
         self._webcam_frame = None
+        self._preview_frame = None
+        self._feed_image = None
+        self._image = None
+        self._background = None
         self._config_parser = config.get_config_parser()
         self._preferences = config.get_preferences()
         self._shot_timer_start = None
         self._previous_shot_time_selection = None
+        self._laser_calibrator = None
         self._logger = config.get_logger()
-
-        self._cv = cv2.VideoCapture(0)
+        self._command_registry = CommandRegistry(self._logger)
+        shape_library.load_shape_dir(self._logger)
+        self._target_library = TargetLibrary(self._logger)
+        self._target_templates = TemplateCache(self._logger)
+        self._target_menu_versions = {}
+        self._target_thumbnails = {}
+        self._audio_engine = AudioEngine(self._logger)
+        self._audio_engine.start()
+        self._speech_queue = SpeechQueue(self._logger)
+        self._speech_queue.start()
+
+        # Every shot of the session is streamed to a shot log for analyzing
+        # it later
+        self._shot_log = None
+        if self._preferences[configurator.SHOT_LOG]:
+            self._shot_log = ShotLogWriter(shot_log.new_session_path())
+            self._shot_log.start()
+            self._logger.info("Logging shots to %s",
+                self._shot_log.get_path())
+        self.register_region_commands()
+
+        if self._preferences[configurator.VIDEO_SOURCE]:
+            self._cv = VideoReplay(self._preferences[configurator.VIDEO_SOURCE])
+        else:
+            self._cv = open_webcam(self._logger)
 
         if self._cv.isOpened():
             width = self._cv.get(cv2.cv.CV_CAP_PROP_FRAME_WIDTH)
             height = self._cv.get(cv2.cv.CV_CAP_PROP_FRAME_HEIGHT)
 
-            # If the resolution is too low, try to force it higher.
-            # Some users have drivers that default to extremely low
-            # resolutions and opencv doesn't currently make it easy
-            # to enumerate valid resolutions and switch to them
-            if width < 640 and height < 480:
-                self._logger.info("Webcam resolution is current low (%dx%d), " +
-                                 "attempting to increase it to 640x480", width, height)
-                self._cv.set(cv2.cv.CV_CAP_PROP_FRAME_WIDTH, 640)
-                self._cv.set(cv2.cv.CV_CAP_PROP_FRAME_HEIGHT, 480)
-                width = self._cv.get(cv2.cv.CV_CAP_PROP_FRAME_WIDTH)
-                height = self._cv.get(cv2.cv.CV_CAP_PROP_FRAME_HEIGHT)
-
             self._logger.debug("Webcam resolution is %dx%d", width, height)
-            self.build_gui((width, height))
+
+            # Shots are detected at the webcam's resolution, but the feed
+            # can be shown smaller
+            self._display_transform = DisplayTransform((width, height),
+                self._preferences[configurator.PREVIEW_SCALE] / 100.0)
+            self._logger.debug("Feed preview resolution is %dx%d",
+                *self._display_transform.get_display_size())
+            self.build_gui(self._display_transform.get_display_size())
             self._protocol_operations = ProtocolOperations(self._webcam_canvas, self)
 
             fps = self._cv.get(cv2.cv.CV_CAP_PROP_FPS)
             if fps <= 0:
-                self._logger.info("Couldn't get webcam FPS, defaulting to 30.")
+                self._logger.info("Couldn't get webcam FPS, defaulting to %d.",
+                    DEFAULT_FEED_FPS)
+                fps = DEFAULT_FEED_FPS
             else:
-                FEED_FPS = fps
                 self._logger.info("Feed FPS set to %d.", fps)
 
+            # The pacer starts with the webcam's reported frame rate, then
+            # measures the real one as frames come in
+            self._frame_pacer = FramePacer(fps,
+                self._preferences[configurator.PREVIEW_FPS])
+
             # Webcam related threads will end when this is true
             self._shutdown = False
 
-            #Start the refresh loop that shows the webcam feed
-            self._refresh_thread = Thread(target=self.refresh_frame,
-                                          name="refresh_thread")
-            self._refresh_thread.start()
-
-            #Start the shot detection loop
-            self._shot_detection_thread = Thread(target=self.detect_shots,
-                                                 name="shot_detection_thread")
-            self._shot_detection_thread.start()
+            # Start reading frames on the capture thread, the feed and the
+            # shot detector will pull frames from it at their own rates
+            self._capture = WebcamCapture(self._cv, self._logger)
+            self._capture.start()
+
+            #Start the refresh loop that shows the webcam feed. It draws on
+            #the canvas, so it has to run on the Tk thread.
+            self._window.after(0, self.refresh_frame)
+
+            #Start the shot detection loop and start handling the shots
+            #it finds
+            self._shot_detector = ShotDetector(self._capture, self._preferences,
+                self._logger)
+            self._detection_events = self._shot_detector.create_event_queue()
+            self._shot_detector.start()
+            self._window.after(DETECTION_EVENT_POLL_RATE,
+                self.process_detection_events)
         else:
             tkMessageBox.showerror("Couldn't Connect to Webcam", "Video capturing " +
                 "could not be initialized either because there is no webcam or " +
@@ -690,6 +1006,13 @@ class MainWindow:
                 "because there is no webcam or we cannot connect to it.")
             self._shutdown = True
 
+            # quit() is never called without a webcam, so stop the threads
+            # that were started for the session here
+            self._audio_engine.stop()
+            self._speech_queue.stop()
+            if self._shot_log is not None:
+                self._shot_log.close()
+
     def main(self):
         if not self._shutdown:
             Tkinter.mainloop()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python2
+
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import configurator
+from configurator import Configurator
+import shot_detector
+import shot_log
+from shot_log import ShotLogWriter
+from shot_detector import ShotDetector
+import sys
+import time
+from video_replay import VideoReplay
+from webcam_capture import WebcamCapture, clock, open_webcam
+
+STATUS_CHECK_RATE = .5 # s
+
+# Runs shot detection at the webcam's full frame rate without the GUI.
+# Every shot is logged as comma separated values: seconds since detection
+# started, laser color, x, y. Shots are also written to a shot log file
+# when SHOT_LOG is on.
+class HeadlessShootOFF():
+    def shot_listener(self, event):
+        if event[0] != shot_detector.SHOT_EVENT:
+            return
+
+        (event_type, laser_color, x, y, timestamp, sequence) = event
+
+        self._logger.info("Shot: %.3f,%s,%.2f,%.2f", timestamp - self._start_time,
+            laser_color, x, y)
+
+        if self._shot_log is not None:
+            self._shot_log.log_shot(timestamp, timestamp - self._start_time,
+                x, y, laser_color)
+
+    def main(self):
+        if not self._cv.isOpened():
+            self._logger.critical("Video capturing could not be initialized either " +
+                "because there is no webcam or we cannot connect to it.")
+            return 1
+
+        self._start_time = clock()
+
+        if self._preferences[configurator.SHOT_LOG]:
+            self._shot_log = ShotLogWriter(shot_log.new_session_path())
+            self._shot_log.start()
+            self._logger.info("Logging shots to %s",
+                self._shot_log.get_path())
+
+        self._capture.start()
+        self._shot_detector.start()
+
+        try:
+            while self._capture.is_running():
+                time.sleep(STATUS_CHECK_RATE)
+        except KeyboardInterrupt:
+            pass
+
+        self._shot_detector.stop()
+        self._capture.release()
+
+        if self._shot_log is not None:
+            self._shot_log.close()
+
+        if self._capture.is_disconnected():
+            return 1
+
+        return 0
+
+    def __init__(self, config):
+        self._preferences = config.get_preferences()
+        self._logger = config.get_logger()
+        self._shot_log = None
+
+        if self._preferences[configurator.VIDEO_SOURCE]:
+            self._cv = VideoReplay(self._preferences[configurator.VIDEO_SOURCE])
+        else:
+            self._cv = open_webcam(self._logger)
+        self._capture = WebcamCapture(self._cv, self._logger)
+        self._shot_detector = ShotDetector(self._capture, self._preferences,
+            self._logger)
+        self._shot_detector.add_event_listener(self.shot_listener)
+
+if __name__ == "__main__":
+    config = Configurator()
+
+    headless = HeadlessShootOFF(config)
+    sys.exit(headless.main())
@@ -0,0 +1,400 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import cv2
+from laser_color_classifier import LaserColorClassifier
+import numpy
+import Queue
+import settings
+from threading import Thread
+import time
+
+FRAME_MODE = "frame"
+RATE_MODE = "rate"
+
+SHOT_EVENT = "shot"
+INTERFERENCE_EVENT = "interference"
+
+FRAME_WAIT_TIMEOUT = .5 # s
+PULSE_TRACKING_DISTANCE = 20 # px
+BACKGROUND_LEARNING_RATE = .05
+
+# This class is ShootOFF's shot detection engine. Frames go in and shot
+# events come out, and nothing in it depends on Tk, so it can run on machines
+# without a display and be benchmarked on its own.
+#
+# Frames can be passed straight to detect_shots or, after start is called,
+# pulled from a WebcamCapture on the engine's own thread. In FRAME_MODE every
+# frame the capture thread reads is processed exactly once and in capture
+# order, in RATE_MODE the newest frame is sampled every DETECTION_RATE ms.
+# Every laser in a frame is found, so shots fired at the same time by
+# different shooters are all detected.
+#
+# Events are passed to every listener added with add_event_listener (on the
+# thread that detected them) and put on every queue made by
+# create_event_queue. Detected shots are sent as
+# (SHOT_EVENT, laser_color, x, y, timestamp, sequence) where timestamp and
+# sequence identify the frame the shot was first seen in. x and y are floats
+# when SUBPIXEL_CENTROIDS is on. Whenever glare or a light source shows up on
+# the feed an (INTERFERENCE_EVENT, percent_dark) event is sent.
+class ShotDetector():
+    def start(self):
+        self._running = True
+        self._detection_thread = Thread(target=self._detection_loop,
+            name="shot_detection_thread")
+        self._detection_thread.daemon = True
+        self._detection_thread.start()
+
+    def stop(self):
+        self._running = False
+
+        if self._detection_thread is not None:
+            self._detection_thread.join()
+            self._detection_thread = None
+
+    # While paused frames are skipped and no shots are detected (e.g. while
+    # the laser intensity is being calibrated)
+    def pause(self):
+        self._paused = True
+
+    def resume(self):
+        self._previous_blobs = []
+        self._paused = False
+
+    # listener is called with every event on the thread that detected it,
+    # so it shouldn't touch Tk or block for long
+    def add_event_listener(self, listener):
+        self._event_listeners.append(listener)
+
+    def remove_event_listener(self, listener):
+        self._event_listeners.remove(listener)
+
+    # Returns a queue that receives every event, for consumers that want to
+    # handle events on their own thread (e.g. the GUI)
+    def create_event_queue(self):
+        events = Queue.Queue()
+        self.add_event_listener(events.put)
+        return events
+
+    # timer gets a mark(stage) call after each stage of detection finishes
+    # (see detection_benchmark.StageTimer). Set it to None to stop timing.
+    def set_stage_timer(self, timer):
+        self._stage_timer = timer
+
+    def _mark_stage(self, stage):
+        if self._stage_timer is not None:
+            self._stage_timer.mark(stage)
+
+    def _notify_listeners(self, event):
+        for listener in self._event_listeners:
+            listener(event)
+
+    def _detection_loop(self):
+        next_sequence = 0
+
+        while self._running and self._capture.is_running():
+            if self._preferences[settings.DETECTION_MODE] == RATE_MODE:
+                time.sleep(
+                    self._preferences[settings.DETECTION_RATE] / 1000.0)
+
+                latest_frame = self._capture.get_latest_frame()
+                if latest_frame is None or latest_frame[0] < next_sequence:
+                    continue
+
+                (sequence, timestamp, frame) = latest_frame
+            else:
+                if not self._capture.wait_for_frame(next_sequence,
+                    FRAME_WAIT_TIMEOUT):
+                    continue
+
+                sequence = next_sequence
+                captured_frame = self._capture.get_frame(sequence)
+
+                # We fell far enough behind that the capture thread overwrote
+                # frames we haven't seen, so skip ahead to the oldest frame
+                # that is still buffered
+                if captured_frame is None:
+                    oldest_sequence = self._capture.get_oldest_sequence()
+                    sequence = max(sequence, oldest_sequence)
+                    self._logger.debug("Shot detection fell behind, skipped " +
+                        "%d frames.", sequence - next_sequence)
+                    captured_frame = self._capture.get_frame(sequence)
+
+                    if captured_frame is None:
+                        continue
+
+                (timestamp, frame) = captured_frame
+
+            next_sequence = sequence + 1
+
+            if not self._paused:
+                self.detect_shots(frame, timestamp, sequence)
+
+    # target_regions is a list of (x0, y0, x1, y1) bounding boxes for the loaded
+    # targets. When ROI_DETECTION is on, only those boxes (grown by ROI_MARGIN
+    # pixels) are searched for shots.
+    def set_target_regions(self, target_regions):
+        self._target_regions = list(target_regions)
+
+    # Returns the (x0, y0, x1, y1) rectangles of the frame that should be
+    # searched for shots
+    def get_detection_regions(self, frame):
+        height = frame.shape[0]
+        width = frame.shape[1]
+        target_regions = self._target_regions
+
+        # Without targets any shot is a miss, but training protocols still
+        # want to hear about misses, so the whole frame is searched
+        if (not self._preferences[settings.ROI_DETECTION] or
+            len(target_regions) == 0):
+            return [(0, 0, width, height)]
+
+        margin = self._preferences[settings.ROI_MARGIN]
+        regions = []
+
+        for region in target_regions:
+            regions.append((max(0, int(region[0]) - margin),
+                max(0, int(region[1]) - margin),
+                min(width, int(region[2]) + margin + 1),
+                min(height, int(region[3]) + margin + 1)))
+
+        # Overlapping regions would make us find the same laser more than
+        # once, so merge them until none overlap
+        merged = True
+        while merged:
+            merged = False
+
+            for i in range(len(regions)):
+                for j in range(i + 1, len(regions)):
+                    a = regions[i]
+                    b = regions[j]
+
+                    if (a[0] < b[2] and b[0] < a[2] and
+                        a[1] < b[3] and b[1] < a[3]):
+                        regions[i] = (min(a[0], b[0]), min(a[1], b[1]),
+                            max(a[2], b[2]), max(a[3], b[3]))
+                        del regions[j]
+                        merged = True
+                        break
+
+                if merged:
+                    break
+
+        return [region for region in regions
+            if region[0] < region[2] and region[1] < region[3]]
+
+    # Returns a list of (x, y, area) tuples, one for every bright blob in
+    # the frame. x and y are the blob's centroid in frame coordinates.
+    def find_laser_blobs(self, frame):
+        blobs = []
+        dark_pixels = 0
+        total_pixels = 0
+
+        detection_regions = self.get_detection_regions(frame)
+        self._mark_stage("regions")
+
+        if detection_regions != self._background_regions:
+            self.mark_stale_background(frame, detection_regions)
+
+        for (x0, y0, x1, y1) in detection_regions:
+            # Makes feed black and white
+            frame_bw = cv2.cvtColor(frame[y0:y1, x0:x1], cv2.cv.CV_BGR2GRAY)
+
+            # Take out light that has been on the feed for a while (e.g. glare
+            # and reflections) so that only new light is left
+            if self._preferences[settings.BACKGROUND_SUBTRACTION]:
+                frame_bw = self.subtract_background(frame, frame_bw,
+                    (x0, y0, x1, y1))
+
+            self._mark_stage("grayscale")
+
+            # Threshold the image
+            (thresh, frame_thresh) = cv2.threshold(frame_bw,
+                self._preferences[settings.LASER_INTENSITY], 255,
+                cv2.THRESH_BINARY)
+
+            bright_pixels = cv2.countNonZero(frame_thresh)
+            dark_pixels += frame_thresh.size - bright_pixels
+            total_pixels += frame_thresh.size
+            self._mark_stage("threshold")
+
+            # Nothing is above the threshold, so there are no blobs
+            if bright_pixels == 0:
+                continue
+
+            # Find the outline of every blob in one pass. findContours
+            # returns two values in OpenCV 2.4 and three in 3.x, but the
+            # contours are always second to last.
+            contours = cv2.findContours(frame_thresh, cv2.RETR_EXTERNAL,
+                cv2.CHAIN_APPROX_SIMPLE)[-2]
+
+            for contour in contours:
+                moments = cv2.moments(contour)
+                area = moments["m00"]
+
+                if self._preferences[settings.SUBPIXEL_CENTROIDS]:
+                    (x, y) = self.find_weighted_centroid(frame_bw, contour)
+                    blobs.append((x0 + x, y0 + y, area))
+                    continue
+
+                # Blobs that are only a pixel or a line thick have no
+                # area, so use the center of their bounding box instead
+                if area > 0:
+                    x = moments["m10"] / area
+                    y = moments["m01"] / area
+                else:
+                    (bx, by, bw, bh) = cv2.boundingRect(contour)
+                    x = bx + (bw - 1) / 2.0
+                    y = by + (bh - 1) / 2.0
+
+                blobs.append((x0 + int(round(x)), y0 + int(round(y)), area))
+
+            self._mark_stage("blobs")
+
+        # Determine if we have a light source or glare on the feed
+        if total_pixels > 0:
+            self.detect_interfence(float(dark_pixels) / total_pixels)
+
+        if not self._preferences[settings.BACKGROUND_SUBTRACTION]:
+            self._background = None
+        self._stale_background = None
+
+        return blobs
+
+    # Only the searched regions of the background model are kept up to
+    # date, so pixels that weren't searched before are stale. When the
+    # searched regions change, just those pixels start over from the next
+    # frame and the rest of the model keeps what it learned, so nudging a
+    # target a pixel over doesn't make the glare on it look new.
+    def mark_stale_background(self, frame, detection_regions):
+        stale = numpy.ones(frame.shape[:2], dtype=numpy.bool_)
+
+        if self._background_regions is not None:
+            for (x0, y0, x1, y1) in self._background_regions:
+                stale[y0:y1, x0:x1] = False
+
+        self._stale_background = stale
+        self._background_regions = detection_regions
+
+    # Subtracts the background model from frame_bw (the grayscale version of
+    # region on frame) and then updates the model for that region with the
+    # new frame. The model is a running average of each pixel, so steady
+    # light sources fade into it while a laser that has only just come on
+    # stands out. Only the searched regions are updated, which keeps the
+    # cost per frame proportional to what is being searched. Pixels marked
+    # stale by mark_stale_background are set to the new frame first.
+    def subtract_background(self, frame, frame_bw, region):
+        (x0, y0, x1, y1) = region
+
+        if (self._background is None or
+            self._background.shape != frame.shape[:2]):
+
+            self._background = cv2.cvtColor(frame,
+                cv2.cv.CV_BGR2GRAY).astype(numpy.float32)
+        elif self._stale_background is not None:
+            stale = self._stale_background[y0:y1, x0:x1]
+            self._background[y0:y1, x0:x1][stale] = frame_bw[stale]
+
+        background = self._background[y0:y1, x0:x1]
+
+        foreground = cv2.subtract(frame_bw, cv2.convertScaleAbs(background))
+        cv2.accumulateWeighted(frame_bw, background, BACKGROUND_LEARNING_RATE)
+
+        return foreground
+
+    # Returns the intensity weighted centroid of the blob outlined by contour
+    # as float coordinates on frame_bw. Brighter pixels pull the centroid
+    # towards them, so the center of the laser spot is found to a fraction
+    # of a pixel instead of snapping to a single pixel.
+    def find_weighted_centroid(self, frame_bw, contour):
+        (bx, by, bw, bh) = cv2.boundingRect(contour)
+
+        # Only weigh the pixels that belong to this blob
+        blob_mask = numpy.zeros((bh, bw), numpy.uint8)
+        cv2.drawContours(blob_mask, [contour], -1, 255, -1, offset=(-bx, -by))
+
+        weights = frame_bw[by:by + bh, bx:bx + bw].astype(numpy.float32)
+        weights[blob_mask == 0] = 0
+
+        moments = cv2.moments(weights)
+
+        if moments["m00"] == 0:
+            return (bx + (bw - 1) / 2.0, by + (bh - 1) / 2.0)
+
+        return (bx + moments["m10"] / moments["m00"],
+            by + moments["m01"] / moments["m00"])
+
+    # Looks for new shots on frame (which is in BGR). timestamp and sequence
+    # are passed along with any shots that are found.
+    def detect_shots(self, frame, timestamp, sequence=None):
+        blobs = self.find_laser_blobs(frame)
+        previous_blobs = self._previous_blobs
+        self._previous_blobs = blobs
+
+        new_pulses = []
+
+        for (x, y, area) in blobs:
+            # A laser pulse usually stays on for several frames, but it
+            # should only count as a shot on the first frame it is seen in.
+            # A blob that is close to a blob in the last frame is the same
+            # pulse.
+            is_same_pulse = False
+            for (px, py, parea) in previous_blobs:
+                if (abs(px - x) <= PULSE_TRACKING_DISTANCE and
+                    abs(py - y) <= PULSE_TRACKING_DISTANCE):
+                    is_same_pulse = True
+                    break
+
+            if not is_same_pulse:
+                new_pulses.append((x, y))
+
+        self._mark_stage("tracking")
+
+        laser_colors = LaserColorClassifier.classify(frame, new_pulses,
+            self._preferences[settings.LASER_COLOR_CLASSIFIER])
+        self._mark_stage("color")
+
+        for ((x, y), laser_color) in zip(new_pulses, laser_colors):
+            # If we couldn't detect a laser color, it's probably not a
+            # shot
+            if (laser_color is not None and
+                self._preferences[settings.IGNORE_LASER_COLOR] not in laser_color):
+
+                self._notify_listeners((SHOT_EVENT, laser_color, x, y,
+                    timestamp, sequence))
+
+    def detect_interfence(self, percent_dark):
+        # If 99% of thresholded image isn't dark, we probably have
+        # a light source or glare in the image. The feed is checked on every
+        # frame, but we only warn when interference shows up.
+        has_interference = percent_dark < .99
+
+        if has_interference and not self._has_interference:
+            self._logger.warning(
+                "Glare or light source detected. %f of the image is dark." %
+                percent_dark)
+
+            self._notify_listeners((INTERFERENCE_EVENT, percent_dark))
+        elif not has_interference and self._has_interference:
+            self._logger.info("Glare or light source is no longer detected.")
+
+        self._has_interference = has_interference
+
+    # capture is the WebcamCapture frames are pulled from once the engine is
+    # started. It can be None if frames will only be passed to detect_shots.
+    def __init__(self, capture, preferences, logger):
+        self._capture = capture
+        self._preferences = preferences
+        self._logger = logger
+        self._event_listeners = []
+        self._stage_timer = None
+        self._has_interference = False
+        self._background = None
+        self._background_regions = None
+        self._stale_background = None
+        self._previous_blobs = []
+        self._target_regions = []
+        self._running = False
+        self._paused = False
+        self._detection_thread = None
@@ -0,0 +1,180 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import numpy
+import os
+import Queue
+import struct
+from threading import Thread
+import time
+from webcam_capture import clock
+
+# Shot logs are kept with ShootOFF no matter where it was started from
+SHOT_LOG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    "shot_logs")
+SHOT_LOG_EXTENSION = ".shots"
+
+# A shot log file starts with a fixed size header followed by one fixed size
+# record per shot, so a log can be appended to a shot at a time and read
+# straight into numpy arrays
+MAGIC = "SOSHOTS\0"
+VERSION = 2
+# magic, version, record size, session start time (seconds since the epoch)
+HEADER_FORMAT = "<8sIId"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+UNKNOWN_COLOR = 0
+RED = 1
+GREEN = 2
+COLOR_NAMES = {UNKNOWN_COLOR: "unknown", RED: "red", GREEN: "green"}
+
+# time is when the frame the shot was found in was captured (seconds since
+# the epoch), timer is the shot timer's value for it, x and y are where it
+# was in the webcam frame, region is the index of the region hit in its
+# target (in stacking order) or -1 for a miss or an unknown region, target
+# is the hit target's internal name, target_file is the name of the file it
+# was loaded from and columns are the values training protocols added to
+# the shot list separated by tabs. Text that doesn't fit in its field is
+# cut off.
+SHOT_RECORD = numpy.dtype([("time", "<f8"), ("timer", "<f8"),
+    ("x", "<f4"), ("y", "<f4"), ("color", "u1"), ("hit", "u1"),
+    ("region", "<i2"), ("target", "S16"), ("target_file", "S64"),
+    ("columns", "S64")])
+
+def color_code(laser_color):
+    if laser_color is None:
+        return UNKNOWN_COLOR
+    if "red" in laser_color:
+        return RED
+    if "green" in laser_color:
+        return GREEN
+
+    return UNKNOWN_COLOR
+
+def _to_bytes(value):
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+
+    return str(value)
+
+# Returns a new shot log path in SHOT_LOG_DIR named after the time
+def new_session_path(directory=SHOT_LOG_DIR):
+    name = time.strftime("%Y%m%d-%H%M%S", time.localtime())
+    return os.path.join(directory, name + SHOT_LOG_EXTENSION)
+
+# This class streams shots to a shot log file. Logging a shot only puts it
+# on a queue, a writer thread packs queued shots into records and appends
+# them to the file, so logging never waits for the disk.
+class ShotLogWriter():
+    def start(self):
+        self._writer_thread = Thread(target=self._write_loop,
+            name="shot_log_thread")
+        self._writer_thread.daemon = True
+        self._writer_thread.start()
+
+    # Writes every shot that was logged and closes the file
+    def close(self):
+        if self._writer_thread is not None:
+            self._records.put(None)
+            self._writer_thread.join()
+            self._writer_thread = None
+
+    # detection_time is when the frame the shot was found in was captured
+    # (a webcam_capture.clock() value), so the log isn't thrown off by how
+    # long the shot took to get here. timer, x, y and laser_color are the
+    # shot's shot timer value, frame coordinates and laser color. target
+    # and region name the region that was hit (region is its index in the
+    # target), target_file is the file the target was loaded from and
+    # columns is a sequence of values training protocols added for the shot.
+    def log_shot(self, detection_time, timer, x, y, laser_color, target=None,
+        region=-1, columns=(), target_file=None):
+
+        if target is None:
+            target = ""
+            region = -1
+
+        if target_file is None:
+            target_file = ""
+
+        self._records.put((detection_time + self._clock_offset, timer, x, y,
+            color_code(laser_color), target != "", region, _to_bytes(target),
+            _to_bytes(target_file),
+            "\t".join(_to_bytes(column) for column in columns)))
+
+    def get_path(self):
+        return self._path
+
+    def _write_loop(self):
+        record = numpy.zeros(1, dtype=SHOT_RECORD)
+        done = False
+
+        with open(self._path, "ab") as log_file:
+            if log_file.tell() == 0:
+                log_file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION,
+                    SHOT_RECORD.itemsize, time.time()))
+
+            while not done:
+                # Write everything that is waiting before flushing
+                shots = [self._records.get()]
+                while True:
+                    try:
+                        shots.append(self._records.get_nowait())
+                    except Queue.Empty:
+                        break
+
+                for shot in shots:
+                    if shot is None:
+                        done = True
+                        break
+
+                    record[0] = shot
+                    log_file.write(record.tostring())
+
+                log_file.flush()
+
+    # path is the shot log file to append to, it is created (along with
+    # its directory) if it doesn't exist
+    def __init__(self, path):
+        self._path = path
+        # The capture clock counts from an arbitrary point, this moves its
+        # times to seconds since the epoch
+        self._clock_offset = time.time() - clock()
+        self._records = Queue.Queue()
+        self._writer_thread = None
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+# Returns (session_start_time, records) for a shot log. records is a numpy
+# array of SHOT_RECORD that is memory mapped from the file, so even very
+# long logs are cheap to open. A record left half written (e.g. by a crash)
+# is ignored.
+def read_shot_log(path):
+    with open(path, "rb") as log_file:
+        header = log_file.read(HEADER_SIZE)
+
+    if len(header) < HEADER_SIZE:
+        raise ValueError("%s is not a shot log" % path)
+
+    (magic, version, record_size, start_time) = struct.unpack(HEADER_FORMAT,
+        header)
+
+    if magic != MAGIC:
+        raise ValueError("%s is not a shot log" % path)
+
+    if version != VERSION or record_size != SHOT_RECORD.itemsize:
+        raise ValueError("%s is a version %d shot log, only version %d is "
+            "supported" % (path, version, VERSION))
+
+    record_count = (os.path.getsize(path) - HEADER_SIZE) / record_size
+
+    # Empty files can't be memory mapped
+    if record_count == 0:
+        return (start_time, numpy.zeros(0, dtype=SHOT_RECORD))
+
+    records = numpy.memmap(path, dtype=SHOT_RECORD, mode="r",
+        offset=HEADER_SIZE, shape=(record_count,))
+
+    return (start_time, records)
@@ -0,0 +1,162 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+from threading import Condition, Thread
+import time
+
+# pyttsx is only needed to actually say messages
+try:
+    import pyttsx
+except ImportError:
+    pyttsx = None
+
+SPEECH_RATE = 150 # words per minute
+# Messages waiting to be said past this many push out the oldest one
+MAX_PENDING_MESSAGES = 4
+# How often the speech engine is run while it is talking
+SPEECH_POLL_INTERVAL = .01 # s
+
+# This class says messages out loud one at a time on a single speech thread,
+# which is the only thread that touches the text-to-speech engine. Messages
+# said while another one is being spoken wait their turn in a short queue:
+# a message that is already waiting isn't queued again, and a message with
+# a key replaces the waiting message with the same key (e.g. a new prompt
+# replaces an old prompt that was never said). If the speech engine can't
+# be started, messages are dropped instead of queued.
+class SpeechQueue():
+    def start(self):
+        self._running = True
+        self._speech_thread = Thread(target=self._speech_loop,
+            name="speech_thread")
+        self._speech_thread.daemon = True
+        self._speech_thread.start()
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._pending = []
+            self._cancel_current = True
+            self._condition.notify()
+
+        if self._speech_thread is not None:
+            self._speech_thread.join()
+            self._speech_thread = None
+
+    # Queues message to be said and returns right away
+    def say(self, message, key=None):
+        with self._condition:
+            if not self._available:
+                return
+
+            for i in range(len(self._pending)):
+                (pending_message, pending_key) = self._pending[i]
+
+                if key is not None and pending_key == key:
+                    self._pending[i] = (message, key)
+                    return
+
+                if key is None and pending_message == message:
+                    return
+
+            if len(self._pending) >= MAX_PENDING_MESSAGES:
+                self._pending.pop(0)
+
+            self._pending.append((message, key))
+            self._condition.notify()
+
+    # Drops every message that hasn't started being said yet
+    def flush(self):
+        with self._condition:
+            self._pending = []
+
+    # Drops every waiting message and stops the one being said
+    def cancel(self):
+        with self._condition:
+            self._pending = []
+            self._cancel_current = True
+
+    def get_pending_count(self):
+        with self._condition:
+            return len(self._pending)
+
+    def is_speaking(self):
+        return self._speaking
+
+    # False once the speech engine couldn't be started
+    def is_available(self):
+        with self._condition:
+            return self._available
+
+    def _open_engine(self):
+        if self._engine_factory is None:
+            self._logger.warning("pyttsx isn't installed, messages will " +
+                "not be said.")
+            return None
+
+        try:
+            engine = self._engine_factory()
+            # slow down the wpm rate otherwise they speek to fast
+            engine.setProperty("rate", SPEECH_RATE)
+            engine.startLoop(False)
+            return engine
+        except Exception as e:
+            self._logger.warning("Couldn't start text-to-speech, messages " +
+                "will not be said: %s", e)
+            return None
+
+    def _speech_loop(self):
+        # Some speech drivers only work on the thread that created the
+        # engine, so it is created here
+        engine = self._open_engine()
+
+        if engine is None:
+            with self._condition:
+                self._available = False
+                self._pending = []
+            return
+
+        try:
+            while True:
+                with self._condition:
+                    while self._running and len(self._pending) == 0:
+                        self._condition.wait()
+
+                    if not self._running:
+                        return
+
+                    (message, key) = self._pending.pop(0)
+                    self._cancel_current = False
+                    self._speaking = True
+
+                engine.say(message)
+                engine.iterate()
+
+                while engine.isBusy():
+                    if self._cancel_current:
+                        engine.stop()
+
+                    time.sleep(SPEECH_POLL_INTERVAL)
+                    engine.iterate()
+
+                self._speaking = False
+        finally:
+            self._speaking = False
+            engine.endLoop()
+
+    # engine_factory creates the text-to-speech engine on the speech thread.
+    # By default it's pyttsx.init.
+    def __init__(self, logger, engine_factory=None):
+        self._logger = logger
+        self._pending = []
+        self._condition = Condition()
+        self._running = False
+        self._speaking = False
+        self._available = True
+        self._cancel_current = False
+        self._speech_thread = None
+
+        if engine_factory is None and pyttsx is not None:
+            engine_factory = pyttsx.init
+
+        self._engine_factory = engine_factory
@@ -22,3 +22,59 @@ class TagParser():
                 tags[prop] = value
 
         return tags
+
+    # Returns parsed tags that can't be changed, so they are safe to hand
+    # out from a cache
+    @staticmethod
+    def freeze_tags(tags):
+        frozen_tags = dict(tags)
+
+        if "command" in frozen_tags:
+            frozen_tags["command"] = tuple(frozen_tags["command"])
+
+        return RegionTags(frozen_tags)
+
+# A dict of parsed region tags that raises a TypeError when something tries
+# to change it
+class RegionTags(dict):
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("region tags can't be changed")
+
+    __setitem__ = _immutable
+    __delitem__ = _immutable
+    clear = _immutable
+    pop = _immutable
+    popitem = _immutable
+    setdefault = _immutable
+    update = _immutable
+
+    # Copies and pickles are built from a plain dict
+    def __reduce__(self):
+        return (RegionTags, (dict(self),))
+
+# This class keeps the parsed tags of every target region on a canvas so
+# that they are only parsed once instead of every time a region is hit or
+# the targets are listed. Tags are added when the target pickler draws a
+# region, regions that were never added are parsed on first use. A region's
+# entry has to be invalidated when its tags change or it is deleted.
+class TagCache():
+    def add_region(self, region, tags):
+        self._tags[region] = TagParser.freeze_tags(tags)
+
+    def get_tags(self, region):
+        if region not in self._tags:
+            self.add_region(region, TagParser.parse_tags(
+                self._canvas.gettags(region)))
+
+        return self._tags[region]
+
+    def invalidate(self, region):
+        if region in self._tags:
+            del self._tags[region]
+
+    def clear(self):
+        self._tags = {}
+
+    def __init__(self, canvas):
+        self._canvas = canvas
+        self._tags = {}
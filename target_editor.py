@@ -5,6 +5,7 @@
 from canvas_manager import CanvasManager
 import os
 from PIL import Image, ImageTk
+import shape_library
 from tag_editor_popup import TagEditorPopup
 from target_pickler import TargetPickler
 import Tkinter, tkFileDialog, tkMessageBox, ttk
@@ -18,6 +19,12 @@ D_SILHOUETTE_3 = 5
 D_SILHOUETTE_4 = 6
 D_SILHOUETTE_5 = 7
 
+CURSOR_UPDATE_INTERVAL = 16 # ms, about once per display refresh
+
+# The shape in the shape library each drawing tool draws
+CURSOR_SHAPES = {RECTANGLE: "rectangle", OVAL: "oval", TRIANGLE: "triangle",
+    D_SILHOUETTE_3: "aqt3", D_SILHOUETTE_4: "aqt4", D_SILHOUETTE_5: "aqt5"}
+
 CANVAS_BACKGROUND = (1,)
 
 class TargetEditor():
@@ -34,7 +41,7 @@ class TargetEditor():
         if target_file:
             target_pickler = TargetPickler()
             target_pickler.save(target_file, self._regions,
-                self._target_canvas)
+                self._target_canvas, self._skipped_regions)
 
         if (is_new_target):
             self._notify_new_target(target_file)
@@ -112,6 +119,9 @@ class TargetEditor():
         if self._radio_selection.get() != FREEFORM_POLYGON:
             self._reset_freeform_polygon()
 
+        # The new tool gets its own cursor shape when the mouse moves
+        self._remove_cursor_shape()
+
     def canvas_right_click(self, event):
         if self._radio_selection.get() == FREEFORM_POLYGON:
             if len(self._freeform_vertices_points) < 4:
@@ -131,12 +141,18 @@ class TargetEditor():
                 fill="black", outline="black", stipple="gray25",
                 tags=("_shape:freeform_polygon"))
             self._regions.append(self._freeform_region)
-            self._create_cursor_shape(event)
 
-            # Delete all temporary data and shapes
+            # Delete all temporary data and shapes, which includes the
+            # cursor's vertex
             self._reset_freeform_polygon()
+            self._cursor_shape = None
+            self._move_cursor_shape(event.x, event.y)
 
     def canvas_click(self, event):
+        # The cursor shape may still be waiting to catch up with the mouse
+        if self._radio_selection.get() != CURSOR:
+            self._move_cursor_shape(event.x, event.y)
+
         if self._radio_selection.get() == FREEFORM_POLYGON:
             self._freeform_vertices_points.append((event.x, event.y))
             self._freeform_vertices_ids.append(self._cursor_shape)
@@ -144,15 +160,18 @@ class TargetEditor():
             if self._freeform_temp_line_id is not None:
                 self._freeform_edges_ids.append(self._freeform_temp_line_id)
 
-            self._create_cursor_shape(event)
+            # The vertex and the line to it stay where they are, the
+            # cursor gets new ones
+            self._cursor_shape = None
+            self._freeform_temp_line_id = None
+            self._move_cursor_shape(event.x, event.y)
 
         elif self._radio_selection.get() != CURSOR:
-            # This will make it so that mouse move event
-            # won't delete the current cursor shape and will
-            # make a new one, thus leaving the current shape 
-            # as a region
+            # Leave the current cursor shape as a region and give the
+            # cursor a new one
             self._regions.append(self._cursor_shape)
-            self._create_cursor_shape(event)
+            self._cursor_shape = None
+            self._move_cursor_shape(event.x, event.y)
         else:
             old_region = self._selected_region
             self._selected_region = event.widget.find_closest(
@@ -178,159 +197,101 @@ class TargetEditor():
                     self._tag_popup_state.set(False)
                     self.toggle_tag_editor()
 
+    # Motion events can come in much faster than the canvas is redrawn, so
+    # they only remember where the mouse is and the cursor shape is moved
+    # there at most once per CURSOR_UPDATE_INTERVAL
     def canvas_mouse_move(self, event):
-        if self._cursor_shape is not None:
-            self._target_canvas.delete(self._cursor_shape)
+        self._cursor_position = (event.x, event.y)
 
-        if self._freeform_temp_line_id is not None:
-            self._target_canvas.delete(self._freeform_temp_line_id)
-        
-        if self._radio_selection.get() == CURSOR:
-            self._cursor_shape = None
+        if self._cursor_update is None:
+            self._cursor_update = self._target_canvas.after(
+                CURSOR_UPDATE_INTERVAL, self._update_cursor_shape)
 
-        self._create_cursor_shape(event)
+    def _update_cursor_shape(self):
+        self._cursor_update = None
+        self._move_cursor_shape(*self._cursor_position)
 
-    def _create_cursor_shape(self, event):
-        initial_size = 30
-        aqt_scale = 2.5
+    # A cursor update that is still waiting when the editor is closed would
+    # run against a canvas that no longer exists
+    def canvas_destroyed(self, event):
+        if self._cursor_update is not None:
+            self._target_canvas.after_cancel(self._cursor_update)
+            self._cursor_update = None
 
-        if self._radio_selection.get() == RECTANGLE:        
-            self._cursor_shape = self._target_canvas.create_rectangle(
-                event.x - initial_size,
-                event.y - initial_size,
-                event.x + initial_size,
-                event.y + initial_size, 
-                fill="black", stipple="gray25", tags=("_shape:rectangle"))
+    # Moves the current tool's cursor shape to (x, y). The shape is only
+    # created when there isn't one for the tool yet, otherwise it is moved
+    # in place.
+    def _move_cursor_shape(self, x, y):
+        if self._cursor_update is not None:
+            self._target_canvas.after_cancel(self._cursor_update)
+            self._cursor_update = None
 
-        elif self._radio_selection.get() == OVAL:        
-            self._cursor_shape = self._target_canvas.create_oval(
-                event.x - initial_size,
-                event.y - initial_size,
-                event.x + initial_size,
-                event.y + initial_size, 
-                fill="black", stipple="gray25", tags=("_shape:oval"))
-
-        elif self._radio_selection.get() == TRIANGLE:        
-            self._cursor_shape = self._target_canvas.create_polygon(
-                event.x,
-                event.y - initial_size,
-                event.x + initial_size,
-                event.y + initial_size,
-                event.x - initial_size,
-                event.y + initial_size, 
-                event.x,
-                event.y - initial_size,
-                fill="black", outline="black", stipple="gray25",
-                tags=("_shape:triangle"))
-
-        elif self._radio_selection.get() == D_SILHOUETTE_3:        
-            self._cursor_shape = self._target_canvas.create_polygon(
-                event.x+15.083*aqt_scale,event.y+13.12*aqt_scale,
-                event.x+15.083*aqt_scale,event.y+-0.147*aqt_scale,
-                event.x+14.277*aqt_scale,event.y+-2.508*aqt_scale,
-                event.x+13.149*aqt_scale,event.y+-4.115*aqt_scale,
-                event.x+11.841*aqt_scale,event.y+-5.257*aqt_scale,
-                event.x+10.557*aqt_scale,event.y+-6.064*aqt_scale,
-                event.x+8.689*aqt_scale,event.y+-6.811*aqt_scale,
-                event.x+7.539*aqt_scale,event.y+-8.439*aqt_scale,
-                event.x+7.076*aqt_scale,event.y+-9.978*aqt_scale,
-                event.x+6.104*aqt_scale,event.y+-11.577*aqt_scale,
-                event.x+4.82*aqt_scale,event.y+-12.829*aqt_scale,
-                event.x+3.43*aqt_scale,event.y+-13.788*aqt_scale,
-                event.x+1.757*aqt_scale,event.y+-14.386*aqt_scale,
-                event.x+0.083*aqt_scale,event.y+-14.55*aqt_scale,
-                event.x+-1.59*aqt_scale,event.y+-14.386*aqt_scale,
-                event.x+-3.263*aqt_scale,event.y+-13.788*aqt_scale,
-                event.x+-4.653*aqt_scale,event.y+-12.829*aqt_scale,
-                event.x+-5.938*aqt_scale,event.y+-11.577*aqt_scale,
-                event.x+-6.909*aqt_scale,event.y+-9.978*aqt_scale,
-                event.x+-7.372*aqt_scale,event.y+-8.439*aqt_scale,
-                event.x+-8.522*aqt_scale,event.y+-6.811*aqt_scale,
-                event.x+-10.39*aqt_scale,event.y+-6.064*aqt_scale,
-                event.x+-11.674*aqt_scale,event.y+-5.257*aqt_scale,
-                event.x+-12.982*aqt_scale,event.y+-4.115*aqt_scale,
-                event.x+-14.11*aqt_scale,event.y+-2.508*aqt_scale,
-                event.x+-14.917*aqt_scale,event.y+-0.147*aqt_scale,
-                event.x+-14.917*aqt_scale,event.y+13.12*aqt_scale,
-                fill="black", outline="black", stipple="gray25",
-                tags=("_shape:aqt3"))
-
-        elif self._radio_selection.get() == D_SILHOUETTE_4:        
-            self._cursor_shape = self._target_canvas.create_polygon(
-                event.x+11.66*aqt_scale,event.y+5.51*aqt_scale,
-                event.x+11.595*aqt_scale,event.y+0.689*aqt_scale,
-                event.x+11.1*aqt_scale,event.y+-1.084*aqt_scale,
-                event.x+9.832*aqt_scale,event.y+-2.441*aqt_scale,
-                event.x+7.677*aqt_scale,event.y+-3.322*aqt_scale,
-                event.x+5.821*aqt_scale,event.y+-4.709*aqt_scale,
-                event.x+4.715*aqt_scale,event.y+-6.497*aqt_scale,
-                event.x+4.267*aqt_scale,event.y+-8.135*aqt_scale,
-                event.x+3.669*aqt_scale,event.y+-9.41*aqt_scale,
-                event.x+2.534*aqt_scale,event.y+-10.553*aqt_scale,
-                event.x+1.436*aqt_scale,event.y+-11.091*aqt_scale,
-                event.x+0.083*aqt_scale,event.y+-11.323*aqt_scale,
-                event.x+-1.269*aqt_scale,event.y+-11.091*aqt_scale,
-                event.x+-2.367*aqt_scale,event.y+-10.553*aqt_scale,
-                event.x+-3.502*aqt_scale,event.y+-9.41*aqt_scale,
-                event.x+-4.1*aqt_scale,event.y+-8.135*aqt_scale,
-                event.x+-4.548*aqt_scale,event.y+-6.497*aqt_scale,
-                event.x+-5.654*aqt_scale,event.y+-4.709*aqt_scale,
-                event.x+-7.51*aqt_scale,event.y+-3.322*aqt_scale,
-                event.x+-9.665*aqt_scale,event.y+-2.441*aqt_scale,
-                event.x+-10.933*aqt_scale,event.y+-1.084*aqt_scale,
-                event.x+-11.428*aqt_scale,event.y+0.689*aqt_scale,
-                event.x+-11.493*aqt_scale,event.y+5.51*aqt_scale,
-                fill="black", outline="black", stipple="gray25",
-                tags=("_shape:aqt4"))
-            
-        elif self._radio_selection.get() == D_SILHOUETTE_5:        
-            self._cursor_shape = self._target_canvas.create_polygon(
-                event.x+7.893*aqt_scale,event.y+3.418*aqt_scale,
-                event.x+7.893*aqt_scale,event.y+1.147*aqt_scale,
-                event.x+7.255*aqt_scale,event.y+0.331*aqt_scale,
-                event.x+5.622*aqt_scale,event.y+-0.247*aqt_scale,
-                event.x+4.187*aqt_scale,event.y+-1.124*aqt_scale,
-                event.x+2.833*aqt_scale,event.y+-2.339*aqt_scale,
-                event.x+1.917*aqt_scale,event.y+-3.594*aqt_scale,
-                event.x+1.219*aqt_scale,event.y+-5.048*aqt_scale,
-                event.x+0.9*aqt_scale,event.y+-6.223*aqt_scale,
-                event.x+0.801*aqt_scale,event.y+-7.1*aqt_scale,
-                event.x+0.521*aqt_scale,event.y+-7.558*aqt_scale,
-                event.x+0.083*aqt_scale,event.y+-7.617*aqt_scale,
-                event.x+-0.354*aqt_scale,event.y+-7.558*aqt_scale,
-                event.x+-0.634*aqt_scale,event.y+-7.1*aqt_scale,
-                event.x+-0.733*aqt_scale,event.y+-6.223*aqt_scale,
-                event.x+-1.052*aqt_scale,event.y+-5.048*aqt_scale,
-                event.x+-1.75*aqt_scale,event.y+-3.594*aqt_scale,
-                event.x+-2.666*aqt_scale,event.y+-2.339*aqt_scale,
-                event.x+-4.02*aqt_scale,event.y+-1.124*aqt_scale,
-                event.x+-5.455*aqt_scale,event.y+-0.247*aqt_scale,
-                event.x+-7.088*aqt_scale,event.y+0.331*aqt_scale,
-                event.x+-7.726*aqt_scale,event.y+1.147*aqt_scale,
-                event.x+-7.726*aqt_scale,event.y+3.418*aqt_scale,
-                fill="black", outline="black", stipple="gray25",
-                tags=("_shape:aqt5"))
+        selection = self._radio_selection.get()
+
+        # The shape is gone if it was deleted along with other temporary
+        # shapes (e.g. an undone freeform vertex)
+        if (self._cursor_shape is not None and
+            (self._cursor_shape_tool != selection or
+            self._target_canvas.type(self._cursor_shape) is None)):
+            self._remove_cursor_shape()
+
+        if selection in CURSOR_SHAPES:
+            self._place_cursor_shape(
+                shape_library.get_shape(CURSOR_SHAPES[selection]), x, y)
 
-        elif self._radio_selection.get() == FREEFORM_POLYGON:     
-            # draw a vertex for the polygon
-            vertex_size = 2
-   
+        elif selection == FREEFORM_POLYGON:
+            self._place_freeform_cursor(x, y)
+
+        self._cursor_shape_tool = selection
+
+    def _place_cursor_shape(self, shape, x, y):
+        coords = shape.place(x, y)
+
+        if self._cursor_shape is not None:
+            self._target_canvas.coords(self._cursor_shape, *coords)
+            return
+
+        item_type = shape.get_item_type()
+        self._cursor_shape = getattr(self._target_canvas,
+            shape_library.CREATE_FUNCTIONS[item_type])(coords,
+            fill="black", tags=("_shape:" + shape.get_name()),
+            **shape_library.ITEM_OPTIONS[item_type])
+
+    def _place_freeform_cursor(self, x, y):
+        # draw a vertex for the polygon
+        vertex_size = 2
+        vertex_coords = (x - vertex_size, y - vertex_size,
+            x + vertex_size, y + vertex_size)
+
+        if self._cursor_shape is not None:
+            self._target_canvas.coords(self._cursor_shape, *vertex_coords)
+        else:
             self._cursor_shape = self._target_canvas.create_oval(
-                event.x - vertex_size,
-                event.y - vertex_size,
-                event.x + vertex_size,
-                event.y + vertex_size, 
-                fill="black", tags=("_shape:vertex"))
-
-            # draw a dashed line between this vertex and the last
-            # vertex drawn
-            if len(self._freeform_vertices_points) > 0:
-                last_point = self._freeform_vertices_points[-1]
-
-                self._freeform_temp_line_id = self._target_canvas.create_line(
-                    last_point,
-                    event.x, event.y,
-                    dash=(4,4), tags="_shape:freeform_edge")
+                vertex_coords, fill="black", tags=("_shape:vertex"))
+
+        # draw a dashed line between this vertex and the last
+        # vertex drawn
+        if len(self._freeform_vertices_points) == 0:
+            return
+
+        line_coords = self._freeform_vertices_points[-1] + (x, y)
+
+        if (self._freeform_temp_line_id is not None and
+            self._target_canvas.type(self._freeform_temp_line_id) is not None):
+            self._target_canvas.coords(self._freeform_temp_line_id,
+                *line_coords)
+        else:
+            self._freeform_temp_line_id = self._target_canvas.create_line(
+                line_coords, dash=(4,4), tags="_shape:freeform_edge")
+
+    def _remove_cursor_shape(self):
+        if self._cursor_shape is not None:
+            self._target_canvas.delete(self._cursor_shape)
+            self._cursor_shape = None
+
+        if self._freeform_temp_line_id is not None:
+            self._target_canvas.delete(self._freeform_temp_line_id)
+            self._freeform_temp_line_id = None
 
     def canvas_delete_region(self, event):
         if (self._selected_region is not None and
@@ -394,6 +355,7 @@ class TargetEditor():
         self._target_canvas.bind('<Delete>', self.canvas_delete_region)
         self._target_canvas.bind('<Control-z>', self.undo_vertex)
         self._target_canvas.bind('<ButtonPress-3>', self.canvas_right_click)
+        self._target_canvas.bind('<Destroy>', self.canvas_destroyed)
 
         self._canvas_manager = CanvasManager(self._target_canvas)
 
@@ -513,8 +475,12 @@ class TargetEditor():
         notifynewfunc=None):
 
         self._cursor_shape = None
+        self._cursor_shape_tool = None
+        self._cursor_position = (0, 0)
+        self._cursor_update = None
         self._selected_region = None
         self._regions = []
+        self._skipped_regions = []
         self._freeform_vertices_points = []
         self._freeform_vertices_ids = []
         self._freeform_edges_ids = []
@@ -523,7 +489,20 @@ class TargetEditor():
 
         if target is not None:
             target_pickler = TargetPickler()
-            (region_object, self._regions) = target_pickler.load(
-                target, self._target_canvas)
+            (region_object, self._regions,
+                self._skipped_regions) = target_pickler.load(target,
+                self._target_canvas)
+
+            # Regions the editor can't draw are kept as they are so that
+            # saving the target doesn't delete them
+            if len(self._skipped_regions) > 0:
+                shapes = sorted(set(str(region.get("shape"))
+                    for region in self._skipped_regions))
+                message = ("%d region(s) of this target use shapes that " +
+                    "aren't loaded (%s). They can't be shown or edited, but " +
+                    "they will be kept when the target is saved.") % (
+                    len(self._skipped_regions), ", ".join(shapes))
+                tkMessageBox.showwarning("Unknown Shapes", message,
+                    parent=self._window)
 
         self._notify_new_target = notifynewfunc
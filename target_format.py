@@ -0,0 +1,245 @@
+#!/usr/bin/env python2
+
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import json
+import numpy
+import pickle
+import struct
+import sys
+from tag_parser import TagParser
+
+# A target file starts with MAGIC and a fixed size header: the format
+# version, the size of the metadata and how many coordinates follow it. The
+# metadata is JSON describing each region (shape, fill, tags and how many
+# coordinates it has), then the coordinates of every region follow in order
+# as little endian 32 bit floats.
+MAGIC = "SOTARGET"
+VERSION = 1
+HEADER_FORMAT = "<8sHII"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+COORDINATE_TYPE = numpy.dtype("<f4")
+
+class TargetFormatError(ValueError):
+    pass
+
+# Writes regions to target_file. regions is a list of dicts with the
+# region's "tags" (its raw canvas tags), "coords" and "fill". Raises
+# TargetFormatError instead of writing a target that couldn't be loaded.
+def save_target(target_file, regions):
+    metadata_regions = []
+    coords = []
+
+    for region in regions:
+        # Tags are kept as they are (unicode included), JSON handles them
+        tags = list(region["tags"])
+        if not all(isinstance(tag, basestring) for tag in tags):
+            raise TargetFormatError("a region's tags aren't all strings")
+
+        region_coords = [float(coord) for coord in region["coords"]]
+        if len(region_coords) < 4 or len(region_coords) % 2 != 0:
+            raise TargetFormatError("a region has %d coordinates" %
+                len(region_coords))
+
+        # Regions of very old targets may not have a _shape tag. They get
+        # an empty shape name, so they load like any other region with an
+        # unknown shape (kept, but not drawn).
+        metadata_regions.append({
+            "shape": TagParser.parse_tags(tags).get("_shape", ""),
+            "fill": str(region["fill"]),
+            "tags": tags,
+            "coordinate_count": len(region_coords)})
+        coords.extend(region_coords)
+
+    metadata = json.dumps({"regions": metadata_regions},
+        separators=(",", ":")).encode("utf-8")
+    coords = numpy.array(coords, dtype=COORDINATE_TYPE)
+
+    with open(target_file, "wb") as target:
+        target.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION,
+            len(metadata), len(coords)))
+        target.write(metadata)
+        target.write(coords.tostring())
+
+# Returns the regions in target_file as a list of dicts with the region's
+# "shape", "fill", "tags" (a tuple of raw canvas tags), "parsed_tags" and
+# "coords" (a list of floats). Nothing is drawn, so targets can be read
+# without a canvas. Raises TargetFormatError if the file isn't a valid
+# target.
+def load_target(target_file):
+    with open(target_file, "rb") as target:
+        data = target.read()
+
+    if len(data) < HEADER_SIZE or not data.startswith(MAGIC):
+        raise TargetFormatError("%s is not a ShootOFF target" % target_file)
+
+    (magic, version, metadata_size, coordinate_count) = struct.unpack(
+        HEADER_FORMAT, data[:HEADER_SIZE])
+
+    if version != VERSION:
+        raise TargetFormatError("%s is a version %d target, only version %d "
+            "is supported" % (target_file, version, VERSION))
+
+    coords_start = HEADER_SIZE + metadata_size
+    coords_size = coordinate_count * COORDINATE_TYPE.itemsize
+    if len(data) != coords_start + coords_size:
+        raise TargetFormatError("%s is truncated or corrupt" % target_file)
+
+    try:
+        metadata = json.loads(data[HEADER_SIZE:coords_start].decode("utf-8"))
+    except ValueError as e:
+        raise TargetFormatError("%s has unreadable metadata: %s" %
+            (target_file, e))
+
+    _check_metadata(target_file, metadata, coordinate_count)
+
+    coords = numpy.frombuffer(data, dtype=COORDINATE_TYPE,
+        count=coordinate_count, offset=coords_start).tolist()
+
+    regions = []
+    position = 0
+    for metadata_region in metadata["regions"]:
+        count = metadata_region["coordinate_count"]
+        tags = tuple(metadata_region["tags"])
+
+        regions.append({"shape": metadata_region["shape"],
+            "fill": metadata_region["fill"],
+            "tags": tags,
+            "parsed_tags": TagParser.parse_tags(tags),
+            "coords": coords[position:position + count]})
+        position += count
+
+    return regions
+
+def _check_metadata(target_file, metadata, coordinate_count):
+    def fail(problem):
+        raise TargetFormatError("%s is not a valid target: %s" %
+            (target_file, problem))
+
+    if not isinstance(metadata, dict) or not isinstance(
+        metadata.get("regions"), list):
+        fail("it has no region list")
+
+    total = 0
+    for region in metadata["regions"]:
+        if not isinstance(region, dict):
+            fail("a region isn't an object")
+
+        # Shapes can come from shape files, so any name is allowed here and
+        # regions with shapes that aren't known are skipped when drawing
+        if not isinstance(region.get("shape"), basestring):
+            fail("a region's shape isn't a string")
+
+        if not isinstance(region.get("fill"), basestring):
+            fail("a region's fill isn't a string")
+
+        tags = region.get("tags")
+        if (not isinstance(tags, list) or
+            not all(isinstance(tag, basestring) for tag in tags)):
+            fail("a region's tags aren't a list of strings")
+
+        count = region.get("coordinate_count")
+        if (not isinstance(count, (int, long)) or isinstance(count, bool) or
+            count < 4 or count % 2 != 0):
+            fail("a region has a bad coordinate count")
+
+        total += count
+
+    if total != coordinate_count:
+        fail("the regions don't use every coordinate")
+
+# Old targets were pickled lists of region dicts. This unpickler refuses to
+# create anything but plain values so that reading one can't run code.
+class _SafeUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError("%s.%s is not allowed in a target" %
+            (module, name))
+
+def is_pickled_target(target_file):
+    with open(target_file, "rb") as target:
+        return target.read(len(MAGIC)) != MAGIC
+
+# Returns the regions of a pickled (pre-version 1) target as dicts with
+# "tags", "coords" and "fill". Raises TargetFormatError if the file isn't
+# a valid pickled target.
+def load_pickled_target(target_file):
+    with open(target_file, "rb") as target:
+        try:
+            region_object = _SafeUnpickler(target).load()
+        except Exception as e:
+            raise TargetFormatError("%s is not a ShootOFF target: %s" %
+                (target_file, e))
+
+    if not isinstance(region_object, list):
+        raise TargetFormatError("%s is not a ShootOFF target" % target_file)
+
+    _check_pickled_regions(target_file, region_object)
+
+    return region_object
+
+# The safe unpickler only makes sure plain values come out of a pickle, they
+# still have to look like regions
+def _check_pickled_regions(target_file, region_object):
+    def fail(problem):
+        raise TargetFormatError("%s is not a valid target: %s" %
+            (target_file, problem))
+
+    for region in region_object:
+        if not isinstance(region, dict):
+            fail("a region isn't a dict")
+
+        tags = region.get("tags")
+        if (not isinstance(tags, (list, tuple)) or
+            not all(isinstance(tag, basestring) for tag in tags)):
+            fail("a region's tags aren't a list of strings")
+
+        if not isinstance(region.get("fill"), basestring):
+            fail("a region's fill isn't a string")
+
+        coords = region.get("coords")
+        if (not isinstance(coords, (list, tuple)) or len(coords) < 4 or
+            len(coords) % 2 != 0 or not all(isinstance(coord,
+            (int, long, float)) and not isinstance(coord, bool)
+            for coord in coords)):
+            fail("a region's coords aren't an even length list of numbers")
+
+# Returns the regions of target_file like load_target does, whether it is
+# in the current format or pickled
+def read_target(target_file):
+    if not is_pickled_target(target_file):
+        return load_target(target_file)
+
+    regions = []
+    for region in load_pickled_target(target_file):
+        tags = tuple(region["tags"])
+        parsed_tags = TagParser.parse_tags(tags)
+
+        regions.append({"shape": parsed_tags.get("_shape"),
+            "fill": region["fill"],
+            "tags": tags,
+            "parsed_tags": parsed_tags,
+            "coords": [float(coord) for coord in region["coords"]]})
+
+    return regions
+
+# Rewrites a pickled target in the current format, to output_file if it's
+# given or over the pickled one otherwise
+def convert_pickled_target(target_file, output_file=None):
+    regions = load_pickled_target(target_file)
+    save_target(output_file or target_file, regions)
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print "usage: target_format.py TARGET_FILE..."
+        print "Converts pickled ShootOFF targets to the current target format."
+        sys.exit(2)
+
+    for target_file in sys.argv[1:]:
+        if not is_pickled_target(target_file):
+            print "%s is already converted" % target_file
+            continue
+
+        convert_pickled_target(target_file)
+        print "Converted %s" % target_file
@@ -0,0 +1,275 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import base64
+import json
+import os
+from PIL import Image, ImageColor, ImageDraw
+import shape_library
+from StringIO import StringIO
+import target_format
+
+TARGET_DIR = "targets"
+TARGET_EXTENSION = ".target"
+# The index is kept next to the targets it describes
+INDEX_FILE = ".target_library"
+INDEX_VERSION = 1
+# Every key a library entry has, see TargetLibrary.get_targets
+ENTRY_KEYS = ("path", "mtime", "size", "name", "region_count", "bbox",
+    "points", "subtargets", "commands", "tag_names", "thumbnail")
+THUMBNAIL_SIZE = 32 # px, the longest side of a thumbnail
+
+# Renders a target's regions (as loaded by target_format) into a small
+# transparent image that fits in THUMBNAIL_SIZE x THUMBNAIL_SIZE and returns
+# it as base64 encoded PNG data
+def render_thumbnail(regions, bbox):
+    (left, top, right, bottom) = bbox
+    width = max(right - left, 1)
+    height = max(bottom - top, 1)
+    scale = float(THUMBNAIL_SIZE - 1) / max(width, height)
+
+    image = Image.new("RGBA", (int(round(width * scale)) + 1,
+        int(round(height * scale)) + 1), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+
+    # Regions are drawn in the order they are stacked on the canvas
+    for region in regions:
+        try:
+            fill = ImageColor.getrgb(region["fill"])
+        except ValueError:
+            fill = None
+
+        coords = region["coords"]
+        points = [((coords[i] - left) * scale, (coords[i + 1] - top) * scale)
+            for i in range(0, len(coords) - 1, 2)]
+
+        shape = shape_library.get_shape(region["shape"])
+        if shape is None:
+            continue
+
+        if shape.get_item_type() == shape_library.RECTANGLE:
+            draw.rectangle(points[:2], fill=fill, outline="black")
+        elif shape.get_item_type() == shape_library.OVAL:
+            draw.ellipse(points[:2], fill=fill, outline="black")
+        else:
+            draw.polygon(points, fill=fill, outline="black")
+
+    png = StringIO()
+    image.save(png, "PNG")
+    return base64.b64encode(png.getvalue())
+
+# Returns the PIL image in thumbnail data made by render_thumbnail
+def decode_thumbnail(thumbnail):
+    return Image.open(StringIO(base64.b64decode(thumbnail)))
+
+# Returns the library entry for the target in target_file, it describes the
+# target well enough to list and pick it without drawing it
+def describe_target(target_file, stat=None):
+    if stat is None:
+        stat = os.stat(target_file)
+
+    regions = target_format.read_target(target_file)
+
+    xs = [x for region in regions for x in region["coords"][::2]]
+    ys = [y for region in regions for y in region["coords"][1::2]]
+    bbox = None
+    if len(xs) > 0:
+        bbox = (min(xs), min(ys), max(xs), max(ys))
+
+    points = set()
+    subtargets = set()
+    commands = set()
+    tag_names = set()
+
+    for region in regions:
+        tags = region["parsed_tags"]
+
+        if "points" in tags:
+            points.add(tags["points"])
+        if "subtarget" in tags:
+            subtargets.add(tags["subtarget"])
+        if "command" in tags:
+            commands.update(tags["command"])
+
+        # Tags starting with _ are ShootOFF's own (e.g. _shape)
+        tag_names.update(name for name in tags if not name.startswith("_"))
+
+    thumbnail = None
+    if bbox is not None:
+        thumbnail = render_thumbnail(regions, bbox)
+
+    (name, ext) = os.path.splitext(os.path.basename(target_file))
+
+    return {"path": target_file,
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "name": name,
+        "region_count": len(regions),
+        "bbox": bbox,
+        "points": sorted(points),
+        "subtargets": sorted(subtargets),
+        "commands": sorted(commands),
+        "tag_names": sorted(tag_names),
+        "thumbnail": thumbnail}
+
+# This class knows every target in a directory without drawing any of them.
+# What it learns about each target (name, region count, bounding box, the
+# points, subtargets and commands used by its regions and a thumbnail) is
+# kept in an index file along with the target's modification time and size,
+# so a target is only read again after it changed. Refreshing the library
+# only has to look at the directory, which keeps it cheap enough to do
+# every time a target menu is opened.
+class TargetLibrary():
+    # Brings the library up to date with the target directory, reading
+    # only the targets that are new or changed. Returns True if anything
+    # changed.
+    def refresh(self):
+        try:
+            file_names = os.listdir(self._directory)
+        except OSError as e:
+            self._logger.warning("Couldn't list the targets in %s: %s",
+                self._directory, e)
+            file_names = []
+
+        target_files = [os.path.join(self._directory, file_name)
+            for file_name in file_names if file_name.endswith(TARGET_EXTENSION)]
+        target_files.extend(target_file for target_file in self._extra_files
+            if target_file not in target_files)
+
+        entries = {}
+        changed = False
+
+        for target_file in target_files:
+            try:
+                stat = os.stat(target_file)
+            except OSError:
+                continue
+
+            entry = self._entries.get(target_file)
+            if (entry is None or entry["mtime"] != stat.st_mtime or
+                entry["size"] != stat.st_size):
+
+                try:
+                    entry = describe_target(target_file, stat)
+                except Exception as e:
+                    self._logger.warning("Couldn't add %s to the target " +
+                        "library: %s", target_file, e)
+                    continue
+
+                changed = True
+
+            entries[target_file] = entry
+
+        if changed or len(entries) != len(self._entries):
+            self._entries = entries
+            self._version += 1
+            self._save_index()
+            return True
+
+        return False
+
+    # Returns the entry of every target in the library sorted by name.
+    # Entries are dicts with the keys "path", "mtime", "size", "name",
+    # "region_count", "bbox", "points", "subtargets", "commands",
+    # "tag_names" (every tag used by a region except ShootOFF's own) and
+    # "thumbnail" (base64 encoded PNG data or None for an empty target).
+    def get_targets(self):
+        return sorted(self._entries.values(),
+            key=lambda entry: entry["name"].lower())
+
+    # Adds a target that may be outside of the library's directory (e.g.
+    # one that was just saved somewhere else by the target editor). It stays
+    # in the library until ShootOFF exits or the file is gone.
+    def add_target_file(self, target_file):
+        if target_file not in self._extra_files:
+            self._extra_files.append(target_file)
+
+        return self.refresh()
+
+    def get_target(self, target_file):
+        return self._entries.get(target_file)
+
+    # Returns the entries of the targets that have a region with every tag
+    # in tag_names (e.g. "subtarget")
+    def find_targets(self, *tag_names):
+        return [entry for entry in self.get_targets()
+            if all(name in entry["tag_names"] for name in tag_names)]
+
+    # Goes up every time targets are added, changed or removed, so
+    # anything built from the library knows when to rebuild
+    def get_version(self):
+        return self._version
+
+    def _index_path(self):
+        return os.path.join(self._directory, INDEX_FILE)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), "rb") as index_file:
+                index = json.load(index_file)
+        except (IOError, ValueError):
+            return {}
+
+        if (not isinstance(index, dict) or
+            index.get("version") != INDEX_VERSION or
+            not isinstance(index.get("targets"), list)):
+            return {}
+
+        # Entries that don't look right are dropped, their targets are just
+        # read again
+        entries = {}
+        for entry in index["targets"]:
+            try:
+                entry = self._check_index_entry(entry)
+            except (KeyError, TypeError, ValueError):
+                self._logger.debug("Dropped a bad target library index " +
+                    "entry: %r", entry)
+                continue
+
+            entries[entry["path"]] = entry
+
+        return entries
+
+    def _check_index_entry(self, entry):
+        if not isinstance(entry, dict):
+            raise TypeError("entry isn't an object")
+
+        for key in ENTRY_KEYS:
+            if key not in entry:
+                raise KeyError(key)
+
+        entry["path"] = str(entry["path"])
+        entry["name"] = str(entry["name"])
+        entry["mtime"] = float(entry["mtime"])
+        entry["size"] = int(entry["size"])
+        if entry["bbox"] is not None:
+            entry["bbox"] = tuple(float(coord) for coord in entry["bbox"])
+            if len(entry["bbox"]) != 4:
+                raise ValueError("bbox doesn't have 4 coordinates")
+
+        for key in ("points", "subtargets", "commands", "tag_names"):
+            if not isinstance(entry[key], list):
+                raise TypeError("%s isn't a list" % key)
+
+        return entry
+
+    # The index is only a cache, the library works without it (e.g. when
+    # the target directory is read only)
+    def _save_index(self):
+        index = {"version": INDEX_VERSION,
+            "targets": self.get_targets()}
+
+        try:
+            with open(self._index_path(), "wb") as index_file:
+                json.dump(index, index_file, separators=(",", ":"))
+        except IOError as e:
+            self._logger.debug("Couldn't save the target library index: %s",
+                e)
+
+    def __init__(self, logger, directory=TARGET_DIR):
+        self._logger = logger
+        self._directory = directory
+        self._entries = self._load_index()
+        self._extra_files = []
+        self._version = 0
@@ -2,11 +2,16 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
-import pickle
-from tag_parser import TagParser
+import target_format
+from target_template import TargetTemplate
 
+# This class saves targets drawn on a canvas to target files and draws
+# target files on a canvas. Targets that were saved by older versions
+# of ShootOFF (pickles) can still be loaded, see target_format.
 class TargetPickler():
-    def save(self, target_file, region_list, canvas):
+    # extra_regions are region dicts (like the ones load returns as
+    # skipped) that are saved after the regions on the canvas
+    def save(self, target_file, region_list, canvas, extra_regions=()):
         region_object = []
 
         for region in region_list:
@@ -18,75 +23,23 @@ class TargetPickler():
                 "coords":region_coords,
                 "fill":region_fill})
 
-        target = open(target_file, 'wb')
-        pickle.dump(region_object, target, pickle.HIGHEST_PROTOCOL)
-        target.close()
+        region_object.extend(extra_regions)
+        target_format.save_target(target_file, region_object)
 
     # the target_name is set on every region in a target
     # and should be unique for the webcam feed so that
-    # multiple instances of a target can exist
+    # multiple instances of a target can exist. If a tag
+    # cache is passed in, the parsed tags of every region
+    # are added to it. Returns the target's region dicts, the
+    # canvas ids of the regions that were drawn and the region
+    # dicts that weren't drawn because their shape isn't known.
     def load(self, target_file, canvas,
-		internal_target_name="_internal_name:target"):
+		internal_target_name="_internal_name:target", tag_cache=None):
 
-        target = open(target_file, 'rb')
-        region_object = pickle.load(target)
-        target.close()
+        region_object = target_format.read_target(target_file)
 
-        regions = self._draw_target(region_object, canvas,
-			internal_target_name)
-                
-        return (region_object, regions)
+        template = TargetTemplate(region_object)
+        regions = template.instantiate(canvas, internal_target_name,
+            tag_cache=tag_cache)
 
-    def _draw_target(self, region_object, canvas, internal_target_name):
-        regions = []
-
-        for region in region_object:
-            shape = 0
-            raw_tags = region["tags"]
-    
-            # Get rid of the default internal name otherwise every target
-            # will have it and selection won't work
-            raw_tags = tuple([value for value in raw_tags if value != "_internal_name:target"])
-
-            raw_tags += (internal_target_name,)
-            parsed_tags = TagParser.parse_tags(raw_tags)	
-
-            if parsed_tags["_shape"] == "rectangle":
-                shape = canvas.create_rectangle(region["coords"],
-                    fill=region["fill"], stipple="gray25",
-                    tags=raw_tags)
-
-            if parsed_tags["_shape"] == "oval":
-                shape = canvas.create_oval(region["coords"],
-                    fill=region["fill"], stipple="gray25",
-                    tags=raw_tags)
-
-            if parsed_tags["_shape"] == "triangle":
-                shape = canvas.create_polygon(region["coords"],
-                    fill=region["fill"], outline="black",
-                    stipple="gray25", tags=raw_tags)
-
-            if parsed_tags["_shape"] == "aqt3":
-                shape = canvas.create_polygon(region["coords"],
-                    fill=region["fill"], outline="black",
-                    stipple="gray25", tags=raw_tags)
-                
-            if parsed_tags["_shape"] == "aqt4":
-                shape = canvas.create_polygon(region["coords"],
-                    fill=region["fill"], outline="black",
-                    stipple="gray25", tags=raw_tags)
-
-            if parsed_tags["_shape"] == "aqt5":
-                shape = canvas.create_polygon(region["coords"],
-                    fill=region["fill"], outline="black",
-                    stipple="gray25", tags=raw_tags)
-
-            if parsed_tags["_shape"] == "freeform_polygon":
-                shape = canvas.create_polygon(region["coords"],
-                    fill=region["fill"], outline="black",
-                    stipple="gray25", tags=raw_tags)
-
-            if shape != 0:
-                regions.append(shape)
-
-        return regions
+        return (region_object, regions, template.get_skipped_regions())
@@ -0,0 +1,120 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import numpy
+import os
+import shape_library
+from tag_parser import TagParser
+import target_format
+
+# Every region of a saved target has this internal name, it is replaced
+# with the name of the copy being drawn
+DEFAULT_INTERNAL_NAME = "_internal_name:target"
+
+# A target's regions decoded and ready to be drawn. The coordinates of every
+# region are kept in one array so that placing a copy of the target is one
+# numpy operation no matter how many regions it has, and the regions' tags
+# are only parsed once no matter how many copies are drawn.
+class TargetTemplate():
+    # Draws a copy of the target on canvas with internal_target_name set on
+    # every region. The copy's coordinates are the saved ones multiplied by
+    # scale (x, y) and then moved by offset (x, y). If a tag cache is passed
+    # in, the parsed tags of every region are added to it. Returns the
+    # canvas ids of the regions in stacking order.
+    def instantiate(self, canvas, internal_target_name, offset=(0, 0),
+        scale=(1, 1), tag_cache=None):
+
+        coords = (self._coords * scale + offset).ravel().tolist()
+        name_tags = TagParser.parse_tags((internal_target_name,))
+        regions = []
+
+        for (create_function, start, end, options, raw_tags,
+            parsed_tags) in self._regions:
+
+            region = getattr(canvas, create_function)(coords[start:end],
+                tags=raw_tags + (internal_target_name,), **options)
+            regions.append(region)
+
+            if tag_cache is not None:
+                tags = dict(parsed_tags)
+                tags.update(name_tags)
+                tag_cache.add_region(region, tags)
+
+        return regions
+
+    # Returns (min_x, min_y, max_x, max_y) of the saved target or None if
+    # it has no regions
+    def get_bbox(self):
+        if len(self._coords) == 0:
+            return None
+
+        (min_x, min_y) = self._coords.min(axis=0).tolist()
+        (max_x, max_y) = self._coords.max(axis=0).tolist()
+        return (min_x, min_y, max_x, max_y)
+
+    def get_region_count(self):
+        return len(self._regions)
+
+    # Returns the region dicts that can't be drawn because their shape
+    # isn't known (e.g. it came from a shape file that isn't loaded)
+    def get_skipped_regions(self):
+        return self._skipped_regions
+
+    # region_object is a list of region dicts as read by target_format
+    def __init__(self, region_object):
+        self._regions = []
+        self._skipped_regions = []
+        coords = []
+
+        for region in region_object:
+            # Get rid of the default internal name otherwise every target
+            # will have it and selection won't work
+            raw_tags = tuple([value for value in region["tags"]
+                if value != DEFAULT_INTERNAL_NAME])
+            parsed_tags = TagParser.parse_tags(raw_tags)
+
+            shape = shape_library.get_shape(
+                region.get("shape") or parsed_tags.get("_shape"))
+            if shape is None:
+                self._skipped_regions.append(region)
+                continue
+
+            item_type = shape.get_item_type()
+            create_function = shape_library.CREATE_FUNCTIONS[item_type]
+            options = dict(shape_library.ITEM_OPTIONS[item_type],
+                fill=region["fill"])
+
+            start = len(coords)
+            coords.extend(region["coords"])
+            self._regions.append((create_function, start, len(coords),
+                options, raw_tags, parsed_tags))
+
+        self._coords = numpy.array(coords, dtype=numpy.float64).reshape(-1, 2)
+
+# This class keeps a template for each target file that was drawn, so that
+# adding the same target again doesn't have to read the file. A template is
+# read again when its file's modification time or size changes.
+class TemplateCache():
+    def get(self, target_file):
+        stat = os.stat(target_file)
+        version = (stat.st_mtime, stat.st_size)
+
+        if (target_file not in self._templates or
+            self._templates[target_file][0] != version):
+
+            template = TargetTemplate(target_format.read_target(target_file))
+            self._templates[target_file] = (version, template)
+
+            for region in template.get_skipped_regions():
+                self._logger.warning("Skipping a region of %s, its shape " +
+                    "%s isn't known", target_file, region.get("shape"))
+
+        return self._templates[target_file][1]
+
+    def clear(self):
+        self._templates = {}
+
+    def __init__(self, logger):
+        self._logger = logger
+        self._templates = {}
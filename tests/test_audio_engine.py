@@ -0,0 +1,266 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import logging
+import os
+import shutil
+from threading import Lock
+import tempfile
+import time
+import unittest
+import wave
+
+import numpy
+
+import audio_engine
+from audio_engine import (AudioEngine, NullSink, decode_sound, CHANNELS,
+    SAMPLE_RATE, BUFFER_FRAMES, MAX_VOICES)
+
+TIMEOUT = 5 # s
+
+class RecordingHandler(logging.Handler):
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+# Keeps everything the mixer writes as an N x CHANNELS float array
+class RecordingSink():
+    def write(self, data):
+        samples = numpy.frombuffer(data, dtype="<i2").reshape(-1, CHANNELS)
+        with self._lock:
+            self._chunks.append(samples.astype(numpy.float32) / 32767)
+
+    def close(self):
+        self.closed = True
+
+    def get_written(self):
+        with self._lock:
+            if len(self._chunks) == 0:
+                return numpy.zeros((0, CHANNELS), numpy.float32)
+
+            return numpy.concatenate(self._chunks)
+
+    def __init__(self):
+        self._lock = Lock()
+        self._chunks = []
+        self.closed = False
+
+def wait_for(condition):
+    deadline = time.time() + TIMEOUT
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(.005)
+
+def write_wave(path, samples, sample_width=2, rate=SAMPLE_RATE):
+    samples = numpy.asarray(samples, dtype=numpy.float64)
+    if samples.ndim == 1:
+        samples = samples.reshape(-1, 1)
+
+    if sample_width == 1:
+        frames = numpy.round(samples * 127 + 128).astype(numpy.uint8)
+    else:
+        frames = numpy.round(samples * 32767).astype("<i2")
+
+    f = wave.open(path, "wb")
+    try:
+        f.setnchannels(samples.shape[1])
+        f.setsampwidth(sample_width)
+        f.setframerate(rate)
+        f.writeframes(frames.tostring())
+    finally:
+        f.close()
+
+class DecodeSoundTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "sound.wav")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_16_bit_stereo(self):
+        write_wave(self.path, [(.5, -.5), (.25, 0), (-1, 1)])
+
+        numpy.testing.assert_allclose(decode_sound(self.path),
+            [(.5, -.5), (.25, 0), (-1, 1)], atol=.001)
+
+    def test_8_bit_mono_plays_on_every_channel(self):
+        write_wave(self.path, [.5, -.5, 0], sample_width=1)
+
+        samples = decode_sound(self.path)
+
+        self.assertEqual(samples.shape, (3, CHANNELS))
+        self.assertEqual(samples.dtype, numpy.float32)
+        numpy.testing.assert_allclose(samples[:, 0], [.5, -.5, 0], atol=.01)
+        numpy.testing.assert_allclose(samples[:, 1], samples[:, 0])
+
+    def test_extra_channels_are_dropped(self):
+        write_wave(self.path, [(.1, .2, .3, .4)] * 5)
+
+        numpy.testing.assert_allclose(decode_sound(self.path),
+            [(.1, .2)] * 5, atol=.001)
+
+    def test_resampling(self):
+        rate = SAMPLE_RATE / 2
+        ramp = numpy.linspace(0, .5, rate / 10)
+        write_wave(self.path, numpy.column_stack((ramp, -ramp)), rate=rate)
+
+        samples = decode_sound(self.path)
+
+        self.assertEqual(len(samples), len(ramp) * 2)
+        # Every other sample falls between two of the original ones
+        numpy.testing.assert_allclose(samples[::2, 0], ramp, atol=.001)
+        numpy.testing.assert_allclose(samples[1:-1:2, 0],
+            (ramp[:-1] + ramp[1:]) / 2, atol=.001)
+        numpy.testing.assert_allclose(samples[:, 1], -samples[:, 0])
+
+    def test_empty_sound(self):
+        write_wave(self.path, numpy.zeros((0, 2)), rate=22050)
+
+        self.assertEqual(decode_sound(self.path).shape, (0, CHANNELS))
+
+class AudioEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.handler = RecordingHandler()
+        self.logger = logging.getLogger("tests.audio_engine")
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+        self.sink = RecordingSink()
+        self.engine = AudioEngine(self.logger, self.sink)
+
+    def tearDown(self):
+        self.engine.stop()
+        self.logger.removeHandler(self.handler)
+        shutil.rmtree(self.directory)
+
+    def make_sound(self, name, samples):
+        path = os.path.join(self.directory, name)
+        write_wave(path, samples)
+        return path
+
+    def test_sounds_are_mixed(self):
+        quiet = self.make_sound("quiet.wav", [(.25, .25)] * 100)
+        loud = self.make_sound("loud.wav", [(.5, -.5)] * 300)
+
+        # Both start before the mixer runs, so they start together
+        self.engine.play(quiet)
+        self.engine.play(loud)
+        self.engine.start()
+
+        wait_for(lambda: len(self.sink.get_written()) >= 2 * BUFFER_FRAMES)
+        written = self.sink.get_written()
+
+        numpy.testing.assert_allclose(written[:100], [(.75, -.25)] * 100,
+            atol=.001)
+        numpy.testing.assert_allclose(written[100:300], [(.5, -.5)] * 200,
+            atol=.001)
+        numpy.testing.assert_allclose(written[300:], 0, atol=.001)
+
+    def test_mix_is_clipped(self):
+        loud = self.make_sound("loud.wav", [(.75, -.75)] * 10)
+
+        self.engine.play(loud)
+        self.engine.play(loud)
+        self.engine.start()
+
+        wait_for(lambda: len(self.sink.get_written()) >= BUFFER_FRAMES)
+
+        numpy.testing.assert_allclose(self.sink.get_written()[:10],
+            [(1, -1)] * 10, atol=.001)
+
+    def test_nothing_is_written_while_idle(self):
+        self.engine.start()
+        time.sleep(.05)
+
+        self.assertEqual(len(self.sink.get_written()), 0)
+        self.assertFalse(self.engine.is_playing())
+
+    def test_sounds_are_decoded_once(self):
+        path = self.make_sound("beep.wav", [(.5, .5)] * 10)
+
+        samples = self.engine.preload(path)
+        os.remove(path)
+
+        self.assertTrue(self.engine.preload(path) is samples)
+
+    def test_oldest_voice_is_cut_off(self):
+        first = self.make_sound("first.wav", [(.5, 0)] * 10)
+        sounds = [first] + [self.make_sound("%d.wav" % i, [(.01, 0)] * 10)
+            for i in range(MAX_VOICES)]
+
+        for sound in sounds:
+            self.engine.play(sound)
+        self.assertTrue(self.engine.is_playing())
+        self.engine.start()
+
+        wait_for(lambda: len(self.sink.get_written()) >= BUFFER_FRAMES)
+
+        # The first sound was dropped for the last one
+        numpy.testing.assert_allclose(self.sink.get_written()[:10, 0],
+            [.01 * MAX_VOICES] * 10, atol=.002)
+
+    def test_unreadable_sound_is_logged_once(self):
+        missing = os.path.join(self.directory, "missing.wav")
+        broken = os.path.join(self.directory, "broken.wav")
+        with open(broken, "wb") as f:
+            f.write("not a wave file")
+
+        self.engine.start()
+        for i in range(3):
+            self.engine.play(missing)
+            self.engine.play(broken)
+
+        self.assertEqual(len(self.handler.messages), 2)
+        self.assertFalse(self.engine.is_playing())
+        self.assertEqual(len(self.engine.preload(missing)), 0)
+
+    def test_stop_closes_the_sink(self):
+        self.engine.start()
+        self.engine.stop()
+
+        self.assertTrue(self.sink.closed)
+
+class NullSinkTest(unittest.TestCase):
+    def test_counts_frames(self):
+        sink = NullSink()
+        sink.write("\0" * (CHANNELS * 2 * 100))
+        sink.write("\0" * (CHANNELS * 2 * 28))
+
+        self.assertEqual(sink.get_frames_written(), 128)
+
+    def test_realtime(self):
+        sink = NullSink(realtime=True)
+
+        start = time.time()
+        sink.write("\0" * (CHANNELS * 2 * SAMPLE_RATE / 20))
+
+        self.assertTrue(time.time() - start >= .04)
+
+    def test_default_sink_without_pyaudio(self):
+        handler = RecordingHandler()
+        logger = logging.getLogger("tests.audio_engine.default")
+        logger.propagate = False
+        logger.addHandler(handler)
+        saved_pyaudio = audio_engine.pyaudio
+        audio_engine.pyaudio = None
+
+        try:
+            engine = AudioEngine(logger)
+        finally:
+            audio_engine.pyaudio = saved_pyaudio
+            logger.removeHandler(handler)
+
+        self.assertTrue(isinstance(engine.get_sink(), NullSink))
+        self.assertEqual(len(handler.messages), 1)
+
+        engine.start()
+        engine.stop()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,140 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import unittest
+
+from canvas_manager import CanvasManager
+
+# Just enough of a Tkinter canvas to keep track of items, their tags and
+# their stacking order (lowest first)
+class FakeCanvas():
+    def bind(self, sequence, callback):
+        pass
+
+    def focus_set(self):
+        pass
+
+    def _create(self, item_type, coords, options):
+        self._next_id += 1
+        tags = options.pop("tags", ())
+        if isinstance(tags, basestring):
+            tags = (tags,)
+
+        self.items[self._next_id] = {"type": item_type, "coords": coords,
+            "tags": tuple(tags), "options": options}
+        self.order.append(self._next_id)
+        return self._next_id
+
+    def create_oval(self, *coords, **options):
+        return self._create("oval", list(coords), options)
+
+    def create_polygon(self, *coords, **options):
+        return self._create("polygon", list(coords), options)
+
+    def find_withtag(self, tag_or_id):
+        return tuple(item for item in self.order
+            if item == tag_or_id or tag_or_id in self.items[item]["tags"])
+
+    def gettags(self, tag_or_id):
+        items = self.find_withtag(tag_or_id)
+        if len(items) == 0:
+            return ()
+
+        return self.items[items[0]]["tags"]
+
+    def coords(self, item):
+        return self.items[item]["coords"]
+
+    def itemcget(self, item, option):
+        return self.items[item]["options"].get(option, "")
+
+    def itemconfig(self, tag_or_id, **options):
+        for item in self.find_withtag(tag_or_id):
+            self.items[item]["options"].update(options)
+
+    def type(self, item):
+        return self.items[item]["type"]
+
+    def find_above(self, item):
+        position = self.order.index(item) + 1
+        return tuple(self.order[position:position + 1])
+
+    def tag_lower(self, item, below):
+        self.order.remove(item)
+        self.order.insert(self.order.index(below), item)
+
+    def tag_raise(self, item, above):
+        # find_above's result can be passed straight in, like with Tk
+        if isinstance(item, tuple):
+            if len(item) == 0:
+                return
+            item = item[0]
+
+        self.order.remove(item)
+        self.order.insert(self.order.index(above) + 1, item)
+
+    def delete(self, tag_or_id):
+        for item in self.find_withtag(tag_or_id):
+            self.order.remove(item)
+            del self.items[item]
+
+    def move(self, tag_or_id, dx, dy):
+        for item in self.find_withtag(tag_or_id):
+            coords = self.items[item]["coords"]
+            coords[::2] = [x + dx for x in coords[::2]]
+            coords[1::2] = [y + dy for y in coords[1::2]]
+
+    def stacking(self):
+        return [(self.items[item]["type"], self.items[item]["tags"][0])
+            for item in self.order]
+
+    def __init__(self):
+        self.items = {}
+        self.order = []
+        self._next_id = 0
+
+class FakeEvent():
+    def __init__(self, widget, keysym):
+        self.widget = widget
+        self.keysym = keysym
+
+class CanvasManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.canvas = FakeCanvas()
+        self.changes = []
+        self.manager = CanvasManager(self.canvas, self.changes.append)
+
+        self.canvas.create_oval(0, 0, 100, 100, fill="black",
+            tags=("target0", "_shape:oval"))
+        self.canvas.create_oval(25, 25, 75, 75, fill="red",
+            tags=("target0", "_shape:oval"))
+        self.canvas.create_oval(50, 50, 52, 52, tags=("shot_marker",))
+
+    def test_converted_ovals_keep_their_place(self):
+        self.manager.convert_ovals("target0",
+            self.manager.convert_to_windows_ovals)
+
+        self.assertEqual(self.canvas.stacking(), [("polygon", "target0"),
+            ("polygon", "target0"), ("oval", "shot_marker")])
+        self.assertEqual([self.canvas.itemcget(item, "fill") for item in
+            self.canvas.find_withtag("target0")], ["black", "red"])
+
+        self.manager.convert_ovals("target0",
+            self.manager.convert_from_windows_ovals)
+
+        self.assertEqual(self.canvas.stacking(), [("oval", "target0"),
+            ("oval", "target0"), ("oval", "shot_marker")])
+        self.assertEqual([self.canvas.itemcget(item, "fill") for item in
+            self.canvas.find_withtag("target0")], ["black", "red"])
+
+    def test_moving_the_selection_notifies(self):
+        self.manager.selection_update_listener(None, "target0")
+        self.manager.move_region(FakeEvent(self.canvas, "Right"))
+
+        self.assertEqual(self.changes, ["target0"])
+        self.assertEqual(self.canvas.coords(
+            self.canvas.find_withtag("target0")[0]), [1, 0, 101, 100])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import unittest
+
+from display_transform import DisplayTransform
+
+class DisplayTransformTest(unittest.TestCase):
+    def test_unscaled(self):
+        transform = DisplayTransform((640, 480))
+
+        self.assertFalse(transform.is_scaled())
+        self.assertEqual(transform.get_display_size(), (640, 480))
+        self.assertEqual(transform.to_display(100, 50), (100, 50))
+        self.assertEqual(transform.to_frame(100, 50), (100, 50))
+        self.assertEqual(transform.bbox_to_frame((1, 2, 3, 4)), (1, 2, 3, 4))
+
+    def test_half_size(self):
+        transform = DisplayTransform((640, 480), .5)
+
+        self.assertTrue(transform.is_scaled())
+        self.assertEqual(transform.get_frame_size(), (640, 480))
+        self.assertEqual(transform.get_display_size(), (320, 240))
+        self.assertEqual(transform.to_display(100, 50), (50, 25))
+        self.assertEqual(transform.to_frame(50, 25), (100, 50))
+
+    def test_scale_follows_rounded_display_size(self):
+        transform = DisplayTransform((643, 483), .5)
+        (width, height) = transform.get_display_size()
+
+        self.assertEqual((width, height), (322, 242))
+        self.assertEqual(transform.get_scale(), (322 / 643.0, 242 / 483.0))
+        self.assertAlmostEqual(transform.to_frame(width, height)[0], 643)
+        self.assertAlmostEqual(transform.to_frame(width, height)[1], 483)
+
+    def test_tiny_scale_keeps_a_pixel(self):
+        self.assertEqual(DisplayTransform((640, 480), .001).get_display_size(),
+            (1, 1))
+
+    def test_round_trip(self):
+        transform = DisplayTransform((1280, 720), .37)
+        (x, y) = transform.to_frame(*transform.to_display(123.5, 456.25))
+
+        self.assertAlmostEqual(x, 123.5)
+        self.assertAlmostEqual(y, 456.25)
+
+    def test_bbox_is_rounded_outwards(self):
+        transform = DisplayTransform((640, 480), .3)
+        display_bbox = (1.5, 2.5, 10, 10)
+        frame_bbox = transform.bbox_to_frame(display_bbox)
+
+        (x1, y1) = transform.to_frame(display_bbox[0], display_bbox[1])
+        (x2, y2) = transform.to_frame(display_bbox[2], display_bbox[3])
+        self.assertTrue(frame_bbox[0] <= x1 and frame_bbox[1] <= y1)
+        self.assertTrue(frame_bbox[2] >= x2 and frame_bbox[3] >= y2)
+        self.assertEqual(frame_bbox, (5, 8, 34, 34))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import time
+import unittest
+
+import frame_pacer
+from frame_pacer import FramePacer
+from webcam_capture import clock
+
+class FramePacerTest(unittest.TestCase):
+    # Draws the frames with the given sequence numbers of a webcam that
+    # captures at frame_rate
+    def draw(self, pacer, sequences, frame_rate=30.0):
+        start = clock()
+        for sequence in sequences:
+            pacer.frame_started(sequence, start + sequence / frame_rate)
+            pacer.frame_finished()
+
+    def test_every_frame_drawn(self):
+        pacer = FramePacer(30, 30)
+        self.draw(pacer, range(10))
+
+        self.assertEqual(pacer.get_rendered_frame_count(), 10)
+        self.assertEqual(pacer.get_skipped_frame_count(), 0)
+        self.assertEqual(pacer.get_throttled_frame_count(), 0)
+
+    def test_frames_left_out_by_the_rate_cap_arent_skipped(self):
+        pacer = FramePacer(30, 15)
+        self.draw(pacer, range(0, 20, 2))
+
+        self.assertEqual(pacer.get_rendered_frame_count(), 10)
+        self.assertEqual(pacer.get_skipped_frame_count(), 0)
+        self.assertEqual(pacer.get_throttled_frame_count(), 9)
+
+    def test_frames_missed_beyond_the_cap_are_skipped(self):
+        pacer = FramePacer(30, 15)
+        self.draw(pacer, [0, 2, 6, 8])
+
+        self.assertEqual(pacer.get_skipped_frame_count(), 2)
+        self.assertEqual(pacer.get_throttled_frame_count(), 3)
+
+    def test_missed_frames_are_skipped_without_a_cap(self):
+        pacer = FramePacer(30, 30)
+        self.draw(pacer, [0, 1, 4, 5])
+
+        self.assertEqual(pacer.get_skipped_frame_count(), 2)
+        self.assertEqual(pacer.get_throttled_frame_count(), 0)
+
+    def test_measures_the_real_frame_rate(self):
+        # The driver claims 60 fps but delivers 20
+        pacer = FramePacer(60, 120)
+        self.draw(pacer, range(200), frame_rate=20.0)
+
+        self.assertAlmostEqual(pacer.get_frame_rate(), 20, places=1)
+        self.assertEqual(pacer.get_skipped_frame_count(), 0)
+
+    def test_render_interval(self):
+        pacer = FramePacer(30, 10)
+        self.assertAlmostEqual(pacer.get_render_interval(), .1)
+
+        pacer.set_max_rate(60)
+        self.assertAlmostEqual(pacer.get_render_interval(), 1 / 30.0)
+
+    def test_slow_drawing_lowers_the_rate(self):
+        pacer = FramePacer(30, 30)
+        pacer.frame_started(0, clock())
+        time.sleep(.05)
+        pacer.frame_finished()
+
+        self.assertGreaterEqual(pacer.get_render_interval(),
+            .05 / frame_pacer.MAX_RENDER_LOAD)
+
+    def test_delay(self):
+        pacer = FramePacer(30, 30)
+        self.assertEqual(pacer.get_delay(), pacer.get_poll_delay())
+
+        # The next frame is due one interval after the one just drawn
+        pacer.frame_started(0, clock())
+        pacer.frame_finished()
+        delay = pacer.get_delay()
+        self.assertTrue(frame_pacer.MIN_DELAY <= delay <= 1000 / 30 + 3, delay)
+
+        self.assertTrue(pacer.get_poll_delay() >= frame_pacer.MIN_DELAY)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import unittest
+
+from hit_index import HitIndex, shape_contains
+import shape_library
+from shape_library import OVAL, POLYGON, RECTANGLE
+
+def place(shape_name, x, y, scale=None):
+    return shape_library.get_shape(shape_name).place(x, y, scale)
+
+class ShapeContainsTest(unittest.TestCase):
+    def test_rectangle(self):
+        coords = (10, 20, 50, 40)
+        self.assertTrue(shape_contains(RECTANGLE, coords, 30, 30))
+        self.assertTrue(shape_contains(RECTANGLE, coords, 10, 20))
+        self.assertTrue(shape_contains(RECTANGLE, coords, 50, 40))
+        self.assertFalse(shape_contains(RECTANGLE, coords, 51, 30))
+        self.assertFalse(shape_contains(RECTANGLE, coords, 30, 19))
+
+    def test_rectangle_with_reversed_corners(self):
+        self.assertTrue(shape_contains(RECTANGLE, (50, 40, 10, 20), 30, 30))
+
+    def test_oval(self):
+        coords = (0, 0, 100, 50)
+        self.assertTrue(shape_contains(OVAL, coords, 50, 25))
+        self.assertTrue(shape_contains(OVAL, coords, 50, 1))
+        self.assertTrue(shape_contains(OVAL, coords, 1, 25))
+        self.assertFalse(shape_contains(OVAL, coords, 101, 25))
+
+    def test_oval_bounding_box_corners_miss(self):
+        coords = (0, 0, 100, 50)
+        for (x, y) in ((2, 2), (98, 2), (2, 48), (98, 48), (10, 5)):
+            self.assertFalse(shape_contains(OVAL, coords, x, y), (x, y))
+
+    def test_flat_oval_misses(self):
+        self.assertFalse(shape_contains(OVAL, (0, 10, 100, 10), 50, 10))
+
+    def test_triangle(self):
+        # Apex at (100, 70), base from (70, 130) to (130, 130)
+        coords = place("triangle", 100, 100)
+        self.assertTrue(shape_contains(POLYGON, coords, 100, 110))
+        self.assertTrue(shape_contains(POLYGON, coords, 100, 75))
+        # Inside the bounding box but beside the apex
+        self.assertFalse(shape_contains(POLYGON, coords, 75, 80))
+        self.assertFalse(shape_contains(POLYGON, coords, 125, 80))
+
+    def test_aqt(self):
+        scale = shape_library.AQT_SCALE
+        coords = place("aqt3", 200, 200)
+        # Chest and head
+        self.assertTrue(shape_contains(POLYGON, coords, 200, 200 + 10 * scale))
+        self.assertTrue(shape_contains(POLYGON, coords, 200, 200 - 12 * scale))
+        # Above the shoulders, inside the bounding box
+        self.assertFalse(shape_contains(POLYGON, coords,
+            200 + 14 * scale, 200 - 13 * scale))
+        self.assertFalse(shape_contains(POLYGON, coords,
+            200 - 14 * scale, 200 - 13 * scale))
+
+    def test_freeform_polygon(self):
+        # An L, closed the way the target editor closes freeform polygons
+        coords = (0, 0, 40, 0, 40, 10, 10, 10, 10, 40, 0, 40, 0, 0)
+        self.assertTrue(shape_contains(POLYGON, coords, 5, 30))
+        self.assertTrue(shape_contains(POLYGON, coords, 30, 5))
+        # Inside the bounding box, in the L's notch
+        self.assertFalse(shape_contains(POLYGON, coords, 30, 30))
+
+    def test_unknown_shape_type_misses(self):
+        self.assertFalse(shape_contains("line", (0, 0, 10, 10), 5, 5))
+
+class HitIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = HitIndex()
+
+    def test_miss(self):
+        self.index.set_target("a", [(1, RECTANGLE, (0, 0, 10, 10), {})])
+        self.assertEqual(self.index.find_top_region(20, 20), None)
+        self.assertEqual(self.index.find_regions(20, 20), [])
+
+    def test_oval_corner_misses_through_index(self):
+        self.index.set_target("a", [(1, OVAL, (0, 0, 100, 100), {})])
+        self.assertEqual(self.index.find_top_region(3, 3), None)
+        self.assertEqual(self.index.find_top_region(50, 50)[0], 1)
+
+    def test_top_region_in_target_wins(self):
+        # A bullseye, the rings are stacked from the outside in
+        self.index.set_target("a", [
+            (1, OVAL, (0, 0, 100, 100), {"points": "5"}),
+            (2, OVAL, (25, 25, 75, 75), {"points": "10"})])
+
+        self.assertEqual(self.index.find_top_region(50, 50),
+            (2, {"points": "10"}))
+        self.assertEqual(self.index.find_top_region(10, 50),
+            (1, {"points": "5"}))
+        self.assertEqual([region for (region, tags) in
+            self.index.find_regions(50, 50)], [2, 1])
+
+    def test_last_added_target_wins(self):
+        self.index.set_target("a", [(1, RECTANGLE, (0, 0, 50, 50), {})])
+        self.index.set_target("b", [(2, RECTANGLE, (25, 25, 75, 75), {})])
+
+        self.assertEqual(self.index.find_top_region(30, 30)[0], 2)
+        self.assertEqual(self.index.find_top_region(10, 10)[0], 1)
+        self.assertEqual([region for (region, tags) in
+            self.index.find_regions(30, 30)], [2, 1])
+
+    def test_replaced_target_keeps_its_place(self):
+        self.index.set_target("a", [(1, RECTANGLE, (0, 0, 50, 50), {})])
+        self.index.set_target("b", [(2, RECTANGLE, (0, 0, 50, 50), {})])
+        self.index.set_target("a", [(3, RECTANGLE, (0, 0, 50, 50), {})])
+
+        self.assertEqual(self.index.get_target_names(), ["a", "b"])
+        self.assertEqual(self.index.find_top_region(10, 10)[0], 2)
+
+    def test_moved_target_is_reindexed(self):
+        self.index.set_target("a", [(1, POLYGON,
+            place("triangle", 100, 100), {})])
+        self.index.set_target("a", [(1, POLYGON,
+            place("triangle", 300, 100), {})])
+
+        self.assertEqual(self.index.find_top_region(100, 110), None)
+        self.assertEqual(self.index.find_top_region(300, 110)[0], 1)
+
+    def test_scaled_target_is_reindexed(self):
+        self.index.set_target("a", [(1, POLYGON, place("aqt4", 100, 100), {})])
+        scale = shape_library.AQT_SCALE
+
+        # Just outside the right shoulder at the default size
+        (x, y) = (100 + 13 * scale, 100 + 4 * scale)
+        self.assertEqual(self.index.find_top_region(x, y), None)
+
+        self.index.set_target("a", [(1, POLYGON,
+            place("aqt4", 100, 100, scale * 2), {})])
+        self.assertEqual(self.index.find_top_region(x, y)[0], 1)
+
+        self.index.set_target("a", [(1, POLYGON,
+            place("aqt4", 100, 100, scale / 4), {})])
+        self.assertEqual(self.index.find_top_region(100, 100 - 10 * scale),
+            None)
+
+    def test_remove_target(self):
+        self.index.set_target("a", [(1, RECTANGLE, (0, 0, 50, 50), {})])
+        self.index.remove_target("a")
+
+        self.assertEqual(self.index.find_top_region(10, 10), None)
+        self.assertEqual(self.index.get_regions("a"), [])
+        self.assertEqual(self.index.get_target_names(), [])
+
+    def test_target_without_usable_regions_is_removed(self):
+        self.index.set_target("a", [(1, RECTANGLE, (0, 0, 50, 50), {})])
+        self.index.set_target("a", [(1, RECTANGLE, (0, 0), {})])
+        self.assertEqual(self.index.get_target_names(), [])
+
+    def test_get_regions_in_stacking_order(self):
+        self.index.set_target("a", [(3, RECTANGLE, (0, 0, 5, 5), {}),
+            (1, RECTANGLE, (0, 0, 5, 5), {}), (2, OVAL, (0, 0, 5, 5), {})])
+        self.assertEqual(self.index.get_regions("a"), [3, 1, 2])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import cv2
+import numpy
+import unittest
+
+from laser_calibrator import LaserCalibrator
+
+def make_frame(level=40):
+    return numpy.full((480, 640, 3), level, dtype=numpy.uint8)
+
+@unittest.skipUnless(hasattr(cv2, "cv"), "needs OpenCV 2.4")
+class LaserCalibratorTest(unittest.TestCase):
+    def setUp(self):
+        self.calibrator = LaserCalibrator()
+
+    def add_frames(self, idle_frames, pulse_frames):
+        for frame in idle_frames:
+            self.calibrator.add_idle_frame(frame)
+        for frame in pulse_frames:
+            self.calibrator.add_pulse_frame(frame)
+
+    def laser_frame(self, frame, level=200):
+        frame = frame.copy()
+        frame[50:53, 70:73] = level
+        return frame
+
+    def test_threshold_is_between_idle_and_laser(self):
+        idle = make_frame()
+        self.add_frames([idle] * 10, [idle] * 5 + [self.laser_frame(idle)] * 5)
+
+        self.assertEqual(self.calibrator.get_idle_peak(), 40)
+        self.assertEqual(self.calibrator.get_pulse_peak(), 200)
+        self.assertEqual(self.calibrator.compute_threshold(), 120)
+        self.assertEqual(self.calibrator.get_idle_frame_count(), 10)
+        self.assertEqual(self.calibrator.get_pulse_frame_count(), 10)
+
+    def test_no_laser(self):
+        idle = make_frame()
+        self.add_frames([idle] * 10, [idle] * 10)
+
+        self.assertEqual(self.calibrator.get_pulse_peak(), None)
+        self.assertEqual(self.calibrator.compute_threshold(), None)
+
+    def test_laser_dimmer_than_the_feed(self):
+        idle = make_frame(220)
+        self.add_frames([idle] * 10, [self.laser_frame(idle, 210)] * 10)
+        self.assertEqual(self.calibrator.compute_threshold(), None)
+
+    def test_no_frames(self):
+        self.assertEqual(self.calibrator.get_idle_peak(), None)
+        self.assertEqual(self.calibrator.get_pulse_peak(), None)
+        self.assertEqual(self.calibrator.compute_threshold(), None)
+
+    def test_few_hot_pixels_dont_raise_the_idle_peak(self):
+        idle = make_frame()
+        idle[0, 0] = 255
+        self.add_frames([idle] * 10, [])
+        self.assertEqual(self.calibrator.get_idle_peak(), 40)
+
+    def test_static_hot_spot_isnt_laser(self):
+        # Too small to count against the idle peak, but it's on every frame
+        idle = make_frame()
+        idle[0, 0:2] = 250
+        self.add_frames([idle] * 10, [idle] * 5 + [self.laser_frame(idle)] * 5)
+
+        self.assertEqual(self.calibrator.get_idle_peak(), 40)
+        self.assertEqual(self.calibrator.get_pulse_peak(), 200)
+        self.assertEqual(self.calibrator.compute_threshold(), 120)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import unittest
+
+import cv2
+import numpy
+
+from laser_color_classifier import (LaserColorClassifier, HSV_CLASSIFIER,
+    SAMPLE_RADIUS)
+
+# Colors are in BGR
+RED = (40, 40, 220)
+GREEN = (40, 220, 40)
+GRAY = (128, 128, 128)
+BLUE = (220, 40, 40)
+
+def make_frame(background=GRAY):
+    frame = numpy.zeros((120, 160, 3), dtype=numpy.uint8)
+    frame[:, :] = background
+    return frame
+
+def draw_spot(frame, x, y, color):
+    frame[y - SAMPLE_RADIUS:y + SAMPLE_RADIUS + 1,
+        x - SAMPLE_RADIUS:x + SAMPLE_RADIUS + 1] = color
+
+class LaserColorClassifierTest(unittest.TestCase):
+    def setUp(self):
+        self.frame = make_frame()
+        draw_spot(self.frame, 30, 30, RED)
+        draw_spot(self.frame, 80, 60, GREEN)
+        draw_spot(self.frame, 130, 90, BLUE)
+
+        self.points = [(30, 30), (80, 60), (130, 90), (80, 20)]
+
+    def test_no_points(self):
+        self.assertEqual(LaserColorClassifier.classify(self.frame, []), [])
+
+    def test_classify_rgb(self):
+        self.assertEqual(LaserColorClassifier.classify(self.frame, self.points),
+            ["red", "green2", None, None])
+
+    @unittest.skipUnless(hasattr(cv2, "cv"), "needs OpenCV 2.4")
+    def test_classify_hsv(self):
+        self.assertEqual(LaserColorClassifier.classify(self.frame, self.points,
+            HSV_CLASSIFIER), ["red", "green2", None, None])
+
+    @unittest.skipUnless(hasattr(cv2, "cv"), "needs OpenCV 2.4")
+    def test_hsv_ignores_washed_out_spots(self):
+        frame = make_frame()
+        draw_spot(frame, 50, 50, (120, 120, 135))
+
+        self.assertEqual(LaserColorClassifier.classify(frame, [(50, 50)]),
+            ["red"])
+        self.assertEqual(LaserColorClassifier.classify(frame, [(50, 50)],
+            HSV_CLASSIFIER), [None])
+
+    def test_mean_colors(self):
+        means = LaserColorClassifier.mean_colors(self.frame,
+            [(30, 30), (80.4, 59.6)])
+
+        numpy.testing.assert_allclose(means, [RED, GREEN])
+
+    def test_mean_leaves_out_pixels_off_the_frame(self):
+        frame = make_frame(RED)
+
+        means = LaserColorClassifier.mean_colors(frame,
+            [(0, 0), (159, 119), (-5, 60)])
+
+        numpy.testing.assert_allclose(means, [RED, RED, RED])
+
+    def test_mean_is_over_a_circle(self):
+        frame = make_frame((0, 0, 0))
+        # Only the corners of the square around the point are lit, they are
+        # outside the sample circle
+        frame[50 - SAMPLE_RADIUS, 50 - SAMPLE_RADIUS] = (255, 255, 255)
+        frame[50 + SAMPLE_RADIUS, 50 + SAMPLE_RADIUS] = (255, 255, 255)
+
+        means = LaserColorClassifier.mean_colors(frame, [(50, 50)])
+
+        numpy.testing.assert_allclose(means, [(0, 0, 0)])
+
+if __name__ == "__main__":
+    unittest.main()
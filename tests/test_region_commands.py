@@ -0,0 +1,136 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import logging
+import unittest
+
+from region_commands import CommandRegistry
+
+class RecordingHandler(logging.Handler):
+    def emit(self, record):
+        self.records.append(record)
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+class CommandRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.handler = RecordingHandler()
+        self.logger = logging.getLogger("tests.region_commands")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.addHandler(self.handler)
+        self.registry = CommandRegistry(self.logger)
+        self.calls = []
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+
+    def recorder(self, label):
+        return lambda *args: self.calls.append((label,) + args)
+
+    def get_warnings(self):
+        return [record for record in self.handler.records
+            if record.levelno == logging.WARNING]
+
+    def test_parsing(self):
+        self.registry.register("reset", self.recorder("reset"))
+        self.registry.register("play_sound", self.recorder("play_sound"))
+        self.registry.register("move", self.recorder("move"))
+
+        commands = self.registry.get_commands(
+            ["reset", "reset()", "play_sound(sounds/beep.wav)", "move(1,2,3)"])
+
+        self.assertEqual([c.get_name() for c in commands],
+            ["reset", "reset", "play_sound", "move"])
+        self.assertEqual([c.get_args() for c in commands],
+            [(), (), ("sounds/beep.wav",), ("1", "2", "3")])
+
+        for command in commands:
+            command()
+
+        self.assertEqual(self.calls, [("reset",), ("reset",),
+            ("play_sound", "sounds/beep.wav"), ("move", "1", "2", "3")])
+
+    def test_commands_are_parsed_once(self):
+        first = self.registry.get_commands(["reset"])
+        second = self.registry.get_commands(("reset",))
+
+        self.assertTrue(first is second)
+
+    def test_unregistered_command_does_nothing(self):
+        command = self.registry.get_commands(["nothing(1)"])[0]
+        command()
+
+        self.assertEqual(self.calls, [])
+        self.assertEqual(self.registry.get_handler("nothing"), None)
+
+    def test_command_registered_after_parsing(self):
+        command = self.registry.get_commands(["count(3)"])[0]
+        self.registry.register("count", self.recorder("count"),
+            lambda n: (int(n),))
+        command()
+
+        self.assertEqual(self.calls, [("count", 3)])
+
+    def test_stacked_handlers(self):
+        command = self.registry.get_commands(["play_sound(beep.wav)"])[0]
+        self.registry.register("play_sound", self.recorder("app"))
+        self.registry.register("play_sound", self.recorder("protocol"))
+        command()
+
+        self.registry.unregister("play_sound")
+        command()
+
+        self.registry.unregister("play_sound")
+        command()
+
+        self.assertEqual(self.calls,
+            [("protocol", "beep.wav"), ("app", "beep.wav")])
+        self.assertEqual(self.registry.get_handler("play_sound"), None)
+
+    def test_unregister_unknown_name(self):
+        self.registry.unregister("nothing")
+
+    def test_arguments_are_prepared_from_the_tag(self):
+        command = self.registry.get_commands(["volume(5)"])[0]
+        self.registry.register("volume", self.recorder("app"),
+            lambda level: (int(level),))
+        self.registry.register("volume", self.recorder("protocol"),
+            lambda level: (level + "%",))
+        command()
+
+        self.assertEqual(command.get_raw_args(), ("5",))
+        self.assertEqual(command.get_args(), ("5%",))
+
+        self.registry.unregister("volume")
+        command()
+
+        self.assertEqual(command.get_args(), (5,))
+        self.assertEqual(self.calls, [("protocol", "5%"), ("app", 5)])
+
+    def test_handler_without_preparer_gets_raw_args(self):
+        command = self.registry.get_commands(["volume(5)"])[0]
+        self.registry.register("volume", self.recorder("app"),
+            lambda level: (int(level),))
+        self.registry.register("volume", self.recorder("protocol"))
+        command()
+
+        self.assertEqual(self.calls, [("protocol", "5")])
+
+    def test_preparer_failure_is_logged(self):
+        self.registry.register("volume", self.recorder("volume"),
+            lambda level: (int(level),))
+        command = self.registry.get_commands(["volume(loud)"])[0]
+
+        self.assertEqual(len(self.get_warnings()), 1)
+        self.assertTrue("volume" in self.get_warnings()[0].getMessage())
+
+        # The handler still gets the arguments from the tag
+        command()
+        self.assertEqual(self.calls, [("volume", "loud")])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import cv2
+import logging
+import numpy
+import unittest
+
+import settings
+from shot_detector import ShotDetector
+
+LOGGER = logging.getLogger("tests")
+LOGGER.addHandler(logging.NullHandler())
+
+# ShootOFF uses OpenCV 2.4's cv2.cv constants
+HAS_CV = hasattr(cv2, "cv")
+
+def make_detector(**preferences):
+    (config, defaults) = settings.map_configuration()
+    defaults.update({settings.ROI_DETECTION: True, settings.ROI_MARGIN: 0,
+        settings.BACKGROUND_SUBTRACTION: False, settings.LASER_INTENSITY: 230})
+    defaults.update(preferences)
+    return ShotDetector(None, defaults, LOGGER)
+
+def make_frame(width=100, height=100):
+    return numpy.zeros((height, width, 3), dtype=numpy.uint8)
+
+class DetectionRegionsTest(unittest.TestCase):
+    def test_whole_frame_without_targets(self):
+        detector = make_detector()
+        self.assertEqual(detector.get_detection_regions(make_frame()),
+            [(0, 0, 100, 100)])
+
+    def test_whole_frame_when_roi_detection_is_off(self):
+        detector = make_detector(**{settings.ROI_DETECTION: False})
+        detector.set_target_regions([(10, 10, 20, 20)])
+        self.assertEqual(detector.get_detection_regions(make_frame()),
+            [(0, 0, 100, 100)])
+
+    def test_margin_is_clamped_to_the_frame(self):
+        detector = make_detector(**{settings.ROI_MARGIN: 10})
+        detector.set_target_regions([(5, 50, 20, 95)])
+        self.assertEqual(detector.get_detection_regions(make_frame()),
+            [(0, 40, 31, 100)])
+
+    def test_overlapping_regions_are_merged(self):
+        detector = make_detector()
+        detector.set_target_regions([(0, 0, 20, 20), (10, 10, 30, 30),
+            (50, 50, 60, 60)])
+        self.assertEqual(sorted(detector.get_detection_regions(make_frame())),
+            [(0, 0, 31, 31), (50, 50, 61, 61)])
+
+@unittest.skipUnless(HAS_CV, "needs OpenCV 2.4")
+class BackgroundSubtractionTest(unittest.TestCase):
+    def setUp(self):
+        self.detector = make_detector(**{settings.BACKGROUND_SUBTRACTION: True})
+
+        # Steady glare
+        self.frame = make_frame()
+        self.frame[10:20, 10:20] = 255
+
+    def test_steady_glare_is_ignored_and_new_light_isnt(self):
+        self.detector.set_target_regions([(0, 0, 40, 40)])
+        self.assertEqual(self.detector.find_laser_blobs(self.frame), [])
+
+        frame = self.frame.copy()
+        frame[30, 30] = 255
+        self.assertEqual([blob[:2] for blob in
+            self.detector.find_laser_blobs(frame)], [(30, 30)])
+
+    def test_nudged_target_keeps_its_background(self):
+        self.detector = make_detector(**{settings.BACKGROUND_SUBTRACTION: True,
+            settings.LASER_INTENSITY: 100})
+
+        # Flickering glare only stays hidden once the model has learned
+        # its average brightness
+        bright = make_frame()
+        bright[10:20, 10:20] = 255
+        dim = make_frame()
+        dim[10:20, 10:20] = 100
+
+        self.detector.set_target_regions([(5, 5, 30, 30)])
+        for i in range(100):
+            self.detector.find_laser_blobs((bright, dim)[i % 2])
+
+        for x in range(1, 4):
+            self.detector.set_target_regions([(5 + x, 5, 30 + x, 30)])
+            self.assertEqual(self.detector.find_laser_blobs(dim), [])
+            self.assertEqual(self.detector.find_laser_blobs(bright), [])
+
+    def test_newly_searched_pixels_start_over(self):
+        glare = make_frame()
+        glare[60:70, 60:70] = 255
+
+        self.detector.set_target_regions([(0, 0, 20, 20)])
+        for i in range(10):
+            self.detector.find_laser_blobs(glare)
+
+        # The glare was never searched, it mustn't look new once it is
+        self.detector.set_target_regions([(0, 0, 80, 80)])
+        self.assertEqual(self.detector.find_laser_blobs(glare), [])
+
+if __name__ == "__main__":
+    unittest.main()
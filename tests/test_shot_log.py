@@ -0,0 +1,108 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import shot_log
+from shot_log import ShotLogWriter
+from webcam_capture import clock
+
+class ShotLogTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "logs", "session.shots")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, *shots):
+        writer = ShotLogWriter(self.path)
+        writer.start()
+        for shot in shots:
+            writer.log_shot(*shot[0], **shot[1])
+        writer.close()
+
+    def test_round_trip(self):
+        now = clock()
+        self.write(((now, 1.5, 10.25, 20.5, "red2"),
+                {"target": "target0", "region": 2, "columns": ("10", u"x"),
+                "target_file": "bullseye.target"}),
+            ((now, 2.5, 30, 40, "green2"), {}))
+
+        (start_time, records) = shot_log.read_shot_log(self.path)
+        self.assertEqual(len(records), 2)
+        self.assertAlmostEqual(start_time, time.time(), delta=5)
+
+        hit = records[0]
+        self.assertEqual(hit["timer"], 1.5)
+        self.assertEqual((hit["x"], hit["y"]), (10.25, 20.5))
+        self.assertEqual(hit["color"], shot_log.RED)
+        self.assertEqual((hit["hit"], hit["region"]), (1, 2))
+        self.assertEqual(hit["target"], "target0")
+        self.assertEqual(hit["target_file"], "bullseye.target")
+        self.assertEqual(hit["columns"], "10\tx")
+
+        miss = records[1]
+        self.assertEqual(miss["color"], shot_log.GREEN)
+        self.assertEqual((miss["hit"], miss["region"]), (0, -1))
+        self.assertEqual(miss["target"], "")
+
+    def test_hit_with_unknown_region(self):
+        self.write(((clock(), 0, 0, 0, None), {"target": "target0"}))
+
+        record = shot_log.read_shot_log(self.path)[1][0]
+        self.assertEqual((record["hit"], record["region"]), (1, -1))
+        self.assertEqual(record["color"], shot_log.UNKNOWN_COLOR)
+
+    def test_time_is_detection_time(self):
+        # The shot was found in a frame captured 5 s before it was logged
+        detection_time = clock() - 5
+        self.write(((detection_time, 0, 0, 0, "red"), {}),
+            ((detection_time + .25, 0, 0, 0, "red"), {}))
+
+        records = shot_log.read_shot_log(self.path)[1]
+        self.assertAlmostEqual(records[0]["time"], time.time() - 5, delta=1)
+        self.assertAlmostEqual(records[1]["time"] - records[0]["time"], .25,
+            places=3)
+
+    def test_long_text_is_cut_off(self):
+        self.write(((clock(), 0, 0, 0, "red"), {"target": "t" * 100}))
+
+        record = shot_log.read_shot_log(self.path)[1][0]
+        self.assertEqual(record["target"], "t" * 16)
+
+    def test_appends_to_existing_log(self):
+        self.write(((clock(), 1, 0, 0, "red"), {}))
+        self.write(((clock(), 2, 0, 0, "red"), {}))
+
+        records = shot_log.read_shot_log(self.path)[1]
+        self.assertEqual(list(records["timer"]), [1, 2])
+
+    def test_half_written_record_is_ignored(self):
+        self.write(((clock(), 1, 0, 0, "red"), {}))
+        with open(self.path, "ab") as f:
+            f.write("\0" * (shot_log.SHOT_RECORD.itemsize / 2))
+
+        self.assertEqual(len(shot_log.read_shot_log(self.path)[1]), 1)
+
+    def test_empty_log(self):
+        self.write()
+        self.assertEqual(len(shot_log.read_shot_log(self.path)[1]), 0)
+
+    def test_other_files_are_rejected(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "wb") as f:
+            f.write("not a shot log at all")
+
+        self.assertRaises(ValueError, shot_log.read_shot_log, self.path)
+
+    def test_default_directory_doesnt_depend_on_cwd(self):
+        self.assertTrue(os.path.isabs(shot_log.new_session_path()))
+
+if __name__ == "__main__":
+    unittest.main()
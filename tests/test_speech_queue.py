@@ -0,0 +1,161 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import logging
+from threading import Lock
+import time
+import unittest
+
+import speech_queue
+from speech_queue import SpeechQueue
+
+TIMEOUT = 5 # s
+
+class RecordingHandler(logging.Handler):
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+# Stands in for a pyttsx engine, each message takes busy_iterations calls
+# to iterate to be said
+class FakeEngine():
+    def setProperty(self, name, value):
+        self.properties[name] = value
+
+    def startLoop(self, use_driver_loop):
+        self.loop_started = True
+
+    def endLoop(self):
+        self.loop_ended = True
+
+    def say(self, message):
+        with self.lock:
+            self.said.append(message)
+        self._busy = self.busy_iterations
+
+    def iterate(self):
+        if self._busy > 0:
+            self._busy -= 1
+
+    def isBusy(self):
+        return self._busy > 0
+
+    def stop(self):
+        self.stopped += 1
+        self._busy = 0
+
+    def get_said(self):
+        with self.lock:
+            return list(self.said)
+
+    def __init__(self, busy_iterations=1):
+        self.busy_iterations = busy_iterations
+        self.properties = {}
+        self.said = []
+        self.lock = Lock()
+        self.loop_started = False
+        self.loop_ended = False
+        self.stopped = 0
+        self._busy = 0
+
+def wait_for(condition):
+    deadline = time.time() + TIMEOUT
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(.005)
+
+class SpeechQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.handler = RecordingHandler()
+        self.logger = logging.getLogger("tests.speech_queue")
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+        self.engine = FakeEngine()
+        self.queue = SpeechQueue(self.logger, lambda: self.engine)
+
+    def tearDown(self):
+        self.queue.stop()
+        self.logger.removeHandler(self.handler)
+
+    def test_messages_are_said_in_order(self):
+        self.queue.start()
+        for message in ("one", "two", "three"):
+            self.queue.say(message)
+
+        wait_for(lambda: len(self.engine.get_said()) == 3)
+        self.assertEqual(self.engine.get_said(), ["one", "two", "three"])
+        self.assertEqual(self.engine.properties["rate"],
+            speech_queue.SPEECH_RATE)
+
+        self.queue.stop()
+        self.assertTrue(self.engine.loop_ended)
+
+    def test_waiting_duplicates_are_dropped(self):
+        self.queue.say("reload")
+        self.queue.say("reload")
+        self.queue.say("shoot")
+        self.assertEqual(self.queue.get_pending_count(), 2)
+
+    def test_key_replaces_waiting_message(self):
+        self.queue.say("3 seconds", "countdown")
+        self.queue.say("hello")
+        self.queue.say("2 seconds", "countdown")
+        self.assertEqual(self.queue.get_pending_count(), 2)
+
+        self.queue.start()
+        wait_for(lambda: len(self.engine.get_said()) == 2)
+        self.assertEqual(self.engine.get_said(), ["2 seconds", "hello"])
+
+    def test_oldest_message_is_pushed_out(self):
+        for i in range(speech_queue.MAX_PENDING_MESSAGES + 2):
+            self.queue.say(str(i))
+
+        self.queue.start()
+        wait_for(lambda: len(self.engine.get_said()) ==
+            speech_queue.MAX_PENDING_MESSAGES)
+        self.assertEqual(self.engine.get_said(), [str(i) for i in
+            range(2, speech_queue.MAX_PENDING_MESSAGES + 2)])
+
+    def test_flush(self):
+        self.queue.say("one")
+        self.queue.say("two")
+        self.queue.flush()
+        self.assertEqual(self.queue.get_pending_count(), 0)
+
+    def test_cancel_stops_the_current_message(self):
+        # Long enough that it's still being said when it's cancelled
+        self.engine.busy_iterations = 100000
+        self.queue.start()
+        self.queue.say("a very long message")
+        self.queue.say("next")
+
+        wait_for(self.queue.is_speaking)
+        self.queue.cancel()
+        wait_for(lambda: not self.queue.is_speaking())
+
+        self.assertEqual(self.engine.stopped, 1)
+        self.assertEqual(self.engine.get_said(), ["a very long message"])
+
+    def test_engine_that_fails_to_start(self):
+        def broken_engine():
+            raise RuntimeError("no speech driver")
+
+        self.queue = SpeechQueue(self.logger, broken_engine)
+        self.queue.say("queued before the failure")
+        self.queue.start()
+
+        wait_for(lambda: not self.queue.is_available())
+        self.assertEqual(self.queue.get_pending_count(), 0)
+        self.assertEqual(len(self.handler.messages), 1)
+        self.assertTrue("no speech driver" in self.handler.messages[0])
+
+        self.queue.say("dropped")
+        self.assertEqual(self.queue.get_pending_count(), 0)
+
+if __name__ == "__main__":
+    unittest.main()
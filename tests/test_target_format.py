@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import target_format
+from target_format import TargetFormatError
+
+REGIONS = [
+    {"tags": ("_shape:oval", "points:5", "_internal_name:target"),
+        "coords": [10.0, 10.0, 90.0, 90.0], "fill": "black"},
+    {"tags": ("_shape:triangle", "command:play_sound(sounds/beep.wav)",
+        u"subtarget:été"),
+        "coords": [50.0, 20.0, 80.0, 80.0, 20.0, 80.0, 50.0, 20.0],
+        "fill": "red"}]
+
+class TargetFormatTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def assert_regions_equal(self, loaded, expected):
+        self.assertEqual(len(loaded), len(expected))
+
+        for (region, original) in zip(loaded, expected):
+            self.assertEqual(region["tags"], tuple(original["tags"]))
+            self.assertEqual(region["coords"], list(original["coords"]))
+            self.assertEqual(region["fill"], original["fill"])
+
+    def test_save_load_round_trip(self):
+        target_file = self.path("round_trip.target")
+        target_format.save_target(target_file, REGIONS)
+
+        self.assertFalse(target_format.is_pickled_target(target_file))
+        regions = target_format.load_target(target_file)
+
+        self.assert_regions_equal(regions, REGIONS)
+        self.assertEqual([region["shape"] for region in regions],
+            ["oval", "triangle"])
+        self.assertEqual(regions[0]["parsed_tags"]["points"], "5")
+        self.assertEqual(regions[1]["parsed_tags"]["subtarget"],
+            u"été")
+
+    def test_region_without_shape_tag_round_trips(self):
+        target_file = self.path("no_shape.target")
+        target_format.save_target(target_file, [{"tags": ("points:1",),
+            "coords": [0, 0, 1, 1], "fill": "blue"}])
+
+        regions = target_format.load_target(target_file)
+        self.assertEqual(regions[0]["shape"], "")
+        self.assertEqual(regions[0]["tags"], ("points:1",))
+
+    def test_save_rejects_regions_that_would_not_load(self):
+        target_file = self.path("bad.target")
+
+        for region in ({"tags": (), "coords": [0, 0, 1], "fill": "red"},
+            {"tags": (), "coords": [0, 0], "fill": "red"},
+            {"tags": (None,), "coords": [0, 0, 1, 1], "fill": "red"}):
+
+            self.assertRaises(TargetFormatError, target_format.save_target,
+                target_file, [region])
+
+    def test_pickle_convert_load(self):
+        pickled_file = self.path("old.target")
+        with open(pickled_file, "wb") as f:
+            pickle.dump([dict(region) for region in REGIONS], f)
+
+        self.assertTrue(target_format.is_pickled_target(pickled_file))
+        self.assert_regions_equal(target_format.read_target(pickled_file),
+            REGIONS)
+
+        converted_file = self.path("converted.target")
+        target_format.convert_pickled_target(pickled_file, converted_file)
+
+        self.assertFalse(target_format.is_pickled_target(converted_file))
+        self.assert_regions_equal(target_format.read_target(converted_file),
+            REGIONS)
+
+    def test_malicious_pickle_is_rejected(self):
+        marker = self.path("pwned")
+        target_file = self.path("evil.target")
+
+        # Unpickling this would call os.system
+        with open(target_file, "wb") as f:
+            f.write("cos\nsystem\n(S'touch %s'\ntR." % marker)
+
+        self.assertRaises(TargetFormatError, target_format.read_target,
+            target_file)
+        self.assertFalse(os.path.exists(marker))
+
+    def test_pickled_regions_are_schema_checked(self):
+        target_file = self.path("bad_pickle.target")
+
+        for region_object in ([{"tags": "_shape:oval", "fill": "red",
+                "coords": [0, 0, 1, 1]}],
+            [{"tags": (), "fill": 1, "coords": [0, 0, 1, 1]}],
+            [{"tags": (), "fill": "red", "coords": [0, 0, 1]}],
+            [{"tags": (), "fill": "red", "coords": [0, 0, 1, "1"]}],
+            ["not a region"], {"not": "a list"}):
+
+            with open(target_file, "wb") as f:
+                pickle.dump(region_object, f)
+
+            self.assertRaises(TargetFormatError, target_format.read_target,
+                target_file)
+
+    def test_corrupt_files_are_rejected(self):
+        target_file = self.path("corrupt.target")
+        target_format.save_target(target_file, REGIONS)
+
+        with open(target_file, "rb") as f:
+            data = f.read()
+
+        for bad_data in (data[:-4], data[:target_format.HEADER_SIZE - 1],
+            data.replace('"coordinate_count":4', '"coordinate_count":6')):
+
+            with open(target_file, "wb") as f:
+                f.write(bad_data)
+
+            self.assertRaises(TargetFormatError, target_format.read_target,
+                target_file)
+
+    def test_shipped_targets_load(self):
+        for file_name in os.listdir("targets"):
+            if file_name.endswith(".target"):
+                target_format.read_target(os.path.join("targets", file_name))
+
+if __name__ == "__main__":
+    unittest.main()
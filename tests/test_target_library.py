@@ -0,0 +1,141 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+import target_format
+import target_library
+from target_library import TargetLibrary
+
+LOGGER = logging.getLogger("tests")
+LOGGER.addHandler(logging.NullHandler())
+
+BULLSEYE = [
+    {"tags": ("_shape:oval", "points:5", "subtarget:ring"),
+        "coords": [0, 0, 100, 100], "fill": "black"},
+    {"tags": ("_shape:oval", "points:10", "command:clear_shots"),
+        "coords": [25, 25, 75, 75], "fill": "red"}]
+
+SQUARE = [{"tags": ("_shape:rectangle",), "coords": [10, 20, 30, 60],
+    "fill": "blue"}]
+
+class TargetLibraryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        target_format.save_target(self.path("bullseye.target"), BULLSEYE)
+        target_format.save_target(self.path("Square.target"), SQUARE)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def make_library(self):
+        library = TargetLibrary(LOGGER, self.directory)
+        library.refresh()
+        return library
+
+    def write_index(self, index):
+        with open(self.path(target_library.INDEX_FILE), "wb") as f:
+            json.dump(index, f)
+
+    def test_describes_targets(self):
+        library = self.make_library()
+        targets = library.get_targets()
+
+        self.assertEqual([entry["name"] for entry in targets],
+            ["bullseye", "Square"])
+
+        bullseye = targets[0]
+        self.assertEqual(bullseye["region_count"], 2)
+        self.assertEqual(bullseye["bbox"], (0, 0, 100, 100))
+        self.assertEqual(bullseye["points"], ["10", "5"])
+        self.assertEqual(bullseye["subtargets"], ["ring"])
+        self.assertEqual(bullseye["commands"], ["clear_shots"])
+        self.assertEqual(bullseye["tag_names"],
+            ["command", "points", "subtarget"])
+
+        thumbnail = target_library.decode_thumbnail(bullseye["thumbnail"])
+        self.assertEqual(max(thumbnail.size), target_library.THUMBNAIL_SIZE)
+
+    def test_find_targets(self):
+        library = self.make_library()
+        self.assertEqual([entry["name"] for entry in
+            library.find_targets("subtarget")], ["bullseye"])
+        self.assertEqual(library.find_targets("subtarget", "missing"), [])
+
+    def test_refresh_only_reads_changed_targets(self):
+        library = self.make_library()
+        version = library.get_version()
+
+        self.assertFalse(library.refresh())
+        self.assertEqual(library.get_version(), version)
+
+        target_format.save_target(self.path("Square.target"), BULLSEYE * 2)
+        self.assertTrue(library.refresh())
+        self.assertEqual(library.get_target(
+            self.path("Square.target"))["region_count"], 4)
+
+        os.remove(self.path("bullseye.target"))
+        self.assertTrue(library.refresh())
+        self.assertEqual(len(library.get_targets()), 1)
+
+    def test_index_is_reused(self):
+        self.make_library()
+
+        # Anything that reads a target now fails, so the entries have to
+        # come from the index
+        describe_target = target_library.describe_target
+        target_library.describe_target = None
+        try:
+            library = self.make_library()
+        finally:
+            target_library.describe_target = describe_target
+
+        self.assertEqual(len(library.get_targets()), 2)
+        self.assertEqual(library.get_targets()[0]["bbox"], (0, 0, 100, 100))
+
+    def test_unreadable_targets_are_skipped(self):
+        with open(self.path("broken.target"), "wb") as f:
+            f.write("SOTARGET garbage")
+
+        self.assertEqual(len(self.make_library().get_targets()), 2)
+
+    def test_bad_indexes_are_ignored(self):
+        good_index = {"version": target_library.INDEX_VERSION,
+            "targets": self.make_library().get_targets()}
+        entry = good_index["targets"][0]
+
+        bad_entries = ["not an entry", None, [], dict(entry, bbox=[1, 2]),
+            dict(entry, bbox="abcd"), dict(entry, points=None),
+            dict(entry, mtime="yesterday"), dict(entry, size=None)]
+        for key in target_library.ENTRY_KEYS:
+            bad_entry = dict(entry)
+            del bad_entry[key]
+            bad_entries.append(bad_entry)
+
+        bad_indexes = ["[1, 2, 3]", "{}", "not json",
+            json.dumps({"version": target_library.INDEX_VERSION,
+                "targets": {"not": "a list"}})]
+        bad_indexes.extend(json.dumps({"version": target_library.INDEX_VERSION,
+            "targets": [bad_entry, good_index["targets"][1]]})
+            for bad_entry in bad_entries)
+
+        for index in bad_indexes:
+            with open(self.path(target_library.INDEX_FILE), "wb") as f:
+                f.write(index)
+
+            library = TargetLibrary(LOGGER, self.directory)
+            library.refresh()
+            self.assertEqual([entry["name"] for entry in
+                library.get_targets()], ["bullseye", "Square"], index)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,11 +2,6 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
-import pyaudio
-import pyttsx
-from threading import Thread
-import wave
-
 LARGEST_REGION = 0
 BOUNDING_BOX = 1
 
@@ -17,15 +12,13 @@ class ProtocolOperations():
         self._canvas = canvas
         self._plugin_canvas_artifacts = []
         self._shootoff = shootoff
+        self._audio_engine = shootoff.get_audio_engine()
+        self._speech_queue = shootoff.get_speech_queue()
         self._feed_text = self._canvas.create_text(1, 1, anchor="nw", fill="white")
         self._plugin_canvas_artifacts.append(self._feed_text)
         self._added_columns = ()
         self._added_column_widths = []
-
-        self._tts_engine = pyttsx.init()
-        # slow down the wpm rate otherwise they speek to fast
-        self._tts_engine.setProperty("rate", 150)
-        self._tts_engine.startLoop(False)
+        self._region_commands = []
 
     # Returns the centroid of a target using the specified mode:
     # LARGEST_REGION calculates the centroid of the target by calculating
@@ -91,35 +84,62 @@ class ProtocolOperations():
         self._shootoff.append_shot_list_column_data(item, values)
 
     def destroy(self):
-        # pyttsx errors out if we try to end a loop that isn't running, so
-        # we need to check if we are in a loop first, but the only good
-        # way to do this right now is to check an internal flag. This hack
-        # checks that the flag exists and checks it before ending the loop
-        # if it does, otherwise we just end the loop (better to get a CLI
-        # error message than the actual behavior of not ending the loop,
-        # which is weird sound artifacts).
-        if hasattr(self._tts_engine, "_inLoop") and self._tts_engine._inLoop:
-            self._tts_engine.endLoop()
-        elif not hasattr(self._tts_engine, "_inLoop"):
-            self._tts_engine.endLoop()
+        # Nothing the plugin asked to say should be heard after it's gone
+        self._speech_queue.cancel()
         self.clear_canvas()
         self.clear_protocol_shot_list_columns()
 
+        for name in self._region_commands:
+            self._shootoff.unregister_region_command(name)
+        self._region_commands = []
+
+    # Adds a command that can be attached to target regions with a
+    # command:name(arg0,arg1,...) tag. handler is called with the arguments
+    # as strings when a region with the command is hit. preparer is optional
+    # and is called with the arguments when a target with the command is
+    # added, it should load anything the command needs and return the
+    # arguments handler will get. The command is removed again when the
+    # plugin is unloaded.
+    def register_region_command(self, name, handler, preparer=None):
+        self._shootoff.register_region_command(name, handler, preparer)
+        self._region_commands.append(name)
+
+    # Returns the target library's entries (see TargetLibrary.get_targets)
+    # for every target that has regions with each of the tags in tag_names,
+    # e.g. find_targets("subtarget"). Targets don't have to be drawn to be
+    # found.
+    def find_targets(self, *tag_names):
+        target_library = self._shootoff.get_target_library()
+        target_library.refresh()
+        return target_library.find_targets(*tag_names)
+
+    # Adds a copy of the target in target_file for each (x, y, scale) in
+    # placements, e.g. [(0, 0, 1), (200, 0, .5)]. Each copy is the saved
+    # target scaled by scale and moved by (x, y) webcam pixels. Adding many
+    # copies at once is much faster than adding them one at a time. Returns
+    # the internal names of the new targets.
+    def add_targets(self, target_file, placements):
+        return self._shootoff.add_targets(target_file, placements)
+
     def clear_shots(self):
         self._shootoff.clear_shots()
 
-    # Use text-to-speech to say message outloud
-    def say(self, message):
-        # if we don't do this on another thread we have to wait until
-        # the message has finished being communicated to do anything
-        # (i.e. shootoff freezes)  
-        self._say_thread = Thread(target=self._say, args=(message,),
-                name="say_thread")
-        self._say_thread.start()  
-    
-    def _say(self, *args):
-        self._tts_engine.say(args[0])
-        self._tts_engine.iterate()
+    # Use text-to-speech to say message outloud. This returns right away,
+    # messages are said one at a time in the order they were given. If
+    # the same message is already waiting to be said it isn't added again.
+    # Messages with a key replace a waiting message with the same key, which
+    # is useful for prompts where only the newest one matters.
+    def say(self, message, key=None):
+        self._speech_queue.say(message, key)
+
+    # Drops every message that is waiting to be said
+    def flush_speech(self):
+        self._speech_queue.flush()
+
+    # Drops every message that is waiting to be said and stops the one
+    # being said now
+    def cancel_speech(self):
+        self._speech_queue.cancel()
 
     # Show message as text on the top left corner of the webcam feed. The 
     # new message will over-write whatever was shown before
@@ -135,33 +155,12 @@ class ProtocolOperations():
     def clear_protocol_shot_list_columns(self):
         self._shootoff.revert_shot_list_columns()
 
-    # Play the sound in sound_file
+    # Play the sound in sound_file. This returns right away, sounds that
+    # overlap are mixed together.
     def play_sound(self, sound_file):
-        # if we don't do this on a nother thread we have to wait until
-        # the message has finished being communicated to do anything
-        # (i.e. shootoff freezes)  
-        self._play_sound_thread = Thread(target=self._play_sound, 
-            args=(sound_file,), name="play_sound_thread")
-        self._play_sound_thread.start()  
-
-    def _play_sound(self, *args):
-        chunk = 1024  
-  
-        # initialize the sound file and stream
-        f = wave.open(args[0],"rb")  
-        p = pyaudio.PyAudio()  
-        stream = p.open(format = p.get_format_from_width(f.getsampwidth()),  
-                        channels = f.getnchannels(),  
-                        rate = f.getframerate(),  
-                        output = True)  
-
-        # play the sound file
-        data = f.readframes(chunk)   
-        while data != '':  
-            stream.write(data)  
-            data = f.readframes(chunk)  
-
-        # clean up
-        stream.stop_stream()  
-        stream.close()  
-        p.terminate() 
+        self._audio_engine.play(sound_file)
+
+    # Load sound_file into memory ahead of time so that playing it
+    # doesn't have to wait for the disk
+    def preload_sound(self, sound_file):
+        self._audio_engine.preload(sound_file)
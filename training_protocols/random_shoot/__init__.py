@@ -5,6 +5,9 @@
 import random
 from training_protocols.ITrainingProtocol import ITrainingProtocol 
 
+# Only the newest prompt about which subtarget to shoot is worth saying
+SUBTARGET_PROMPT = "subtarget_prompt"
+
 class RandomShoot(ITrainingProtocol):
     def __init__(self, protocol_operations, targets):
         self._operations = protocol_operations
@@ -52,11 +55,11 @@ class RandomShoot(ITrainingProtocol):
         for subtarget in self._subtarget_chain[1:]:
             sentence += "then %s " % subtarget
 
-        self._operations.say(sentence.strip())
+        self._operations.say(sentence.strip(), SUBTARGET_PROMPT)
 
     def say_current_subtarget(self):
         self._operations.say("shoot %s" % 
-            self._subtarget_chain[self._subtarget_index])
+            self._subtarget_chain[self._subtarget_index], SUBTARGET_PROMPT)
 
     def shot_listener(self, shot, shot_list_item, is_hit):
         if not self._subtarget_chain:
@@ -0,0 +1,138 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import cv2
+import glob
+import numpy
+import os
+import time
+from webcam_capture import clock
+
+DEFAULT_FPS = 30
+FRAME_EXTENSIONS = (".bmp", ".jpeg", ".jpg", ".png", ".ppm", ".tif", ".tiff")
+
+# This class replays a recorded video file or a directory of frame images
+# (played in file name order) through the same interface as
+# cv2.VideoCapture, so it can stand in for a webcam. With realtime set,
+# frames are handed out at the recording's frame rate, otherwise they are
+# handed out as fast as they are asked for.
+class VideoReplay():
+    def isOpened(self):
+        if self._video is not None:
+            return self._video.isOpened()
+
+        return len(self._frame_files) > 0
+
+    def read(self, image=None):
+        if self._realtime:
+            self._wait_for_frame_time()
+
+        if self._video is not None:
+            if image is None:
+                rval, frame = self._video.read()
+            else:
+                rval, frame = self._video.read(image=image)
+        else:
+            rval, frame = self._read_frame_file(image)
+
+        if rval:
+            self._frame_index += 1
+        else:
+            self._finished = True
+
+        return rval, frame
+
+    def _read_frame_file(self, image):
+        if self._frame_index >= len(self._frame_files):
+            return False, None
+
+        frame = cv2.imread(self._frame_files[self._frame_index])
+
+        if frame is None:
+            return False, None
+
+        # Reuse the caller's buffer like VideoCapture.read does
+        if image is not None and image.shape == frame.shape:
+            numpy.copyto(image, frame)
+            return True, image
+
+        return True, frame
+
+    def _wait_for_frame_time(self):
+        if self._start_time is None:
+            self._start_time = clock()
+            return
+
+        frame_time = self._start_time + self._frame_index / self._fps
+        delay = frame_time - clock()
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def get(self, prop):
+        if self._video is not None:
+            if prop == cv2.cv.CV_CAP_PROP_FPS:
+                return self._fps
+            return self._video.get(prop)
+
+        if prop == cv2.cv.CV_CAP_PROP_FPS:
+            return self._fps
+        elif prop == cv2.cv.CV_CAP_PROP_FRAME_WIDTH:
+            return self._frame_size[0]
+        elif prop == cv2.cv.CV_CAP_PROP_FRAME_HEIGHT:
+            return self._frame_size[1]
+        elif prop == cv2.cv.CV_CAP_PROP_FRAME_COUNT:
+            return len(self._frame_files)
+        elif prop == cv2.cv.CV_CAP_PROP_POS_FRAMES:
+            return self._frame_index
+
+        return 0
+
+    # Recordings can't change resolution, so setting properties is ignored
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        if self._video is not None:
+            self._video.release()
+
+    def is_finished(self):
+        return self._finished
+
+    def get_frame_index(self):
+        return self._frame_index
+
+    # source is the path to a video file or to a directory of frames. fps is
+    # the frame rate frames are replayed at when realtime is True, it
+    # defaults to the video's own frame rate (or DEFAULT_FPS for frame
+    # directories and videos that don't know their frame rate).
+    def __init__(self, source, realtime=True, fps=None):
+        self._realtime = realtime
+        self._frame_index = 0
+        self._start_time = None
+        self._finished = False
+        self._video = None
+        self._frame_files = []
+        self._frame_size = (0, 0)
+
+        if os.path.isdir(source):
+            self._frame_files = sorted(path for path in
+                glob.glob(os.path.join(source, "*"))
+                if os.path.splitext(path)[1].lower() in FRAME_EXTENSIONS)
+
+            if len(self._frame_files) > 0:
+                first_frame = cv2.imread(self._frame_files[0])
+                if first_frame is not None:
+                    self._frame_size = (first_frame.shape[1],
+                        first_frame.shape[0])
+        else:
+            self._video = cv2.VideoCapture(source)
+
+            if fps is None:
+                fps = self._video.get(cv2.cv.CV_CAP_PROP_FPS)
+
+        if fps is None or fps <= 0:
+            fps = DEFAULT_FPS
+
+        self._fps = float(fps)
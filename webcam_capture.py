@@ -0,0 +1,213 @@
+# Copyright (c) 2013 phrack. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import cv2
+import numpy
+from threading import Condition, Thread, current_thread
+import time
+
+# time.monotonic doesn't exist in Python 2, so fall back to the best
+# timer timeit can find for the platform
+try:
+    from time import monotonic as clock
+except ImportError:
+    from timeit import default_timer as clock
+
+DEFAULT_BUFFER_SIZE = 8 # frames
+MAX_MISSED_FRAMES = 25
+MISSED_FRAME_DELAY = .03 # s
+
+# Opens the webcam and makes sure its resolution isn't unusably low. The
+# returned capture may not be opened (check isOpened).
+def open_webcam(logger, device=0):
+    capture = cv2.VideoCapture(device)
+
+    if not capture.isOpened():
+        return capture
+
+    width = capture.get(cv2.cv.CV_CAP_PROP_FRAME_WIDTH)
+    height = capture.get(cv2.cv.CV_CAP_PROP_FRAME_HEIGHT)
+
+    # If the resolution is too low, try to force it higher.
+    # Some users have drivers that default to extremely low
+    # resolutions and opencv doesn't currently make it easy
+    # to enumerate valid resolutions and switch to them
+    if width < 640 and height < 480:
+        logger.info("Webcam resolution is current low (%dx%d), " +
+                    "attempting to increase it to 640x480", width, height)
+        capture.set(cv2.cv.CV_CAP_PROP_FRAME_WIDTH, 640)
+        capture.set(cv2.cv.CV_CAP_PROP_FRAME_HEIGHT, 480)
+
+    return capture
+
+# This class reads frames from a video capture device on its own thread
+# and keeps the most recent frames in a preallocated ring of buffers. Every
+# frame is given a sequence number and the monotonic time it was captured
+# at, so the feed display and the shot detector can each consume frames at
+# their own rate without a slow camera driver stalling either of them.
+#
+# Frames are read straight into the ring buffers, so a frame returned by
+# this class is only valid until buffer_size - 1 more frames have been
+# captured. The slot after the latest frame is the one the capture thread
+# is reading into, so only the newest buffer_size - 1 frames can be read.
+# Consumers that need to keep a frame longer than that must copy it before
+# the capture thread gets around to its slot again.
+class WebcamCapture():
+    def start(self):
+        self._running = True
+        self._capture_thread = Thread(target=self._capture_loop,
+            name="capture_thread")
+        self._capture_thread.daemon = True
+        self._capture_thread.start()
+
+    def stop(self):
+        with self._frame_available:
+            self._running = False
+            self._frame_available.notify_all()
+
+        if (self._capture_thread is not None and
+            self._capture_thread is not current_thread()):
+            self._capture_thread.join()
+
+    def release(self):
+        self.stop()
+        self._capture.release()
+
+    def _capture_loop(self):
+        while self._running:
+            index = (self._latest_sequence + 1) % self._buffer_size
+
+            # The ring is allocated once we know the real size of the
+            # camera's frames, after that every read reuses a buffer
+            if self._frames is None:
+                rval, frame = self._capture.read()
+            else:
+                rval, frame = self._capture.read(image=self._frames[index])
+
+            timestamp = clock()
+
+            # A recording stands in for the webcam when it has an
+            # is_finished method, running out of frames isn't a disconnect
+            if (not rval and hasattr(self._capture, "is_finished") and
+                self._capture.is_finished()):
+
+                self._logger.info("Replay finished after %d frames.",
+                    self._latest_sequence + 1)
+
+                with self._frame_available:
+                    self._running = False
+                    self._frame_available.notify_all()
+
+                continue
+
+            if not rval:
+                self._missed_frame_count += 1
+                self._logger.debug("Missed %d webcam frames. If we miss too " +
+                    "many ShootOFF will stop processing shots.",
+                    self._missed_frame_count)
+
+                if self._missed_frame_count >= MAX_MISSED_FRAMES:
+                    self._logger.critical("Missed %d webcam frames. The " +
+                        "camera is probably disconnected so ShootOFF will " +
+                        "stop processing shots.", self._missed_frame_count)
+
+                    with self._frame_available:
+                        self._disconnected = True
+                        self._running = False
+                        self._frame_available.notify_all()
+                else:
+                    time.sleep(MISSED_FRAME_DELAY)
+
+                continue
+
+            self._missed_frame_count = 0
+
+            if self._frames is None:
+                self._frames = [numpy.empty_like(frame)
+                    for i in range(self._buffer_size)]
+
+            # OpenCV hands back a different array if it couldn't read into
+            # the one we gave it (e.g. the resolution changed)
+            self._frames[index] = frame
+
+            with self._frame_available:
+                self._timestamps[index] = timestamp
+                self._latest_sequence += 1
+                self._frame_available.notify_all()
+
+    # Returns (sequence, timestamp, frame) for the newest frame or None if
+    # no frame has been captured yet
+    def get_latest_frame(self):
+        with self._frame_available:
+            if self._latest_sequence < 0:
+                return None
+
+            index = self._latest_sequence % self._buffer_size
+            return (self._latest_sequence, self._timestamps[index],
+                self._frames[index])
+
+    # Returns (timestamp, frame) for the frame with the given sequence
+    # number or None if it hasn't been captured yet or has already been
+    # overwritten
+    def get_frame(self, sequence):
+        with self._frame_available:
+            if not self.is_frame_available(sequence):
+                return None
+
+            index = sequence % self._buffer_size
+            return (self._timestamps[index], self._frames[index])
+
+    # True if the frame with the given sequence number is still in the ring
+    # and isn't being overwritten
+    def is_frame_available(self, sequence):
+        return (sequence <= self._latest_sequence and
+            sequence >= self.get_oldest_sequence())
+
+    # Returns the sequence number of the oldest frame that can still be read
+    def get_oldest_sequence(self):
+        return self._latest_sequence - self._buffer_size + 2
+
+    # Blocks until the frame with the given sequence number has been
+    # captured, the capture thread stops, or timeout seconds pass. Returns
+    # True if the frame was captured.
+    def wait_for_frame(self, sequence, timeout=None):
+        if timeout is not None:
+            deadline = clock() + timeout
+
+        with self._frame_available:
+            while sequence > self._latest_sequence and self._running:
+                if timeout is None:
+                    self._frame_available.wait()
+                else:
+                    remaining = deadline - clock()
+                    if remaining <= 0:
+                        break
+                    self._frame_available.wait(remaining)
+
+            return sequence <= self._latest_sequence
+
+    def get_latest_sequence(self):
+        return self._latest_sequence
+
+    def get_buffer_size(self):
+        return self._buffer_size
+
+    def is_running(self):
+        return self._running
+
+    def is_disconnected(self):
+        return self._disconnected
+
+    def __init__(self, capture, logger, buffer_size=DEFAULT_BUFFER_SIZE):
+        self._capture = capture
+        self._logger = logger
+        self._buffer_size = buffer_size
+        self._frames = None
+        self._timestamps = [0] * buffer_size
+        self._latest_sequence = -1
+        self._missed_frame_count = 0
+        self._disconnected = False
+        self._running = False
+        self._capture_thread = None
+        self._frame_available = Condition()